@@ -1,4 +1,6 @@
 import subprocess
+import sys
+import shutil
 import os
 
 MENU = {
@@ -8,6 +10,7 @@ MENU = {
     "4": ("Applicazione delle regole SmartHome", "applica_regole.py"),
     "5": ("Predizione occupazione", "predizione_occupazione.py"),
     "6": ("Analisi KBS SmartHome", "analisi_KBS.py"),
+    "7": ("Esporta KB SQLite in RDF/XML", "archivio_kb.py"),
 }
 
 SCRIPTS_DIR = os.path.join(os.path.dirname(__file__), "scripts")
@@ -15,25 +18,44 @@ SCRIPTS_DIR = os.path.join(os.path.dirname(__file__), "scripts")
 FILES_DA_ELIMINARE = [
     "data/SmartHome_base.csv",
     "data/SmartHome_KB_enhanced.csv",
+    "data/SmartHome_base.parquet",
+    "data/SmartHome_KB_enhanced.parquet",
+    "data/SmartHome_base.col",
+    "data/SmartHome_KB_enhanced.col",
     "data/report_KBS_reasoning.csv",
     "ontology/smarthome.owl",
     "ontology/smarthome_popolata.owl",
     "ontology/smarthome_con_azioni.owl",
+    "ontology/smarthome.sqlite3",
+    "ontology/smarthome_popolata.sqlite3",
+    "ontology/smarthome_con_azioni.sqlite3",
     "data/Base_RandomForest.joblib",
     "data/Base_LogisticRegression.joblib",
     "data/Base_SVM.joblib",
     "data/KB_RandomForest.joblib",
     "data/KB_LogisticRegression.joblib",
-    "data/KB_SVM.joblib"
+    "data/KB_SVM.joblib",
+    "data/Base_RandomForest_compatta.npz",
+    "data/KB_RandomForest_compatta.npz",
+    "data/storico_stanze.npz",
+    "data/dataset_formato.json",
+    "data/pipeline_manifest.json",
+    "data/pipeline_log"
 ]
 
-print(" Pulizia iniziale dei file generati...")
-for file in FILES_DA_ELIMINARE:
-    path = os.path.abspath(file)                
-    if os.path.exists(path):                       
-        os.remove(path)                           
-        print(f" RIMOSSO: {file}")
-print(" PULIZIA COMPLETATA.\n")
+# Il menu riesegue i passi senza controllare i loro ingressi: si parte da zero, salvo con
+# --mantieni (la cache dei risultati è quella di scripts/pipeline.py)
+if "--mantieni" not in sys.argv[1:]:
+    print(" Pulizia iniziale dei file generati...")
+    for file in FILES_DA_ELIMINARE:
+        path = os.path.abspath(file)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+            print(f" RIMOSSO: {file}")
+        elif os.path.exists(path):
+            os.remove(path)
+            print(f" RIMOSSO: {file}")
+    print(" PULIZIA COMPLETATA.\n")
 
 
 while True:
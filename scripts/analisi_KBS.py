@@ -1,36 +1,45 @@
 import os
-import time
+import sys
+import argparse
 import pandas as pd
-from owlready2 import *
-from regole import azioni_da_regole
+from archivio_kb import percorso_kb
+from contesto_pipeline import ContestoPipeline
+from metriche import cronometro
+from regole import azioni_da_regole_batch, decodifica_azioni
+from dataset_io import FORMATI, percorso_dataset, leggi_dataset
 
-def main():
+def main(argv=None, contesto=None):
+    contesto = contesto or ContestoPipeline()
+    parser = argparse.ArgumentParser(description="Analisi della KB popolata: stanze inferite e azioni suggerite dalle regole.")
+    parser.add_argument("--formato", choices=sorted(FORMATI), default=None,
+                        help="formato del dataset da leggere (default quello scritto da genera_dataset.py)")
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
     print("Analisi SmartHome KBS basata sul reasoning...")
 
     base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-    ont_path = os.path.join(base_dir, "ontology", "smarthome_popolata.owl")
-    csv_path = os.path.join(base_dir, "data", "SmartHome_base.csv")
+    ont_path = percorso_kb("smarthome_popolata")
+    dataset_path = percorso_dataset(os.path.join(base_dir, "data"), "SmartHome_base", args.formato)
     report_path = os.path.join(base_dir, "data", "report_KBS_reasoning.csv")
 
     if not os.path.exists(ont_path):
         print(f"ERRORE: Ontologia non trovata: {os.path.relpath(ont_path)}.")
         return
-    if not os.path.exists(csv_path):
-        print(f"ERRORE: Dataset non trovato: {os.path.relpath(csv_path)}.")
+    if not os.path.exists(dataset_path):
+        print(f"ERRORE: Dataset non trovato: {os.path.relpath(dataset_path)}.")
         return
 
-    onto = get_ontology(ont_path).load()
+    onto = contesto.apri_kb("smarthome_popolata")
     print(f"Ontologia caricata: {len(list(onto.classes()))} classi, {len(list(onto.individuals()))} individui.")
 
     print("\nEsecuzione reasoner...")
-    start = time.time()
-    with onto:
-        sync_reasoner(infer_property_values=True, debug=0)
-    end = time.time()
-    print(f"Tempo di reasoning: {end - start:.2f} secondi.")
+    with cronometro("analisi.reasoning") as reasoning:
+        contesto.esegui_reasoner(onto, ont_path)
+    print(f"Tempo di reasoning: {reasoning.secondi:.2f} secondi.")
     print("Reasoner completato.")
 
-    df = pd.read_csv(csv_path)
+    df = contesto.dataset_in_memoria(dataset_path, ["id"])
+    if df is None:
+        df = leggi_dataset(dataset_path, ["id"])
     print(f"Dataset caricato: {len(df)} righe.")
 
     # Stanze inferite dal reasoner
@@ -58,18 +67,20 @@ def main():
 
     # Azioni suggerite usando regole.py 
     print("\nAzioni suggerite per le stanze nel report CSV.")
+    stanze_con_stato = [s for s in onto.Stanza.instances() if s.haStato]
+    stati = [s.haStato[0] for s in stanze_con_stato]
+    matrice = azioni_da_regole_batch(
+        [stato.haIlluminazione for stato in stati],
+        [stato.haTemperatura for stato in stati],
+        [stato.haOccupazione for stato in stati],
+        [stato.haOrario[0] if stato.haOrario else None for stato in stati]
+    )
     azioni_per_stanza = {}
-    for s in onto.Stanza.instances():
-        stato = s.haStato[0] if s.haStato else None
-        if stato:
-            acts = azioni_da_regole(
-                stato.haIlluminazione, 
-                stato.haTemperatura, 
-                stato.haOccupazione, 
-                stato.haOrario[0] if stato.haOrario else None
-            )
-            if acts:
-                azioni_per_stanza[s.name] = acts
+    for s, acts in zip(stanze_con_stato, decodifica_azioni(matrice)):
+        if acts:
+            azioni_per_stanza[s.name] = acts
+
+    contesto.chiudi_kb(onto)
 
     azioni_totali = {}
     for acts in azioni_per_stanza.values():
@@ -1,92 +1,88 @@
-from owlready2 import *
 import os
-from regole import azioni_da_regole
+from archivio_kb import percorso_kb, salva_kb
+from contesto_pipeline import ContestoPipeline
+from regole import REGISTRO_AZIONI, azioni_da_regole, codifica_azioni, decodifica_azioni
+from azioni_kb import classi_azione, indice_dispositivi, materializza_azioni
+from stato_dispositivi import StatoDispositivi
+from metriche import conta
 
-def main():
-    base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-    kb_path = os.path.join(base_dir, "ontology", "smarthome_popolata.owl")
+def main(argv=None, contesto=None):
+    contesto = contesto or ContestoPipeline()
+    kb_path = percorso_kb("smarthome_popolata")
 
     if not os.path.exists(kb_path):
         print(f"ERRORE : file ontologia non trovato: '{os.path.relpath(kb_path)}'")
         return
 
-    onto = get_ontology(kb_path).load()
+    onto = contesto.apri_kb("smarthome_popolata", "smarthome_con_azioni")
 
-    azione_to_classe = {
-        "AccendiLuce": onto.AccendiLuce,
-        "SpegniLuce": onto.SpegniLuce,
-        "AccendiRiscaldamento": onto.AccendiRiscaldamento,
-        "SpegniRiscaldamento": onto.SpegniRiscaldamento,
-        "AccendiClimatizzatore": onto.AccendiClimatizzatore,
-        "SpegniClimatizzatore": onto.SpegniClimatizzatore,
-        "AlzaTapparelle": onto.AlzaTapparelle,
-        "AbbassaTapparelle": onto.AbbassaTapparelle
-    }
+    # Classi delle azioni dal registro di regole.py: nessuna classe creata per stanza
+    classi = classi_azione(onto)
+
+    # Istantanea della KB: nessuna isteresi, solo deduplica e risoluzione dei conflitti
+    dispositivi = StatoDispositivi(isteresi={})
+    suggerite = scritte = 0
 
     print("\nApplicazione regole Python e confronto con inferenze reasoner...\n")
 
     # Eseguo reasoner per aggiornare le classi derivabili
-    with onto:
-        try:
-            sync_reasoner(infer_property_values=True, debug=0)
-            print("Reasoner completato.")
-        except Exception as e:
-            print(f"ATTENZIONE: Reasoner non completato correttamente: {e}")
-
-    for casa in onto.Casa.instances():
-        for stanza in casa.haStanza:
-            if not stanza.haStato:
-                continue
-            stato = stanza.haStato[0]
-
-            temp = getattr(stato, "haTemperatura", None)
-            light = getattr(stato, "haIlluminazione", None)
-            occupazione = getattr(stato, "haOccupazione", None)
-
-            if temp is None or light is None or occupazione is None:
-                continue
-
-            # --- Azioni dalle regole Python ---
-            azioni_python = azioni_da_regole(light, temp, occupazione)
-
-            # --- Azioni già presenti in KB ---
-            azioni_kb_before = [a.__class__.__name__ for a in stato.suggerisceAzione]
-
-            print(f"\nStanza: {stanza.name}")
-            print(f" - Azioni Python: {azioni_python}")
-            print(f" - Azioni KB: {azioni_kb_before}")
-
-            # Pulizia dei nomi per confronto
-            azioni_kb_clean = [a.replace("Azione_", "").split("_")[0].replace(" ", "").lower() for a in azioni_kb_before]
-            azioni_python_clean = [a.replace(" ", "").lower() for a in azioni_python]
-
-            differenze = set(azioni_python_clean) ^ set(azioni_kb_clean)
-            if differenze:
-                print(f"Differenze tra Python e KB: {differenze}")
-            else:
-                print("Azioni coerenti tra Python e KB.")
-
-            # aggiungo azioni KB mancanti direttamente
-            for az in azioni_python:
-                az_clean = az.replace(" ", "")
-                if az_clean.lower() not in azioni_kb_clean:
-                    AzClasse = azione_to_classe.get(az_clean, type(f"Azione_{az}_{stanza.name}", (onto.Azione,), {}))
-                    azione_istanza = AzClasse(f"{az}_{stanza.name}")
-                    # Collegamento ai dispositivi
-                    if "Luce" in az:
-                        azione_istanza.controllaDispositivo.extend([d for d in stanza.haDispositivo if isinstance(d, onto.Luce)])
-                    elif "Riscaldamento" in az:
-                        azione_istanza.controllaDispositivo.extend([d for d in stanza.haDispositivo if isinstance(d, onto.Riscaldamento)])
-                    elif "Climatizzatore" in az:
-                        azione_istanza.controllaDispositivo.extend([d for d in stanza.haDispositivo if isinstance(d, onto.Climatizzatore)])
-                    elif "Tapparella" in az:
-                        azione_istanza.controllaDispositivo.extend([d for d in stanza.haDispositivo if isinstance(d, onto.Tapparella)])
-                    stato.suggerisceAzione.append(azione_istanza)
-
-    output_path = os.path.join(base_dir, "ontology", "smarthome_con_azioni.owl")
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    onto.save(file=output_path, format="rdfxml")
-    print(f"\nAzioni applicate e KB salvata in '{os.path.relpath(output_path)}'.")
+    try:
+        contesto.esegui_reasoner(onto, kb_path)
+        print("Reasoner completato.")
+    except Exception as e:
+        print(f"ATTENZIONE: Reasoner non completato correttamente: {e}")
+
+    stanze = [stanza for casa in onto.Casa.instances() for stanza in casa.haStanza]
+    dispositivi_stanza = indice_dispositivi(onto, stanze)
+
+    for stanza in stanze:
+        if not stanza.haStato:
+            continue
+        stato = stanza.haStato[0]
+
+        temp = getattr(stato, "haTemperatura", None)
+        light = getattr(stato, "haIlluminazione", None)
+        occupazione = getattr(stato, "haOccupazione", None)
+
+        if temp is None or light is None or occupazione is None:
+            continue
+
+        # --- Azioni dalle regole Python ---
+        azioni_python = azioni_da_regole(light, temp, occupazione)
+
+        # --- Azioni già presenti in KB ---
+        azioni_kb_before = [a.__class__.__name__ for a in stato.suggerisceAzione]
+
+        print(f"\nStanza: {stanza.name}")
+        print(f" - Azioni Python: {azioni_python}")
+        print(f" - Azioni KB: {azioni_kb_before}")
+
+        # Pulizia dei nomi per confronto
+        azioni_kb_clean = [a.replace("Azione_", "").split("_")[0].replace(" ", "").lower() for a in azioni_kb_before]
+        azioni_python_clean = [a.replace(" ", "").lower() for a in azioni_python]
+
+        differenze = set(azioni_python_clean) ^ set(azioni_kb_clean)
+        if differenze:
+            print(f"Differenze tra Python e KB: {differenze}")
+        else:
+            print("Azioni coerenti tra Python e KB.")
+
+        # Solo i comandi che cambiano lo stato dei dispositivi rispetto alle azioni già in KB
+        dispositivi.imposta([stanza.name], codifica_azioni([[REGISTRO_AZIONI[a][0] for a in azioni_kb_clean if a in REGISTRO_AZIONI]]))
+        _, comandi = dispositivi.filtra([stanza.name], codifica_azioni([azioni_python]))
+        azioni_nuove = decodifica_azioni(comandi)[0] if len(comandi) else []
+        suggerite += len(azioni_python)
+        scritte += len(azioni_nuove)
+
+        # aggiungo azioni KB mancanti direttamente
+        materializza_azioni(stato, stanza, azioni_nuove, classi, dispositivi_stanza[stanza])
+
+    output_path = salva_kb(onto, "smarthome_con_azioni")
+    contesto.registra_kb("smarthome_con_azioni", onto)
+    conta("regole.azioni_suggerite", suggerite)
+    conta("regole.azioni_scritte", scritte)
+    print(f"\nAzioni suggerite: {suggerite}, azioni scritte in KB: {scritte} (duplicati e conflitti risolti, già presenti scartate)")
+    print(f"Azioni applicate e KB salvata in '{os.path.relpath(output_path)}'.")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,111 @@
+import os
+import sqlite3
+from metriche import cronometro
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+ONTOLOGY_DIR = os.path.join(BASE_DIR, "ontology")
+IRI_ONTOLOGIA = "http://example.org/ontology/smarthome.owl"
+
+# "rdfxml": un file .owl per passo (parsing e serializzazione completi a ogni script)
+# "sqlite": un quadstore owlready2 persistente per passo, senza parsing RDF/XML
+# Si sceglie con la variabile d'ambiente (es. SMARTHOME_BACKEND=sqlite python main.py)
+VARIABILE_BACKEND = "SMARTHOME_BACKEND"
+ESTENSIONI = {"rdfxml": ".owl", "sqlite": ".sqlite3"}
+
+BACKEND = os.environ.get(VARIABILE_BACKEND, "").strip().lower() or "rdfxml"
+if BACKEND not in ESTENSIONI:
+    print(f"ATTENZIONE: {VARIABILE_BACKEND}='{BACKEND}' non valido (validi: {', '.join(ESTENSIONI)}), uso rdfxml.")
+    BACKEND = "rdfxml"
+
+# KB prodotte dai passi della pipeline
+KB_PIPELINE = ["smarthome", "smarthome_popolata", "smarthome_con_azioni"]
+
+def percorso_kb(nome, backend=None):
+    return os.path.join(ONTOLOGY_DIR, nome + ESTENSIONI[backend or BACKEND])
+
+# owlready2 è importato nelle funzioni che aprono le KB: chi usa solo i percorsi
+# (pipeline, benchmark) non lo carica
+
+def _world_sqlite(percorso=None):
+    # Quadstore SQLite in memoria, caricato dal file con il backup di SQLite (copia delle
+    # pagine, senza parsing). Le modifiche restano in memoria finché salva_kb non le scrive:
+    # il file sorgente non viene mai aperto in scrittura
+    from owlready2 import World
+    if percorso is None:
+        return World()
+    memoria = sqlite3.connect(":memory:", isolation_level="DEFERRED", check_same_thread=False)
+    sorgente = sqlite3.connect(f"file:{percorso}?mode=ro", uri=True)
+    try:
+        sorgente.backup(memoria)
+    finally:
+        sorgente.close()
+    return World(filename=percorso, connection=memoria, exclusive=False)
+
+def crea_kb(nome):
+    # Nuova ontologia vuota per il passo che definisce la TBox
+    from owlready2 import default_world
+    if BACKEND == "sqlite":
+        return _world_sqlite().get_ontology(IRI_ONTOLOGIA)
+    return default_world.get_ontology(IRI_ONTOLOGIA)
+
+def apri_kb(sorgente, destinazione=None, world_separato=False):
+    # La KB sorgente resta invariata: chi produce 'destinazione' la salva con salva_kb.
+    # Con world_separato il file RDF/XML è caricato in un World nuovo invece che in quello di
+    # default (che in un processo con più passi può già contenere un'altra KB con lo stesso IRI)
+    from owlready2 import World, default_world
+    percorso = percorso_kb(sorgente)
+    with cronometro("kb.apertura"):
+        if BACKEND == "sqlite":
+            return _world_sqlite(percorso).get_ontology(IRI_ONTOLOGIA).load()
+        return (World() if world_separato else default_world).get_ontology(percorso).load()
+
+def apri_kb_isolata(nome):
+    # KB in un World separato e usa e getta (per analisi che modificano il quadstore)
+    return apri_kb(nome, world_separato=True)
+
+def salva_kb(onto, nome):
+    percorso = percorso_kb(nome)
+    os.makedirs(os.path.dirname(percorso), exist_ok=True)
+    with cronometro("kb.salvataggio"):
+        if BACKEND == "sqlite":
+            # Backup del quadstore in memoria su un file temporaneo poi rinominato: un
+            # salvataggio interrotto non lascia una KB a metà
+            onto.world.graph.commit()
+            destinazione = sqlite3.connect(percorso + ".tmp")
+            try:
+                onto.world.graph.db.backup(destinazione)
+            finally:
+                destinazione.close()
+            os.replace(percorso + ".tmp", percorso)
+        else:
+            onto.save(file=percorso, format="rdfxml")
+    return percorso
+
+def chiudi_kb(onto):
+    # Per i passi in sola lettura: scarta il quadstore in memoria e le modifiche non salvate
+    if BACKEND == "sqlite":
+        onto.world.close()
+
+def esporta_rdfxml(nome):
+    # Esportazione esplicita di un quadstore SQLite nel file .owl corrispondente
+    world = _world_sqlite(percorso_kb(nome, "sqlite"))
+    onto = world.get_ontology(IRI_ONTOLOGIA).load()
+    destinazione = percorso_kb(nome, "rdfxml")
+    onto.save(file=destinazione, format="rdfxml")
+    world.close()
+    return destinazione
+
+def main():
+    print("Esportazione delle KB SQLite in RDF/XML...")
+    esportate = 0
+    for nome in KB_PIPELINE:
+        if not os.path.exists(percorso_kb(nome, "sqlite")):
+            continue
+        destinazione = esporta_rdfxml(nome)
+        print(f"KB '{nome}' esportata in '{os.path.relpath(destinazione)}'.")
+        esportate += 1
+    if not esportate:
+        print(f"ERRORE: nessun quadstore SQLite trovato in '{os.path.relpath(ONTOLOGY_DIR)}'.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import os
+import numpy as np
+import pandas as pd
+from joblib import dump, load
+
+# Artefatto di inferenza: tutto il necessario per valutare righe grezze senza il dataset
+# di training (feature in ordine, dtype, scaler eventuale, modello)
+VERSIONE_ARTEFATTO = 1
+
+class ArtefattoModello:
+    def __init__(self, modello, features, dtypes, scaler=None):
+        self.modello = modello
+        self.features = list(features)
+        self.dtypes = dict(dtypes)
+        self.scaler = scaler
+        # Stimatori addestrati su DataFrame: stesse colonne in inferenza, senza avvisi di sklearn
+        self._con_nomi = hasattr(modello, "feature_names_in_")
+        self._scaler_con_nomi = hasattr(scaler, "feature_names_in_")
+
+    def matrice(self, righe):
+        # dict (una lettura), lista di dict, DataFrame o array (righe x features) -> matrice float
+        if isinstance(righe, dict):
+            righe = [righe]
+        if isinstance(righe, pd.DataFrame):
+            mancanti = [f for f in self.features if f not in righe.columns]
+            if mancanti:
+                raise KeyError(f"feature mancanti: {mancanti}")
+            return righe[self.features].astype(self.dtypes).to_numpy(dtype=float)
+        if isinstance(righe, np.ndarray):
+            matrice = np.atleast_2d(righe).astype(float, copy=False)
+            if matrice.shape[1] != len(self.features):
+                raise ValueError(f"attese {len(self.features)} feature, ricevute {matrice.shape[1]}")
+            return matrice
+        return np.array([[riga[f] for f in self.features] for riga in righe], dtype=float)
+
+    def _con_colonne(self, matrice):
+        return pd.DataFrame(matrice, columns=self.features, copy=False)
+
+    def _ingresso(self, matrice):
+        if self.scaler is not None:
+            matrice = self.scaler.transform(self._con_colonne(matrice) if self._scaler_con_nomi else matrice)
+        return self._con_colonne(matrice) if self._con_nomi else matrice
+
+    def probabilita(self, righe):
+        # Probabilità di occupazione per riga
+        return self.modello.predict_proba(self._ingresso(self.matrice(righe)))[:, 1]
+
+    def predici(self, righe):
+        return self.modello.predict(self._ingresso(self.matrice(righe)))
+
+def salva_artefatto(percorso, modello, features, dtypes, scaler=None):
+    # Senza compressione: gli array del modello (es. alberi della RandomForest) restano mappabili
+    os.makedirs(os.path.dirname(percorso), exist_ok=True)
+    artefatto = {
+        "versione": VERSIONE_ARTEFATTO,
+        "features": list(features),
+        "dtypes": {f: str(t) for f, t in dict(dtypes).items()},
+        "scaler": scaler,
+        "modello": modello,
+    }
+    dump(artefatto, percorso)
+    return percorso
+
+def carica_artefatto(percorso, mmap_mode="c"):
+    # Con mmap_mode gli array grandi sono letti in memory-mapping invece che copiati in RAM;
+    # "c" (copy-on-write) perché libsvm rifiuta i buffer in sola lettura
+    dati = load(percorso, mmap_mode=mmap_mode)
+    if not isinstance(dati, dict) or dati.get("versione") != VERSIONE_ARTEFATTO:
+        raise ValueError(f"'{os.path.relpath(percorso)}' non è un artefatto di inferenza: rieseguire predizione_occupazione.py")
+    return ArtefattoModello(dati["modello"], dati["features"], dati["dtypes"], dati["scaler"])
@@ -0,0 +1,36 @@
+from regole import REGISTRO_AZIONI, CLASSE_GENERICA, voce_azione
+
+# Materializzazione delle azioni nella KB: classi dal registro di regole.py (la TBox non cresce
+# con le stanze) e dispositivi cercati in un indice per stanza e tipo
+TIPI_DISPOSITIVO = sorted({tipo for _, _, tipo in REGISTRO_AZIONI.values()})
+
+def classi_azione(onto):
+    # Nome classe -> classe dell'ontologia, per il solo insieme fisso del registro
+    nomi = {classe for _, classe, _ in REGISTRO_AZIONI.values()} | {CLASSE_GENERICA}
+    return {nome: getattr(onto, nome) for nome in nomi}
+
+def indice_dispositivi(onto, stanze):
+    # Stanza -> {tipo: [dispositivi]}; il tipo è letto dalle classi asserite (con le loro
+    # sottoclassi) invece che con isinstance(), che interroga il quadstore
+    tipi = {sotto: tipo for tipo in TIPI_DISPOSITIVO for sotto in getattr(onto, tipo).descendants()}
+    indice = {}
+    for stanza in stanze:
+        per_tipo = indice.setdefault(stanza, {})
+        for disp in stanza.haDispositivo:
+            for tipo in {tipi[c] for c in disp.is_a if c in tipi}:
+                per_tipo.setdefault(tipo, []).append(disp)
+    return indice
+
+def materializza_azioni(stato, stanza, azioni, classi, dispositivi):
+    # Un individuo per azione ("<azione>_<stanza>", riusato se esiste già), collegato ai
+    # dispositivi del tipo controllato e suggerito dallo stato
+    individui = []
+    for az in azioni:
+        nome, classe, tipo = voce_azione(az)
+        azione = classi[classe](f"{nome}_{stanza.name}")
+        if tipo:
+            azione.controllaDispositivo.extend(d for d in dispositivi.get(tipo, ()) if d not in azione.controllaDispositivo)
+        if azione not in stato.suggerisceAzione:
+            stato.suggerisceAzione.append(azione)
+        individui.append(azione)
+    return individui
@@ -0,0 +1,81 @@
+import os
+import sys
+import argparse
+import statistics
+import subprocess
+import time
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.abspath(os.path.join(SCRIPTS_DIR, ".."))
+
+# Budget di avvio per punto d'ingresso, in secondi al netto dell'avvio dell'interprete:
+# import del modulo (per main.py: fino al menu e all'uscita). Gli script che servono
+# solo a leggere percorsi, CSV o opzioni non devono caricare owlready2 né sklearn.
+BUDGET_S = {
+    "main.py": 0.1,
+    "pipeline": 0.4,
+    "benchmark_pipeline": 0.4,
+    "archivio_kb": 0.1,
+    "ragionamento": 0.1,
+    "ontologia": 0.1,
+    "genera_istanze": 0.5,
+    "applica_regole": 0.5,
+    "genera_dataset": 1.0,
+    "predizione_occupazione": 1.0,
+    "analisi_KBS": 1.0,
+    "streaming_regole": 0.5,
+    "servizio_predizione": 1.0,
+}
+RIPETIZIONI = 5
+MODULI_PESANTI = ["owlready2", "sklearn", "pandas", "pyarrow"]
+
+def comando(entry):
+    if entry.endswith(".py"):
+        return [sys.executable, os.path.join(BASE_DIR, entry)], "0\n"
+    return [sys.executable, "-c", f"import {entry}"], None
+
+def misura(argomenti, ingresso=None, ripetizioni=RIPETIZIONI):
+    # Mediana su più avvii di un interprete nuovo (la prima esecuzione scalda la cache del disco)
+    tempi = []
+    for _ in range(ripetizioni + 1):
+        inizio = time.perf_counter()
+        subprocess.run(argomenti, input=ingresso, cwd=SCRIPTS_DIR, text=True, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        tempi.append(time.perf_counter() - inizio)
+    return statistics.median(tempi[1:])
+
+def moduli_pesanti(argomenti, ingresso=None):
+    # Moduli di MODULI_PESANTI importati all'avvio, dal report di -X importtime
+    risultato = subprocess.run([argomenti[0], "-X", "importtime"] + argomenti[1:], input=ingresso,
+                               cwd=SCRIPTS_DIR, text=True, capture_output=True)
+    importati = {riga.rsplit("|", 1)[-1].strip() for riga in risultato.stderr.splitlines() if riga.startswith("import time:")}
+    return [m for m in MODULI_PESANTI if m in importati]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tempo di avvio dei punti d'ingresso rispetto al budget (BUDGET_S).")
+    parser.add_argument("entry", nargs="*", default=list(BUDGET_S), help="punti d'ingresso (default tutti)")
+    parser.add_argument("--ripetizioni", type=int, default=RIPETIZIONI)
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+
+    interprete = misura([sys.executable, "-c", "pass"], ripetizioni=args.ripetizioni)
+    print(f"Avvio dell'interprete: {interprete:.3f} s (sottratto dai tempi)\n")
+    print(f"{'punto di ingresso':<24} {'avvio':>8} {'budget':>8}  moduli pesanti")
+    fuori_budget = []
+    for entry in args.entry:
+        if entry not in BUDGET_S:
+            print(f"ERRORE: punto d'ingresso '{entry}' sconosciuto (validi: {', '.join(BUDGET_S)})")
+            sys.exit(2)
+        argomenti, ingresso = comando(entry)
+        secondi = max(misura(argomenti, ingresso, args.ripetizioni) - interprete, 0.0)
+        pesanti = moduli_pesanti(argomenti, ingresso)
+        esito = "" if secondi <= BUDGET_S[entry] else "  FUORI BUDGET"
+        print(f"{entry:<24} {secondi:7.3f}s {BUDGET_S[entry]:7.2f}s  {', '.join(pesanti) or '-'}{esito}")
+        if esito:
+            fuori_budget.append(entry)
+    if fuori_budget:
+        print(f"\nATTENZIONE: avvio oltre il budget per {', '.join(fuori_budget)}.")
+        sys.exit(1)
+    print("\nTutti i punti d'ingresso entro il budget.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+from metriche import picco_rss_mb
+from dataset_io import FORMATI, ScrittoreDataset, colonne_dataset, elimina_dataset, leggi_dataset, percorso_dataset
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.abspath(os.path.join(SCRIPTS_DIR, ".."))
+DATA_DIR = os.path.join(BASE_DIR, "data")
+USCITA = os.path.join(DATA_DIR, "benchmark_dataset.json")
+
+RIGHE = [100000, 1000000]  # Righe del dataset KB-enhanced ricampionato, per misura
+BLOCCO = 100000            # Righe per blocco scritto, come genera_dataset.py
+NON_LETTE = {"id", "casa", "stanza"}  # Le altre colonne sono quelle dell'addestramento
+
+def ricampiona(df, righe, seed=42):
+    # Righe ripetute a caso dal dataset generato: stesso schema e stesse distribuzioni
+    indici = np.random.default_rng(seed).integers(0, len(df), righe)
+    campione = df.iloc[indici].reset_index(drop=True)
+    campione["id"] = np.arange(righe)
+    return campione
+
+def scrivi(df, percorso, formato):
+    scrittore = ScrittoreDataset(percorso, formato)
+    try:
+        for inizio in range(0, len(df), BLOCCO):
+            scrittore.scrivi(df.iloc[inizio:inizio + BLOCCO])
+    finally:
+        scrittore.chiudi()
+
+def misura(percorso):
+    # Eseguita in un interprete nuovo: il picco di memoria è quello della sola lettura.
+    # La matrice float32 costringe anche il formato colonnare a leggere tutte le pagine
+    import pandas as pd  # noqa: F401  (import fuori dalla misura, come pyarrow per il Parquet)
+    colonne = [c for c in colonne_dataset(percorso) if c not in NON_LETTE]
+    prima = picco_rss_mb()
+    inizio = time.perf_counter()
+    df = leggi_dataset(percorso, colonne)
+    lettura = time.perf_counter() - inizio
+    dopo_lettura = picco_rss_mb()
+    matrice = df.to_numpy(np.float32)
+    totale = time.perf_counter() - inizio
+    dopo = picco_rss_mb()
+    return {
+        "righe": len(matrice),
+        "lettura_s": round(lettura, 3),
+        "lettura_matrice_s": round(totale, 3),
+        "picco_lettura_mb": None if prima is None else round(dopo_lettura - prima, 1),
+        "picco_matrice_mb": None if prima is None else round(dopo - prima, 1),
+    }
+
+def misura_in_processo(percorso):
+    esito = subprocess.run([sys.executable, os.path.abspath(__file__), "--misura", percorso],
+                           cwd=SCRIPTS_DIR, capture_output=True, text=True)
+    if esito.returncode != 0:
+        raise RuntimeError(f"misura di '{percorso}' fallita: {esito.stderr.strip()}")
+    return json.loads(esito.stdout.splitlines()[-1])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Tempo di caricamento e picco di memoria dei dataset nei formati di dataset_io.py, "
+                    "su copie ricampionate del dataset KB-enhanced generato.")
+    parser.add_argument("--righe", type=int, nargs="+", default=RIGHE, help=f"dimensioni (default {RIGHE})")
+    parser.add_argument("--formati", nargs="+", choices=sorted(FORMATI), default=list(FORMATI))
+    parser.add_argument("--uscita", default=USCITA, help="file JSON dei risultati")
+    parser.add_argument("--misura", help=argparse.SUPPRESS)
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+    if args.misura:
+        print(json.dumps(misura(args.misura)))
+        return
+
+    sorgente = percorso_dataset(DATA_DIR, "SmartHome_KB_enhanced")
+    if not os.path.exists(sorgente):
+        print(f"ERRORE: dataset non trovato: '{os.path.relpath(sorgente)}' (genera_dataset.py).")
+        return
+    if "parquet" in args.formati:
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            print("ATTENZIONE: pyarrow non installato, formato parquet escluso.")
+            args.formati = [f for f in args.formati if f != "parquet"]
+    df = leggi_dataset(sorgente)
+    if picco_rss_mb() is None:
+        print("ATTENZIONE: modulo resource non disponibile, picco di memoria non misurato.")
+
+    print(f"Benchmark dataset da '{os.path.relpath(sorgente)}' ({len(df)} righe), colonne di addestramento")
+    print(f"{'righe':>9} {'formato':<8} {'disco':>9} {'lettura':>9} {'+matrice':>9} {'picco':>10} {'+matrice':>10}")
+    risultati = []
+    with tempfile.TemporaryDirectory(dir=DATA_DIR) as cartella:
+        for righe in args.righe:
+            campione = ricampiona(df, righe)
+            percorsi = {}
+            for formato in args.formati:
+                percorsi[formato] = os.path.join(cartella, f"SmartHome_KB_enhanced_{righe}" + FORMATI[formato])
+                scrivi(campione, percorsi[formato], formato)
+            # Su Linux il picco di memoria del processo di misura parte da quello del padre al
+            # momento della creazione: il campione va liberato prima
+            del campione
+            for formato, percorso in percorsi.items():
+                if os.path.isdir(percorso):
+                    disco = sum(os.path.getsize(os.path.join(percorso, f)) for f in os.listdir(percorso))
+                else:
+                    disco = os.path.getsize(percorso)
+                voce = {"formato": formato, "disco_mb": round(disco / 2**20, 1), **misura_in_processo(percorso)}
+                risultati.append(voce)
+                picchi = ["-" if voce[k] is None else f"{voce[k]:.1f} MB" for k in ("picco_lettura_mb", "picco_matrice_mb")]
+                print(f"{righe:9d} {formato:<8} {voce['disco_mb']:6.1f} MB {voce['lettura_s']:8.3f}s "
+                      f"{voce['lettura_matrice_s']:8.3f}s {picchi[0]:>10} {picchi[1]:>10}")
+                elimina_dataset(percorso)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.uscita)), exist_ok=True)
+    with open(args.uscita, "w", encoding="utf-8") as f:
+        json.dump({"data": time.strftime("%Y-%m-%dT%H:%M:%S"), "sorgente": os.path.relpath(sorgente, BASE_DIR),
+                   "risultati": risultati}, f, indent=2)
+    print(f"\nRisultati salvati in '{os.path.relpath(args.uscita)}'.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import sys
+import time
+import random
+from owlready2 import World, Thing
+from genera_dataset import CLASSI_INFERITE, indice_classi_inferite
+
+# Numero di stanze per punto della curva; la scansione lineare è misurata solo fino a LIMITE_SCANSIONE
+DIMENSIONI = [250, 500, 1000, 2000, 4000, 8000, 16000]
+LIMITE_SCANSIONE = 2000
+PROB_APPARTENENZA = 0.3
+
+def crea_ontologia_sintetica(num_stanze, seed=42):
+    # Ontologia con le sole classi derivate, appartenenze asserite come se inferite dal reasoner
+    rng = random.Random(seed)
+    world = World()
+    onto = world.get_ontology("http://example.org/ontology/benchmark_indice.owl")
+    with onto:
+        class Stanza(Thing): pass
+        classi = [type(nome, (Stanza,), {}) for nome in CLASSI_INFERITE]
+        stanze = []
+        for i in range(num_stanze):
+            stanza = Stanza(f"Stanza_{i}")
+            stanza.is_a.extend(c for c in classi if rng.random() < PROB_APPARTENENZA)
+            stanze.append(stanza)
+    return onto, stanze
+
+def feature_scansione(onto, stanze):
+    # Percorso originale: una chiamata instances() per feature e per stanza
+    return [
+        {f"is_{nome}": int(stanza in getattr(onto, nome).instances()) for nome in CLASSI_INFERITE}
+        for stanza in stanze
+    ]
+
+def feature_indice(onto, stanze):
+    indice = indice_classi_inferite(onto, CLASSI_INFERITE)
+    return [
+        {f"is_{nome}": int(nome in indice.get(stanza, set())) for nome in CLASSI_INFERITE}
+        for stanza in stanze
+    ]
+
+def cronometra(funzione, *args):
+    start = time.perf_counter()
+    risultato = funzione(*args)
+    return time.perf_counter() - start, risultato
+
+def main():
+    dimensioni = [int(n) for n in sys.argv[1:]] or DIMENSIONI
+    print("Benchmark feature is_*: scansione instances() vs indice delle classi inferite")
+    print(f"{'stanze':>8} {'scansione (s)':>14} {'indice (s)':>11} {'us/stanza idx':>14} {'speedup':>8}")
+
+    for n in dimensioni:
+        onto, stanze = crea_ontologia_sintetica(n)
+        t_indice, righe_indice = cronometra(feature_indice, onto, stanze)
+
+        if n <= LIMITE_SCANSIONE:
+            t_scansione, righe_scansione = cronometra(feature_scansione, onto, stanze)
+            if righe_scansione != righe_indice:
+                print(f"ERRORE: risultati diversi tra scansione e indice per {n} stanze.")
+                return
+            scansione = f"{t_scansione:14.3f}"
+            speedup = f"{t_scansione / t_indice:7.1f}x"
+        else:
+            scansione, speedup = f"{'-':>14}", f"{'-':>8}"
+
+        print(f"{n:8d} {scansione} {t_indice:11.3f} {t_indice / n * 1e6:14.1f} {speedup}")
+        onto.world.close()
+
+if __name__ == "__main__":
+    main()
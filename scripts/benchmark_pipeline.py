@@ -0,0 +1,199 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+from archivio_kb import BACKEND, apri_kb_isolata, percorso_kb
+from dataset_io import percorso_dataset, leggi_dataset
+from metriche import rss_in_mb
+from pipeline import intervallo_stadi
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.abspath(os.path.join(SCRIPTS_DIR, ".."))
+DATA_DIR = os.path.join(BASE_DIR, "data")
+
+# Passi della pipeline di main.py: (nome, script, argomenti, KB prodotta, prodotto in righe)
+STADI = {
+    1: ("ontologia", "ontologia.py", [], "smarthome", None),
+    2: ("istanze", "genera_istanze.py", ["--num-case", "{num_case}", "--seed", "{seed}"], "smarthome_popolata", None),
+    3: ("dataset", "genera_dataset.py", [], None, "dataset"),
+    4: ("regole", "applica_regole.py", [], "smarthome_con_azioni", None),
+    5: ("predizione", "predizione_occupazione.py", [], None, None),
+    6: ("analisi", "analisi_KBS.py", [], None, "report"),
+}
+DIMENSIONI = [50, 500, 5000]  # NUM_CASE
+SEED = 1
+TIMEOUT_S = 3600  # Oltre, lo stadio è considerato fallito
+TOLLERANZA = 0.2  # Regressione: tempo o memoria oltre il 20% della baseline
+USCITA = os.path.join(DATA_DIR, "benchmark_pipeline.json")
+BASELINE = os.path.join(DATA_DIR, "benchmark_pipeline_baseline.json")
+
+# Processo intermedio per stadio: attende lo script e riporta su stderr il suo picco RSS
+# (RUSAGE_CHILDREN del solo intermedio, quindi del solo stadio). Il timeout è applicato qui,
+# così l'uccisione raggiunge lo script e non solo l'intermedio
+MISURA_STADIO = """
+import sys, json, subprocess
+try:
+    codice = subprocess.run(sys.argv[2:], stderr=subprocess.STDOUT, timeout=float(sys.argv[1]) or None).returncode
+except subprocess.TimeoutExpired:
+    codice = None
+try:
+    import resource
+    picco = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+except ImportError:
+    picco = None
+sys.stderr.write(json.dumps({"codice": codice, "ru_maxrss": picco}))
+"""
+
+def esegui_stadio(script, argomenti, log, timeout=TIMEOUT_S):
+    inizio = time.perf_counter()
+    with open(log, "w", encoding="utf-8") as f:
+        processo = subprocess.run([sys.executable, "-c", MISURA_STADIO, str(timeout or 0), sys.executable, script] + argomenti,
+                                  cwd=SCRIPTS_DIR, stdout=f, stderr=subprocess.PIPE, text=True)
+    secondi = time.perf_counter() - inizio
+    try:
+        misura = json.loads(processo.stderr.strip().splitlines()[-1])
+    except (ValueError, IndexError):
+        misura = {"codice": processo.returncode or 1, "ru_maxrss": None}
+    picco_mb = None if misura["ru_maxrss"] is None else rss_in_mb(misura["ru_maxrss"])
+    if misura["codice"] is None:
+        esito = "timeout"
+    elif misura["codice"] != 0:
+        esito = "errore"
+    else:
+        # Gli script segnalano i fallimenti con "ERRORE" senza codice di uscita
+        with open(log, encoding="utf-8", errors="replace") as f:
+            esito = "errore" if any(riga.lstrip().startswith("ERRORE") for riga in f) else "ok"
+    return esito, secondi, picco_mb
+
+def conta_triple(nome_kb):
+    if not os.path.exists(percorso_kb(nome_kb)):
+        return None
+    world = apri_kb_isolata(nome_kb).world
+    triple = world.graph.execute("SELECT COUNT() FROM quads").fetchone()[0]
+    world.close()
+    return triple
+
+def conta_righe(prodotto):
+    if prodotto == "dataset":
+        percorso = percorso_dataset(DATA_DIR, "SmartHome_KB_enhanced")
+        return len(leggi_dataset(percorso, ["id"])) if os.path.exists(percorso) else None
+    percorso = os.path.join(DATA_DIR, "report_KBS_reasoning.csv")
+    if not os.path.exists(percorso):
+        return None
+    with open(percorso, encoding="utf-8") as f:
+        return max(sum(1 for _ in f) - 1, 0)
+
+def esegui_benchmark(dimensioni, stadi, seed=SEED, timeout=TIMEOUT_S, bulk=False, log_dir=None):
+    log_dir = log_dir or os.path.join(DATA_DIR, "benchmark_log")
+    os.makedirs(log_dir, exist_ok=True)
+    risultati = []
+    for num_case in dimensioni:
+        fallito = None
+        for stadio in stadi:
+            nome, script, argomenti, kb, prodotto = STADI[stadio]
+            voce = {"num_case": num_case, "stadio": stadio, "nome": nome}
+            if fallito:
+                # Gli stadi successivi dipendono dai file di quello fallito
+                voce.update(esito=f"saltato ({fallito})", secondi=None, picco_rss_mb=None, triple=None, righe=None)
+                risultati.append(voce)
+                print(f"{num_case:>7} {stadio}:{nome:<11} saltato")
+                continue
+            argomenti = [a.format(num_case=num_case, seed=seed) for a in argomenti]
+            if bulk and stadio == 2:
+                argomenti.append("--bulk")
+            log = os.path.join(log_dir, f"{num_case}_{stadio}_{nome}.log")
+            esito, secondi, picco_mb = esegui_stadio(script, argomenti, log, timeout)
+            voce.update(
+                esito=esito,
+                secondi=round(secondi, 3),
+                picco_rss_mb=None if picco_mb is None else round(picco_mb, 1),
+                triple=conta_triple(kb) if kb and esito == "ok" else None,
+                righe=conta_righe(prodotto) if prodotto and esito == "ok" else None,
+            )
+            risultati.append(voce)
+            prodotti = "".join(f"  {voce[k]:,} {k}" for k in ("triple", "righe") if voce[k] is not None)
+            picco = "-" if picco_mb is None else f"{picco_mb:.1f} MB"
+            print(f"{num_case:>7} {stadio}:{nome:<11} {esito:<8} {secondi:9.2f} s {picco:>12}{prodotti}")
+            if esito != "ok":
+                fallito = nome
+    return risultati
+
+def confronta(risultati, baseline, tolleranza=TOLLERANZA):
+    # Regressioni rispetto alla baseline: tempo o picco di memoria oltre la tolleranza,
+    # oppure uno stadio che nella baseline riusciva e ora no
+    riferimento = {(r["num_case"], r["stadio"]): r for r in baseline["risultati"]}
+    regressioni = []
+    for r in risultati:
+        b = riferimento.get((r["num_case"], r["stadio"]))
+        if b is None or b["esito"] != "ok":
+            continue
+        if r["esito"] != "ok":
+            regressioni.append((r, "esito", b["esito"], r["esito"]))
+            continue
+        for misura in ("secondi", "picco_rss_mb"):
+            if b[misura] and r[misura] is not None and r[misura] > b[misura] * (1 + tolleranza):
+                regressioni.append((r, misura, b[misura], r[misura]))
+    return regressioni
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark degli stadi della pipeline di main.py a più dimensioni (NUM_CASE). "
+                    "Rigenera ontologie, dataset e modelli nelle cartelle del progetto.")
+    parser.add_argument("--num-case", type=int, nargs="+", default=DIMENSIONI, help=f"dimensioni (default {DIMENSIONI})")
+    parser.add_argument("--stadi", type=intervallo_stadi, default=list(STADI), help="stadi da eseguire, es. 1-6 o 2,3 (default tutti)")
+    parser.add_argument("--bulk", action="store_true", help="generazione massiva delle istanze (genera_istanze.py --bulk)")
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--timeout", type=float, default=TIMEOUT_S, help=f"secondi massimi per stadio (default {TIMEOUT_S})")
+    parser.add_argument("--uscita", default=USCITA, help="file JSON dei risultati")
+    parser.add_argument("--baseline", default=BASELINE, help="file JSON di riferimento per il confronto")
+    parser.add_argument("--salva-baseline", action="store_true", help="salva i risultati anche come nuova baseline")
+    parser.add_argument("--tolleranza", type=float, default=TOLLERANZA, help=f"margine di regressione (default {TOLLERANZA})")
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+
+    print(f"Benchmark pipeline: stadi {args.stadi}, NUM_CASE {args.num_case}, backend {BACKEND}")
+    print(f"{'NUM_CASE':>7} {'stadio':<13} {'esito':<8} {'tempo':>11} {'picco RSS':>12}")
+    risultati = esegui_benchmark(args.num_case, args.stadi, args.seed, args.timeout, args.bulk)
+    if any(r["secondi"] is not None for r in risultati) and all(r["picco_rss_mb"] is None for r in risultati):
+        print("ATTENZIONE: picco di memoria non misurato (modulo resource non disponibile su questa piattaforma).")
+    rapporto = {
+        "data": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "ambiente": {
+            "python": platform.python_version(),
+            "piattaforma": platform.platform(),
+            "cpu": os.cpu_count(),
+            "backend": BACKEND,
+            "bulk": args.bulk,
+        },
+        "risultati": risultati,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.uscita)), exist_ok=True)
+    with open(args.uscita, "w", encoding="utf-8") as f:
+        json.dump(rapporto, f, indent=2)
+    print(f"\nRisultati salvati in '{os.path.relpath(args.uscita)}'.")
+
+    # Primo stadio che non regge, per dimensione
+    for num_case in args.num_case:
+        falliti = [r for r in risultati if r["num_case"] == num_case and r["esito"] in ("errore", "timeout")]
+        if falliti:
+            print(f"NUM_CASE {num_case}: primo stadio fallito '{falliti[0]['nome']}' ({falliti[0]['esito']}).")
+
+    regressioni = []
+    if os.path.exists(args.baseline) and not args.salva_baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressioni = confronta(risultati, json.load(f), args.tolleranza)
+        for r, misura, prima, dopo in regressioni:
+            print(f"ATTENZIONE: regressione NUM_CASE {r['num_case']}, stadio '{r['nome']}', {misura}: {prima} -> {dopo}")
+        if not regressioni:
+            print(f"Nessuna regressione rispetto a '{os.path.relpath(args.baseline)}' (tolleranza {args.tolleranza:.0%}).")
+    if args.salva_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(rapporto, f, indent=2)
+        print(f"Baseline salvata in '{os.path.relpath(args.baseline)}'.")
+    if regressioni:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
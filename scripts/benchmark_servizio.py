@@ -0,0 +1,66 @@
+import os
+import sys
+import time
+import argparse
+import threading
+import numpy as np
+from dataset_io import percorso_dataset, leggi_dataset
+from servizio_predizione import DATA_DIR, Metriche, ServizioPredizione
+
+DURATA_S = 5.0
+CLIENT = 64  # Thread che inviano richieste concorrenti
+RIGHE_PER_RICHIESTA = [1, 8]  # Letture singole e micro-batch
+
+def letture_di_prova(features, num_righe=10000):
+    # Righe reali del dataset, con le sole feature usate dal modello
+    percorso = percorso_dataset(DATA_DIR, "SmartHome_KB_enhanced")
+    if not os.path.exists(percorso):
+        raise FileNotFoundError(f"dataset non trovato: '{os.path.relpath(percorso)}'")
+    X = leggi_dataset(percorso, features).to_numpy(dtype=float)
+    return X[np.random.default_rng(42).integers(0, len(X), num_righe)]
+
+def cliente(servizio, X, righe_per_richiesta, fine, seed):
+    rng = np.random.default_rng(seed)
+    while time.perf_counter() < fine:
+        i = rng.integers(0, len(X) - righe_per_richiesta)
+        if righe_per_richiesta == 1:
+            servizio.predici(dict(zip(servizio.features, X[i])))
+        else:
+            servizio.predici(X[i:i + righe_per_richiesta])
+
+def esegui_carico(servizio, X, client, righe_per_richiesta, durata):
+    fine = time.perf_counter() + durata
+    threads = [
+        threading.Thread(target=cliente, args=(servizio, X, righe_per_richiesta, fine, seed))
+        for seed in range(client)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generatore di carico per il servizio di predizione dell'occupazione.")
+    parser.add_argument("--label", default="KB", help="dataset del modello (Base o KB)")
+    parser.add_argument("--modello", default="RandomForest", help="RandomForest, LogisticRegression o SVM")
+    parser.add_argument("--client", type=int, default=CLIENT, help=f"client concorrenti (default {CLIENT})")
+    parser.add_argument("--durata", type=float, default=DURATA_S, help=f"secondi per scenario (default {DURATA_S})")
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+
+    print(f"Benchmark servizio di predizione: {args.label}_{args.modello}, {args.client} client, {args.durata:.0f} s per scenario")
+    print(f"{'righe/rich.':>11} {'finestra ms':>11} {'richieste/s':>12} {'righe/s':>10} {'righe/batch':>12} {'p50 ms':>8} {'p99 ms':>8}")
+    X = None
+    for righe in RIGHE_PER_RICHIESTA:
+        for finestra in (0.0, 2.0):
+            with ServizioPredizione(args.label, args.modello, finestra_ms=finestra) as servizio:
+                if X is None:
+                    X = letture_di_prova(servizio.features)
+                servizio.predici(X[:1])  # Riscaldamento
+                servizio.metriche = Metriche()
+                esegui_carico(servizio, X, args.client, righe, args.durata)
+                m = servizio.metriche.riepilogo()
+            print(f"{righe:11d} {finestra:11.1f} {m['richieste_al_s']:12,.0f} {m['righe_al_s']:10,.0f} "
+                  f"{m['righe_per_batch']:12.1f} {m['latenza_p50_ms']:8.2f} {m['latenza_p99_ms']:8.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import os
+import sys
+import time
+import numpy as np
+from sklearn.metrics import f1_score
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import StandardScaler
+from dataset_io import percorso_dataset
+from predizione_occupazione import carica_dataset, prepara_dati, addestra_in_parallelo
+
+# Righe di training per punto della curva; la SVM esatta è misurata solo fino a LIMITE_ESATTA
+DIMENSIONI = [1000, 5000, 10000, 100000]
+LIMITE_ESATTA = 10000
+RUMORE = 0.01  # Deviazione relativa aggiunta alle righe ricampionate
+
+FEATURES = [
+    'ora_giorno', 'temperatura', 'umidita', 'illuminazione',
+    'consumo_luce_kW', 'consumo_riscaldamento_kW',
+    'consumo_climatizzatore_kW', 'consumo_tapparella_kW',
+    'is_StanzaDaRiscaldare', 'is_StanzaDaClimatizzare', 'is_StanzaLuminosissima',
+    'is_StanzaBuiaNotteOccupata', 'is_StanzaDaClimatizzareELuminare',
+    'is_StanzaFredda', 'is_StanzaCalda', 'is_StanzaDispendiosa',
+]
+TARGET = 'occupazione'
+
+def ricampiona(X, y, n, seed=42):
+    # Training set di n righe: ricampionamento con ripetizione + piccolo rumore sulle colonne continue
+    rng = np.random.default_rng(seed)
+    indici = rng.integers(0, len(y), n)
+    X_n = X[indici].astype(float)
+    colonne_continue = np.array([len(np.unique(X[:, j])) > 2 for j in range(X.shape[1])])
+    X_n[:, colonne_continue] *= 1 + rng.normal(0, RUMORE, (n, colonne_continue.sum()))
+    return X_n, y[indici]
+
+def valuta(modalita, X, y, X_test, y_test):
+    scaler = StandardScaler().fit(X)
+    start = time.perf_counter()
+    risultati, modelli, _ = addestra_in_parallelo({"bench": (X, y, scaler.transform(X))}, svm_modalita=modalita, modelli_base={})
+    durata = time.perf_counter() - start
+    f1_test = f1_score(y_test, modelli["bench"]["SVM"].predict(scaler.transform(X_test)))
+    return durata, risultati["bench"]["SVM"].mean(), f1_test
+
+def main():
+    dimensioni = [int(n) for n in sys.argv[1:]] or DIMENSIONI
+    base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    df = carica_dataset(percorso_dataset(os.path.join(base_dir, "data"), "SmartHome_KB_enhanced"), FEATURES + [TARGET])
+    if df is None:
+        return
+    X, y = prepara_dati(df, FEATURES, TARGET)
+    X_train, X_test, y_train, y_test = train_test_split(
+        X.to_numpy(float), y.to_numpy(), test_size=0.3, stratify=y, random_state=42
+    )
+
+    print("Benchmark SVM: esatta (SVC rbf) vs approssimata (Nystroem + LinearSVC), grid search + modello finale")
+    print(f"{'righe':>8} {'modalità':>12} {'tempo (s)':>10} {'F1 CV':>7} {'F1 test':>8}")
+    for n in dimensioni:
+        X_n, y_n = ricampiona(X_train, y_train, n)
+        for modalita in ("esatta", "approssimata"):
+            if modalita == "esatta" and n > LIMITE_ESATTA:
+                print(f"{n:8d} {modalita:>12} {'-':>10} {'-':>7} {'-':>8}")
+                continue
+            durata, f1_cv, f1_test = valuta(modalita, X_n, y_n, X_test, y_test)
+            print(f"{n:8d} {modalita:>12} {durata:10.2f} {f1_cv:7.4f} {f1_test:8.4f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import os
+from archivio_kb import apri_kb, chiudi_kb
+from ragionamento import REASONER_PIPELINE, esegui_reasoner, reasoner_effettivo
+
+class ContestoPipeline:
+    # Oggetti condivisi tra i passi eseguiti nello stesso processo (pipeline.py): KB già
+    # caricate e ragionate, inferenze e DataFrame. Senza condivisione (script lanciato da
+    # solo) ogni metodo si comporta come la funzione omonima di archivio_kb/ragionamento.
+    def __init__(self, condividi=False):
+        self.condividi = condividi
+        self.kb = {}  # nome KB -> ontologia in memoria
+        self.inferenze = {}  # ontologia -> {(reasoner, infer_property_values): inferenze già applicate}
+        self.dataset = {}  # percorso -> DataFrame
+
+    def apri_kb(self, sorgente, destinazione=None):
+        if not self.condividi:
+            return apri_kb(sorgente, destinazione)
+        # Un solo quadstore in memoria passa da un passo all'altro (anche con BACKEND
+        # "sqlite"): le KB si rileggono da disco solo se nessun passo le ha lasciate qui
+        if sorgente in self.kb:
+            if not destinazione:
+                return self.kb[sorgente]
+            # Un passo che produce 'destinazione' modifica la KB: la prende in consegna
+            # e le inferenze registrate non valgono più
+            onto = self.kb.pop(sorgente)
+            self.inferenze.pop(onto, None)
+            return onto
+        return apri_kb(sorgente, destinazione, world_separato=True)
+
+    def esegui_reasoner(self, onto, percorso=None, reasoner=REASONER_PIPELINE, infer_property_values=True):
+        # KB già ragionata in un passo precedente con lo stesso reasoner: nessun nuovo
+        # reasoning né lettura della cache
+        voce = (reasoner_effettivo(reasoner), infer_property_values)
+        if voce in self.inferenze.get(onto, {}):
+            print("Inferenze già applicate alla KB in memoria.")
+            return self.inferenze[onto][voce]
+        inferenze = esegui_reasoner(onto, percorso, reasoner, infer_property_values)
+        if self.condividi:
+            self.inferenze.setdefault(onto, {})[voce] = inferenze
+        return inferenze
+
+    def registra_kb(self, nome, onto):
+        # KB salvata da un passo e lasciata in memoria per i successivi
+        if self.condividi:
+            self.kb[nome] = onto
+
+    def chiudi_kb(self, onto):
+        if onto not in self.kb.values():
+            chiudi_kb(onto)
+
+    def registra_dataset(self, percorso, df):
+        if self.condividi:
+            self.dataset[os.path.abspath(percorso)] = df
+
+    def dataset_in_memoria(self, percorso, colonne=None):
+        # DataFrame prodotto da un passo precedente (None se assente); solo le colonne presenti
+        df = self.dataset.get(os.path.abspath(percorso))
+        if df is None or colonne is None:
+            return df
+        return df[[c for c in colonne if c in df.columns]]
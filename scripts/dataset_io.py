@@ -0,0 +1,219 @@
+import os
+import json
+import shutil
+import numpy as np
+
+# "colonne": una directory con un file binario per colonna, i metadati in meta.json
+# e le categorie di ogni colonna categorica in <colonna>.categorie.json
+FORMATI = {"csv": ".csv", "parquet": ".parquet", "colonne": ".col"}
+
+# Tipi compatti del formato colonnare; le altre colonne numeriche sono float32
+TIPI_COLONNE = {
+    "id": "uint32",
+    "casa": "categoria",
+    "stanza": "categoria",
+    "ora_giorno": "uint8",
+    "occupazione": "uint8",
+}
+# Le colonne is_* (0/1) sono impacchettate in un unico campo di bit
+PREFISSO_FLAG = "is_"
+COLONNA_FLAG = "flag_kb"
+FILE_META = "meta.json"
+
+# Formato scritto dall'ultima esecuzione di genera_dataset.py, nella directory dei dataset
+FILE_FORMATO = "dataset_formato.json"
+
+def registra_formato(data_dir, formato):
+    with open(os.path.join(data_dir, FILE_FORMATO), "w", encoding="utf-8") as f:
+        json.dump({"formato": formato}, f)
+
+def formato_registrato(data_dir):
+    try:
+        with open(os.path.join(data_dir, FILE_FORMATO), encoding="utf-8") as f:
+            formato = json.load(f).get("formato")
+    except (OSError, ValueError, AttributeError):
+        return None
+    return formato if formato in FORMATI else None
+
+def percorso_dataset(data_dir, nome, formato=None):
+    # Formato richiesto, altrimenti quello registrato da genera_dataset.py (CSV se nessuno)
+    formato = formato or formato_registrato(data_dir) or "csv"
+    return os.path.join(data_dir, nome + FORMATI[formato])
+
+def formato_dataset(percorso):
+    for formato, est in FORMATI.items():
+        if percorso.endswith(est):
+            return formato
+    raise ValueError(f"formato del dataset non riconosciuto: '{percorso}'")
+
+def elimina_dataset(percorso):
+    if os.path.isdir(percorso):
+        shutil.rmtree(percorso)
+    elif os.path.exists(percorso):
+        os.remove(percorso)
+
+
+# SCRITTURA
+class ScrittoreColonnare:
+    def __init__(self, percorso):
+        self.percorso = percorso
+        self.righe = 0
+        self._ordine = None
+        self._colonne = None
+        self._categorie = {}
+
+    def _schema(self, df):
+        flag = [c for c in df.columns if c.startswith(PREFISSO_FLAG)]
+        if len(flag) > 64:
+            raise ValueError(f"troppe colonne {PREFISSO_FLAG}* per un campo di bit: {len(flag)}")
+        colonne = []
+        for nome in df.columns:
+            if nome in flag:
+                continue
+            tipo = TIPI_COLONNE.get(nome, "float32")
+            if tipo == "categoria":
+                self._categorie[nome] = {}
+                colonne.append({"nome": nome, "tipo": "uint32", "categorie": True})
+            else:
+                colonne.append({"nome": nome, "tipo": tipo})
+        if flag:
+            tipo = next(f"uint{b}" for b in (8, 16, 32, 64) if len(flag) <= b)
+            colonne.append({"nome": COLONNA_FLAG, "tipo": tipo, "flag": flag})
+        return colonne
+
+    def _codifica(self, colonna, df):
+        nome = colonna["nome"]
+        if "categorie" in colonna:
+            mappa = self._categorie[nome]
+            for valore in df[nome].unique():
+                mappa.setdefault(valore, len(mappa))
+            return df[nome].map(mappa).to_numpy(colonna["tipo"])
+        if "flag" in colonna:
+            bit = np.zeros(len(df), dtype=colonna["tipo"])
+            for i, flag in enumerate(colonna["flag"]):
+                bit |= df[flag].to_numpy(colonna["tipo"]) << np.array(i, dtype=colonna["tipo"])
+            return bit
+        return df[nome].to_numpy(colonna["tipo"])
+
+    def scrivi(self, df):
+        if self._colonne is None:
+            os.makedirs(self.percorso)
+            self._ordine = list(df.columns)
+            self._colonne = self._schema(df)
+        elif list(df.columns) != self._ordine:
+            raise ValueError("colonne del blocco diverse da quelle del primo blocco")
+        for colonna in self._colonne:
+            with open(os.path.join(self.percorso, colonna["nome"] + ".bin"), "ab") as f:
+                self._codifica(colonna, df).tofile(f)
+        self.righe += len(df)
+
+    def chiudi(self):
+        if self._colonne is None:
+            return
+        for nome, mappa in self._categorie.items():
+            with open(os.path.join(self.percorso, f"{nome}.categorie.json"), "w", encoding="utf-8") as f:
+                json.dump(list(mappa), f)
+        meta = {"righe": self.righe, "ordine": self._ordine, "colonne": self._colonne}
+        with open(os.path.join(self.percorso, FILE_META), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+
+class ScrittoreDataset:
+    # Scrittura a blocchi in CSV (append), Parquet (un row group per blocco) o formato colonnare.
+    # Il file precedente è eliminato subito: senza righe non resta un dataset di un'altra esecuzione
+    def __init__(self, path, formato="csv"):
+        elimina_dataset(path)
+        self.path = path
+        self.formato = formato
+        self.righe = 0
+        self._writer = None
+        self._schema = None
+        if formato == "colonne":
+            self._writer = ScrittoreColonnare(path)
+
+    def scrivi(self, df):
+        if self.formato == "colonne":
+            self._writer.scrivi(df)
+        elif self.formato == "parquet":
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            tabella = pa.Table.from_pandas(df, schema=self._schema, preserve_index=False)
+            if self._writer is None:
+                self._schema = tabella.schema
+                self._writer = pq.ParquetWriter(self.path, self._schema)
+            self._writer.write_table(tabella)
+        else:
+            df.to_csv(self.path, mode="w" if self.righe == 0 else "a", header=self.righe == 0, index=False)
+        self.righe += len(df)
+
+    def chiudi(self):
+        if self.formato == "colonne":
+            self._writer.chiudi()
+        elif self._writer is not None:
+            self._writer.close()
+
+
+# LETTURA
+def leggi_meta(percorso):
+    with open(os.path.join(percorso, FILE_META), encoding="utf-8") as f:
+        return json.load(f)
+
+def _leggi_categorie(percorso, nome):
+    with open(os.path.join(percorso, f"{nome}.categorie.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+def _leggi_colonna(percorso, colonna, righe, mmap):
+    file = os.path.join(percorso, colonna["nome"] + ".bin")
+    if righe == 0:
+        return np.empty(0, dtype=colonna["tipo"])
+    if mmap:
+        return np.memmap(file, dtype=colonna["tipo"], mode="r", shape=(righe,))
+    return np.fromfile(file, dtype=colonna["tipo"], count=righe)
+
+def leggi_colonnare(percorso, colonne=None, mmap=True):
+    # Le colonne numeriche restano mappate in memoria; casa/stanza diventano Categorical
+    import pandas as pd
+    meta = leggi_meta(percorso)
+    righe = meta["righe"]
+    richieste = meta["ordine"] if colonne is None else list(colonne)
+    mancanti = set(richieste) - set(meta["ordine"])
+    if mancanti:
+        raise KeyError(f"colonne non presenti nel dataset: {sorted(mancanti)}")
+
+    valori = {}
+    for colonna in meta["colonne"]:
+        if "flag" in colonna:
+            flag = [f for f in colonna["flag"] if f in richieste]
+            if not flag:
+                continue
+            bit = _leggi_colonna(percorso, colonna, righe, mmap)
+            for f in flag:
+                i = colonna["flag"].index(f)
+                valori[f] = ((bit >> np.array(i, dtype=bit.dtype)) & 1).astype(np.uint8)
+        elif colonna["nome"] in richieste:
+            dati = _leggi_colonna(percorso, colonna, righe, mmap)
+            if "categorie" in colonna:
+                categorie = _leggi_categorie(percorso, colonna["nome"])
+                dati = pd.Categorical.from_codes(dati.astype(np.int32), categories=categorie)
+            valori[colonna["nome"]] = dati
+    return pd.DataFrame({nome: valori[nome] for nome in richieste}, copy=False)
+
+def colonne_dataset(percorso):
+    formato = formato_dataset(percorso)
+    if formato == "colonne":
+        return leggi_meta(percorso)["ordine"]
+    if formato == "parquet":
+        import pyarrow.parquet as pq
+        return pq.read_schema(percorso).names
+    import pandas as pd
+    return list(pd.read_csv(percorso, nrows=0).columns)
+
+def leggi_dataset(percorso, colonne=None):
+    # Con 'colonne' legge solo quelle (nel formato colonnare le altre non sono nemmeno aperte).
+    # pandas è importato qui e non all'avvio, come pyarrow: chi usa solo i percorsi non lo carica
+    import pandas as pd
+    formato = formato_dataset(percorso)
+    if formato == "colonne":
+        return leggi_colonnare(percorso, colonne)
+    if formato == "parquet":
+        return pd.read_parquet(percorso, columns=colonne)
+    return pd.read_csv(percorso, usecols=colonne)
@@ -0,0 +1,99 @@
+import numpy as np
+
+# Foresta appiattita in array contigui (un solo .npz): per ogni nodo feature, soglia, figli,
+# direzione dei NaN e probabilità di classe. Il predittore usa solo NumPy (niente sklearn).
+RIGHE_PER_BLOCCO = 4096  # Righe valutate insieme (coppie riga/albero: righe x n_alberi)
+
+def appiattisci_foresta(foresta, features):
+    # Nodi di tutti gli alberi concatenati; le foglie puntano a sé stesse
+    feature, soglia, sinistro, destro, nan_sinistra, valore, radici = [], [], [], [], [], [], []
+    offset = 0
+    for stimatore in foresta.estimators_:
+        albero = stimatore.tree_
+        n = albero.node_count
+        foglia = albero.children_left == -1
+        indici = np.arange(offset, offset + n)
+        feature.append(np.where(foglia, 0, albero.feature))
+        soglia.append(np.where(foglia, np.inf, albero.threshold))
+        sinistro.append(np.where(foglia, indici, albero.children_left + offset))
+        destro.append(np.where(foglia, indici, albero.children_right + offset))
+        nan_sinistra.append(albero.missing_go_to_left.astype(bool))
+        # Stessa normalizzazione di DecisionTreeClassifier.predict_proba
+        prob = albero.value[:, 0, :].astype(np.float64)
+        normalizzatore = prob.sum(axis=1, keepdims=True)
+        normalizzatore[normalizzatore == 0.0] = 1.0
+        valore.append(prob / normalizzatore)
+        radici.append(offset)
+        offset += n
+    return {
+        "feature": np.concatenate(feature).astype(np.int32),
+        "soglia": np.concatenate(soglia).astype(np.float64),
+        "sinistro": np.concatenate(sinistro).astype(np.int32),
+        "destro": np.concatenate(destro).astype(np.int32),
+        "nan_sinistra": np.concatenate(nan_sinistra),
+        "valore": np.concatenate(valore),
+        "radici": np.array(radici, dtype=np.int32),
+        "classi": np.asarray(foresta.classes_),
+        "features": np.array(list(features), dtype=str),
+    }
+
+def esporta_foresta(foresta, features, percorso):
+    np.savez(percorso, **appiattisci_foresta(foresta, features))
+    return percorso
+
+class ForestaCompatta:
+    def __init__(self, array):
+        for nome in ("feature", "soglia", "sinistro", "destro", "nan_sinistra", "valore", "radici", "classi"):
+            setattr(self, nome, np.asarray(array[nome]))
+        self.features = [str(f) for f in array["features"]]
+        # Figli intercalati (destro, sinistro): il figlio è _figli[2 * nodo + a_sinistra]
+        self._figli = np.stack([self.destro, self.sinistro], axis=1).ravel()
+        self._foglia = self.sinistro == np.arange(len(self.sinistro))
+
+    def _foglie(self, X):
+        # Foglie raggiunte (righe x alberi): tutte le coppie riga/albero scendono insieme
+        # e a ogni passo avanzano solo quelle non ancora arrivate in una foglia
+        n_alberi = len(self.radici)
+        Xf = X.ravel()
+        nodo = np.tile(self.radici, len(X))
+        base = np.repeat(np.arange(len(X), dtype=np.int64) * X.shape[1], n_alberi)
+        attive = np.arange(len(nodo))
+        con_nan = np.isnan(Xf).any()
+        while len(attive):
+            n = nodo[attive]
+            x = Xf[base[attive] + self.feature[n]]
+            a_sinistra = x <= self.soglia[n]
+            if con_nan:
+                a_sinistra = np.where(np.isnan(x), self.nan_sinistra[n], a_sinistra)
+            n = self._figli[2 * n + a_sinistra]
+            nodo[attive] = n
+            attive = attive[~self._foglia[n]]
+        return nodo.reshape(len(X), n_alberi)
+
+    def predict_proba(self, X):
+        # Come RandomForestClassifier: X in float32, somma delle probabilità albero per albero / n_alberi.
+        # Un DataFrame è riordinato per nome sulle feature del modello
+        if hasattr(X, "columns"):
+            mancanti = [f for f in self.features if f not in X.columns]
+            if mancanti:
+                raise ValueError(f"feature assenti: {', '.join(mancanti)}")
+            X = X[self.features]
+        X = np.asarray(X.to_numpy() if hasattr(X, "to_numpy") else X, dtype=np.float32)
+        X = np.ascontiguousarray(np.atleast_2d(X))
+        if X.shape[1] != len(self.features):
+            raise ValueError(f"attese {len(self.features)} feature, ricevute {X.shape[1]}")
+        proba = np.zeros((len(X), self.valore.shape[1]), dtype=np.float64)
+        for inizio in range(0, len(X), RIGHE_PER_BLOCCO):
+            foglie = self._foglie(X[inizio:inizio + RIGHE_PER_BLOCCO])
+            blocco = proba[inizio:inizio + RIGHE_PER_BLOCCO]
+            for t in range(foglie.shape[1]):
+                blocco += self.valore[foglie[:, t]]
+        proba /= len(self.radici)
+        return proba
+
+    def predict(self, X):
+        return self.classi[np.argmax(self.predict_proba(X), axis=1)]
+
+def carica_foresta(percorso):
+    with np.load(percorso) as array:
+        return ForestaCompatta(array)
@@ -1,52 +1,77 @@
 import os
+import sys
 import random
+import argparse
 import pandas as pd
-from owlready2 import get_ontology, sync_reasoner
+from archivio_kb import percorso_kb
+from contesto_pipeline import ContestoPipeline
+from metriche import conta, cronometro
+from dataset_io import FILE_FORMATO, FORMATI, ScrittoreDataset, elimina_dataset, registra_formato
+from serie_temporali import STORICO, carica_storico, feature_correnti
 
-ONTO_FILE = "ontology/smarthome_popolata.owl"
+ONTO_KB = "smarthome_popolata"
 OUTPUT_DIR = "data"
 RIGHE_PER_STANZA = 1  # Numero di campioni per stanza
-
-def main():
-    base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-    ont_path = os.path.join(base_dir, ONTO_FILE)
-    output_dir = os.path.join(base_dir, OUTPUT_DIR)
-    os.makedirs(output_dir, exist_ok=True)
-
-    if not os.path.exists(ont_path):
-        print(f"ERRORE : File ontologia non trovato: {os.path.relpath(ont_path)}")
-        return
-
-    print(f"Caricamento ontologia da: {os.path.relpath(ont_path)}")
-
-    onto = get_ontology(ont_path).load()
-    print("Esecuzione reasoner per calcolare le classi inferite...")
-    with onto:
-        sync_reasoner(infer_property_values=True, debug=0)
-    print("Reasoner completato.")
-    
-    dataset_base = []
-    dataset_enhanced = []
+DIMENSIONE_BLOCCO = 50000  # Righe scritte su disco per volta
+
+# Classi inferite esportate come feature is_*
+CLASSI_INFERITE = [
+    "StanzaFredda", "StanzaCalda", "StanzaBuia", "StanzaLuminosissima",
+    "StanzaDaRiscaldare", "StanzaDaClimatizzare", "StanzaBuiaNotteOccupata",
+    "StanzaDaClimatizzareELuminare", "StanzaDispendiosa",
+]
+
+def indice_classi_inferite(onto, nomi_classi):
+    # Individuo -> insieme delle classi inferite: una sola scansione per classe
+    indice = {}
+    for nome in nomi_classi:
+        for individuo in getattr(onto, nome).instances():
+            indice.setdefault(individuo, set()).add(nome)
+    return indice
+
+def genera_righe(onto, indice_inferenze, storico=None):
+    # Una riga alla volta: (record base, sole colonne is_* del record enhanced). Con lo storico
+    # delle letture l'ora è quella dell'ultima lettura e si aggiungono le feature su finestre mobili
+    colonne_consumo = {
+        onto.Luce: "consumo_luce_kW",
+        onto.Riscaldamento: "consumo_riscaldamento_kW",
+        onto.Climatizzatore: "consumo_climatizzatore_kW",
+        onto.Tapparella: "consumo_tapparella_kW",
+    }
+    # Classe (o sottoclasse) asserita -> colonna: evita isinstance(), che interroga il quadstore
+    tipi_dispositivo = {sotto: colonna for tipo, colonna in colonne_consumo.items() for sotto in tipo.descendants()}
     idx = 0
+    if storico is not None:
+        posizione = storico.indice()
+        ore = storico.ore()[:, -1]
+        temporali = feature_correnti(storico)
 
     for casa in onto.Casa.instances():
         for stanza in casa.haStanza:
+            # Consumi dei dispositivi (default 0 se assente)
+            consumi = dict.fromkeys(colonne_consumo.values(), 0)
+            for disp in stanza.haDispositivo:
+                for colonna in {tipi_dispositivo[c] for c in disp.is_a if c in tipi_dispositivo}:
+                    consumi[colonna] = max(consumi[colonna], disp.haConsumo)
+            consumi = {colonna: round(valore, 2) for colonna, valore in consumi.items()}
+
+            # Record con inferenze KB avanzate
+            classi_stanza = indice_inferenze.get(stanza, set())
+            inferenze = {f"is_{nome}": int(nome in classi_stanza) for nome in CLASSI_INFERITE}
+
+            # Le inferenze valgono per lo stato corrente: con lo storico una sola riga per stato
+            if storico is not None:
+                i = posizione[stanza.name]
+                ripetizioni, ora = 1, int(ore[i])
+                extra = {nome: valori[i].item() for nome, valori in temporali.items()}
+            else:
+                ripetizioni, ora, extra = RIGHE_PER_STANZA, None, {}
+
             for stato in stanza.haStato:
-                for _ in range(RIGHE_PER_STANZA):
+                for _ in range(ripetizioni):
                     # Occupazione
                     occupazione = int(getattr(stato, "haOccupazione", 0))
-                    ora_giorno = random.randint(0, 23)  # Orario simulato
-
-                    # Valori grezzi dalla KB
-                    temperatura = getattr(stato, "haTemperatura", 22)
-                    illuminazione = getattr(stato, "haIlluminazione", 400)
-                    umidita = getattr(stato, "haUmidita", 45)
-
-                    # Consumi dei dispositivi (default 0 se assente)
-                    consumo_luce = round(max([disp.haConsumo for disp in stanza.haDispositivo if isinstance(disp, onto.Luce)], default=0), 2)
-                    consumo_riscaldamento = round(max([disp.haConsumo for disp in stanza.haDispositivo if isinstance(disp, onto.Riscaldamento)], default=0), 2)
-                    consumo_climatizzatore = round(max([disp.haConsumo for disp in stanza.haDispositivo if isinstance(disp, onto.Climatizzatore)], default=0), 2)
-                    consumo_tapparella = round(max([disp.haConsumo for disp in stanza.haDispositivo if isinstance(disp, onto.Tapparella)], default=0), 2)
+                    ora_giorno = random.randint(0, 23) if ora is None else ora  # Orario simulato se manca lo storico
 
                     # Record base 
                     record_base = {
@@ -54,45 +79,128 @@ def main():
                         "casa": casa.name,
                         "stanza": stanza.name,
                         "ora_giorno": ora_giorno,
-                        "temperatura": temperatura,
-                        "umidita": umidita,
-                        "illuminazione": illuminazione,
+                        # Valori grezzi dalla KB
+                        "temperatura": getattr(stato, "haTemperatura", 22),
+                        "umidita": getattr(stato, "haUmidita", 45),
+                        "illuminazione": getattr(stato, "haIlluminazione", 400),
                         "occupazione": occupazione,
-                        "consumo_luce_kW": consumo_luce,
-                        "consumo_riscaldamento_kW": consumo_riscaldamento,
-                        "consumo_climatizzatore_kW": consumo_climatizzatore,
-                        "consumo_tapparella_kW": consumo_tapparella,
+                        **consumi,
+                        **extra,
                     }
-                    dataset_base.append(record_base)
-
-                    # Record con inferenze KB avanzate
-                    inferenze = {
-                        "is_StanzaFredda": int(stanza in onto.StanzaFredda.instances()),
-                        "is_StanzaCalda": int(stanza in onto.StanzaCalda.instances()),
-                        "is_StanzaBuia": int(stanza in onto.StanzaBuia.instances()),
-                        "is_StanzaLuminosissima": int(stanza in onto.StanzaLuminosissima.instances()),
-                        "is_StanzaDaRiscaldare": int(stanza in onto.StanzaDaRiscaldare.instances()),
-                        "is_StanzaDaClimatizzare": int(stanza in onto.StanzaDaClimatizzare.instances()),
-                        "is_StanzaBuiaNotteOccupata": int(stanza in onto.StanzaBuiaNotteOccupata.instances()),
-                        "is_StanzaDaClimatizzareELuminare": int(stanza in onto.StanzaDaClimatizzareELuminare.instances()),
-                        "is_StanzaDispendiosa": int(stanza in onto.StanzaDispendiosa.instances())
-                    }
-                    record_enhanced = {**record_base, **inferenze}
-                    dataset_enhanced.append(record_enhanced)
-
+                    yield record_base, inferenze
                     idx += 1
 
-    df_base = pd.DataFrame(dataset_base)
-    df_enhanced = pd.DataFrame(dataset_enhanced)
+def stanze_senza_storico(onto, storico):
+    # Stanze della KB assenti dallo storico o con l'ultima lettura diversa dallo stato (storico di un'altra generazione)
+    posizione = storico.indice()
+    return sorted(
+        stanza.name for stanza in onto.Stanza.instances()
+        if stanza.name not in posizione
+        or any(abs(stato.haTemperatura - storico.temperatura[posizione[stanza.name], -1]) > 0.05 for stato in stanza.haStato)
+    )
+
+def blocchi(righe, dimensione):
+    blocco = []
+    for riga in righe:
+        blocco.append(riga)
+        if len(blocco) == dimensione:
+            yield blocco
+            blocco = []
+    if blocco:
+        yield blocco
+
+def scrivi_dataset(righe, path_base, path_enhanced, formato="csv", dimensione_blocco=DIMENSIONE_BLOCCO, raccolti=None):
+    # In memoria c'è un solo blocco: il dataset enhanced affianca alle colonne base le sole is_*.
+    # Con 'raccolti' (lista) i blocchi scritti sono anche conservati come (df_base, df_enhanced)
+    scrittori = ScrittoreDataset(path_base, formato), ScrittoreDataset(path_enhanced, formato)
+    try:
+        for blocco in blocchi(righe, dimensione_blocco):
+            record_base, inferenze = zip(*blocco)
+            df_base = pd.DataFrame.from_records(record_base)
+            df_enhanced = pd.concat([df_base, pd.DataFrame.from_records(inferenze)], axis=1)
+            with cronometro("dataset.scrittura_blocco"):
+                scrittori[0].scrivi(df_base)
+                scrittori[1].scrivi(df_enhanced)
+            if raccolti is not None:
+                raccolti.append((df_base, df_enhanced))
+    finally:
+        for scrittore in scrittori:
+            scrittore.chiudi()
+    return scrittori[0].righe
+
+def main(argv=None, contesto=None):
+    contesto = contesto or ContestoPipeline()
+    parser = argparse.ArgumentParser(description="Generazione dei dataset ML dalla KB popolata.")
+    parser.add_argument("--formato", choices=sorted(FORMATI), default="csv", help="formato dei file di output (default csv)")
+    parser.add_argument("--blocco", type=int, default=DIMENSIONE_BLOCCO,
+                        help=f"righe per blocco scritto su disco (default {DIMENSIONE_BLOCCO})")
+    parser.add_argument("--serie-temporali", action="store_true",
+                        help=f"ora e feature su finestre mobili dallo storico '{os.path.relpath(STORICO)}' (genera_istanze.py --serie-temporali)")
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+
+    base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    ont_path = percorso_kb(ONTO_KB)
+    output_dir = os.path.join(base_dir, OUTPUT_DIR)
+    os.makedirs(output_dir, exist_ok=True)
+
+    if not os.path.exists(ont_path):
+        print(f"ERRORE : File ontologia non trovato: {os.path.relpath(ont_path)}")
+        return
+
+    storico = None
+    if args.serie_temporali:
+        if not os.path.exists(STORICO):
+            print(f"ERRORE: storico delle letture non trovato: '{os.path.relpath(STORICO)}' (genera_istanze.py --serie-temporali)")
+            return
+        storico = carica_storico()
+
+    print(f"Caricamento ontologia da: {os.path.relpath(ont_path)}")
 
-    path_base = os.path.join(output_dir, "SmartHome_base.csv")
-    path_enhanced = os.path.join(output_dir, "SmartHome_KB_enhanced.csv")
+    onto = contesto.apri_kb(ONTO_KB)
+    if storico is not None:
+        mancanti = stanze_senza_storico(onto, storico)
+        if mancanti:
+            print(f"ERRORE: {len(mancanti)} stanze della KB senza storico delle letture (es. {mancanti[0]}): "
+                  "rigenerare le istanze con --serie-temporali.")
+            contesto.chiudi_kb(onto)
+            return
+        print(f"Storico delle letture: {len(storico.stanze)} stanze x {storico.campioni} letture.")
+    print("Esecuzione reasoner per calcolare le classi inferite...")
+    contesto.esegui_reasoner(onto, ont_path)
+    print("Reasoner completato.")
 
-    df_base.to_csv(path_base, index=False)
-    df_enhanced.to_csv(path_enhanced, index=False)
+    with cronometro("dataset.indice_inferenze"):
+        indice_inferenze = indice_classi_inferite(onto, CLASSI_INFERITE)
+
+    estensione = FORMATI[args.formato]
+    path_base = os.path.join(output_dir, "SmartHome_base" + estensione)
+    path_enhanced = os.path.join(output_dir, "SmartHome_KB_enhanced" + estensione)
+
+    # Nella pipeline in un solo processo i DataFrame restano ai passi successivi; solo per CSV
+    # e Parquet, che si rileggono identici (il formato colonnare riduce i tipi)
+    raccolti = [] if contesto.condividi and args.formato != "colonne" else None
+    with cronometro("dataset.costruzione"):
+        righe = scrivi_dataset(genera_righe(onto, indice_inferenze, storico), path_base, path_enhanced, args.formato, args.blocco, raccolti)
+    conta("dataset.righe", righe)
+    if raccolti:
+        for i, percorso in enumerate((path_base, path_enhanced)):
+            contesto.registra_dataset(percorso, pd.concat([blocco[i] for blocco in raccolti], ignore_index=True))
+
+    contesto.chiudi_kb(onto)
+
+    if righe == 0:
+        # Nessun dataset di un'esecuzione precedente, in nessun formato, resta ai passi successivi
+        for nome in ("SmartHome_base", "SmartHome_KB_enhanced"):
+            for est in FORMATI.values():
+                elimina_dataset(os.path.join(output_dir, nome + est))
+        elimina_dataset(os.path.join(output_dir, FILE_FORMATO))
+        print("ERRORE: nessuna stanza con stato ambientale nella KB, dataset non generati.")
+        return
 
-    print(f"Dataset base generato in '{os.path.relpath(path_base)}' ({len(df_base)} righe).")
-    print(f"Dataset KB-enhanced generato in '{os.path.relpath(path_enhanced)}' ({len(df_enhanced)} righe).")
+    # I passi successivi leggono questo formato, salvo --formato esplicito
+    registra_formato(output_dir, args.formato)
+    print(f"Dataset base generato in '{os.path.relpath(path_base)}' ({righe} righe).")
+    print(f"Dataset KB-enhanced generato in '{os.path.relpath(path_enhanced)}' ({righe} righe).")
 
 if __name__ == "__main__":
     main()
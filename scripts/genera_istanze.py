@@ -1,8 +1,18 @@
 import os
+import sys
 import uuid
 import random
-from owlready2 import *
-from regole import azioni_da_regole
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from archivio_kb import percorso_kb, salva_kb
+from ragionamento import registra_in_cache
+from contesto_pipeline import ContestoPipeline
+from metriche import conta, cronometro
+from regole import azioni_da_regole_batch, decodifica_azioni, voce_azione
+from azioni_kb import classi_azione, indice_dispositivi, materializza_azioni
+from stato_dispositivi import comandi_per_dispositivo
+from serie_temporali import CAMPIONI, STORICO, genera_storico, concatena, salva_storico
 
 NUM_CASE = 50                   # Numero di case simulate
 STANZE_PER_CASA = ["Soggiorno", "Cucina", "Camera", "Bagno"]
@@ -24,39 +34,47 @@ UMIDITA_RANGE = [(20, 35), (36, 55), (56, 70)]
 PROB_VALORI_ESTREMI = 0.25
 PROB_STATO_PROLUNGATO = 0.3  # Probabilità di durata > 30 minuti
 
-def genera_valore_con_range(ranges):
-    r = random.choice(ranges)
-    return round(random.uniform(r[0], r[1]), 1)
+CLASSI_ORARIO = ["Giorno", "Notte", "FasciaEnergeticaAlta", "FasciaEnergeticaBassa"]
+SENSORI = ["Temp", "Light", "Occupancy"]
+DISPOSITIVI = ["Luce", "Riscaldamento", "Climatizzatore", "Tapparella"]
 
-def main():
-    print("Generazione istanze SmartHome avanzata...")
+# Generazione massiva: case per shard (blocco di triple generato con un proprio seme e
+# inserito nel quadstore). Gli shard non dipendono dal numero di processi.
+DIMENSIONE_SHARD = 1000
 
-    base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-    ont_path = os.path.join(base_dir, "ontology", "smarthome.owl")
-    output_path = os.path.join(base_dir, "ontology", "smarthome_popolata.owl")
+XSD_DECIMAL = "http://www.w3.org/2001/XMLSchema#decimal"
+XSD_BOOLEAN = "http://www.w3.org/2001/XMLSchema#boolean"
+RDF_TYPE = "http://www.w3.org/1999/02/22-rdf-syntax-ns#type"
+OWL_NAMED_INDIVIDUAL = "http://www.w3.org/2002/07/owl#NamedIndividual"
 
-    if not os.path.exists(ont_path):
-        print(f"ERRORE: file ontologia non trovato: '{os.path.relpath(ont_path)}'")
-        return
+def genera_valore_con_range(ranges, rng=random):
+    r = rng.choice(ranges)
+    return round(rng.uniform(r[0], r[1]), 1)
+
+def genera_valori_stato(rng=random):
+    # Temperatura, illuminazione, umidità e durata di uno stato ambientale
+    temperatura = genera_valore_con_range(TEMPERATURE_RANGE, rng)
+    illuminazione = genera_valore_con_range(LUCE_RANGE, rng)
+    umidita = genera_valore_con_range(UMIDITA_RANGE, rng)
 
-    onto = get_ontology(ont_path).load()
+    # Durata dello stato per regole temporali
+    durata = round(rng.uniform(10, 60), 1) if rng.random() < PROB_STATO_PROLUNGATO else round(rng.uniform(1, 29), 1)
+
+    # Valori estremi occasionali
+    if rng.random() < PROB_VALORI_ESTREMI:
+        temperatura = rng.choice([15.0, 32.0])
+        illuminazione = rng.choice([0.0, 900.0])
+    return temperatura, illuminazione, umidita, durata
+
+def genera_con_oggetti(onto, num_case, campioni=0):
     case = []
 
-    # Mappatura azione -> classe ontologia
-    azione_to_classe = {
-        "AccendiLuce": onto.AccendiLuce,
-        "SpegniLuce": onto.SpegniLuce,
-        "AccendiRiscaldamento": onto.AccendiRiscaldamento,
-        "SpegniRiscaldamento": onto.SpegniRiscaldamento,
-        "AccendiClimatizzatore": onto.AccendiClimatizzatore,
-        "SpegniClimatizzatore": onto.SpegniClimatizzatore,
-        "AlzaTapparelle": onto.AlzaTapparelle,
-        "AbbassaTapparelle": onto.AbbassaTapparelle
-    }
+    # Classi delle azioni dal registro di regole.py
+    classi = classi_azione(onto)
 
     with onto:
         # CREAZIONE CASE E STANZE
-        for c in range(1, NUM_CASE + 1):
+        for c in range(1, num_case + 1):
             casa = onto.Casa(f"Casa{c}")
             case.append(casa)
             
@@ -68,11 +86,11 @@ def main():
             casa.haStanza.extend(stanze)
 
         # CREAZIONE DISPOSITIVI E PERSONE
-        for casa in case:
+        for c, casa in enumerate(case, start=1):
             for stanza in casa.haStanza:
                 # Sensori
                 sensori = [onto.Sensore(f"{nome}Sensor_{stanza.name}") 
-                           for nome in ["Temp", "Light", "Occupancy"]]
+                           for nome in SENSORI]
                 stanza.haSensore.extend(sensori)
 
                 # Dispositivi
@@ -97,70 +115,228 @@ def main():
                 stanza.haPresenza.append(persona)
 
         # STATO AMBIENTALE E AZIONI
+        stati_generati = []
         for casa in case:
             for stanza in casa.haStanza:
                 stato = onto.StatoAmbientale(f"Stato_{stanza.name}_{uuid.uuid4().hex[:6]}")
 
                 # Orario casuale
-                orario_cls = random.choice([onto.Giorno, onto.Notte, onto.FasciaEnergeticaAlta, onto.FasciaEnergeticaBassa])
+                orario_cls = getattr(onto, random.choice(CLASSI_ORARIO))
                 orario_istanza = orario_cls(f"Orario_{orario_cls.__name__}_{stanza.name}_{uuid.uuid4().hex[:4]}")
                 stanza.haOrario.append(orario_istanza)
 
                 # Valori ambiente
-                stato.haTemperatura = genera_valore_con_range(TEMPERATURE_RANGE)
-                stato.haIlluminazione = genera_valore_con_range(LUCE_RANGE)
-                stato.haUmidita = genera_valore_con_range(UMIDITA_RANGE)
+                stato.haTemperatura, stato.haIlluminazione, stato.haUmidita, stato.haDurata = genera_valori_stato()
                 stato.haOccupazione = bool(stanza.haPresenza)
 
-                # Durata dello stato per regole temporali
-                stato.haDurata = round(random.uniform(10, 60), 1) if random.random() < PROB_STATO_PROLUNGATO else round(random.uniform(1, 29), 1)
+                stanza.haStato.append(stato)
+                stati_generati.append((stanza, stato, orario_cls.__name__))
+
+        # Con 'campioni' > 0, storico delle letture di ogni stanza e durate reali
+        storico = None
+        if campioni:
+            storico = genera_storico(
+                [stanza.name for stanza, _, _ in stati_generati], [orario for _, _, orario in stati_generati],
+                *zip(*[(s.haTemperatura, s.haIlluminazione, s.haUmidita, s.haOccupazione) for _, s, _ in stati_generati]),
+                seed=random.getrandbits(32), campioni=campioni)
+            for (_, stato, _), durata in zip(stati_generati, storico.durate()):
+                stato.haDurata = float(durata)
 
-                # Valori estremi occasionali
-                if random.random() < PROB_VALORI_ESTREMI:
-                    stato.haTemperatura = random.choice([15.0, 32.0])
-                    stato.haIlluminazione = random.choice([0.0, 900.0])
+        # --- Azioni suggerite (valutazione batch su tutte le stanze) ---
+        matrice = azioni_da_regole_batch(
+            [stato.haIlluminazione for _, stato, _ in stati_generati],
+            [stato.haTemperatura for _, stato, _ in stati_generati],
+            [stato.haOccupazione for _, stato, _ in stati_generati],
+            [orario for _, _, orario in stati_generati]
+        )
 
-                stanza.haStato.append(stato)
+        dispositivi_stanza = indice_dispositivi(onto, [stanza for stanza, _, _ in stati_generati])
+        for (stanza, stato, _), azioni_python in zip(stati_generati, decodifica_azioni(comandi_per_dispositivo(matrice))):
+            materializza_azioni(stato, stanza, azioni_python, classi, dispositivi_stanza[stanza])
+    return storico
+
+def genera_triple_case(base_iri, inizio, fine, rng, campioni=0):
+    # Triple (IRI) delle case [inizio, fine), costruite in memoria senza oggetti owlready2;
+    # con 'campioni' > 0 anche lo storico delle letture delle stanze del blocco
+    I = lambda nome: base_iri + nome
+    haStanza, haStato = I("haStanza"), I("haStato")
+    obj, data = [], []
+
+    def nuovo(individuo, classe):
+        # Come owlready2: tipo asserito + owl:NamedIndividual
+        obj.append((individuo, RDF_TYPE, I(classe)))
+        obj.append((individuo, RDF_TYPE, OWL_NAMED_INDIVIDUAL))
+
+    stati = []  # (stanza, stato, orario, temperatura, illuminazione, occupazione, umidita, durata)
+
+    for c in range(inizio, fine):
+        casa = I(f"Casa{c}")
+        nuovo(casa, "Casa")
+        stanze = [f"{st_nome}_C{c}" for st_nome in STANZE_PER_CASA]
+        for st_nome, stanza in zip(STANZE_PER_CASA, stanze):
+            nuovo(I(stanza), st_nome)
+            obj.append((casa, haStanza, I(stanza)))
+
+        for stanza in stanze:
+            for nome in SENSORI:
+                sensore = I(f"{nome}Sensor_{stanza}")
+                nuovo(sensore, "Sensore")
+                obj.append((I(stanza), I("haSensore"), sensore))
+            for tipo_disp in DISPOSITIVI:
+                disp = I(f"{tipo_disp}_{stanza}")
+                low, high = CONSUMO_DISPOSITIVI.get(tipo_disp, (0.1, 1.0))
+                nuovo(disp, tipo_disp)
+                obj.append((I(stanza), I("haDispositivo"), disp))
+                data.append((disp, I("haConsumo"), round(rng.uniform(low, high), 2), XSD_DECIMAL))
+
+        occupate = set()
+        for p in range(1, PERSONE_PER_CASA + 1):
+            persona = I(f"Persona_C{c}_{p}")
+            stanza = rng.choice(stanze)
+            occupate.add(stanza)
+            nuovo(persona, "Persona")
+            obj.append((I(stanza), I("haPresenza"), persona))
+
+        for stanza in stanze:
+            stato = I(f"Stato_{stanza}")
+            orario_cls = rng.choice(CLASSI_ORARIO)
+            orario = I(f"Orario_{orario_cls}_{stanza}")
+            nuovo(orario, orario_cls)
+            obj.append((I(stanza), I("haOrario"), orario))
 
-                # --- Azioni suggerite ---
-                azioni_python = azioni_da_regole(
-                    stato.haIlluminazione,
-                    stato.haTemperatura,
-                    stato.haOccupazione,
-                    orario_istanza
-                )
-
-                for az in azioni_python:
-                    azione_nome = f"{az}_{stanza.name}"
-                    AzClasse = azione_to_classe.get(az.replace(" ", ""))
-                    if AzClasse is None:
-                        AzClasse = type(f"Azione_{az}_{stanza.name}", (onto.Azione,), {})
-                    azione_istanza = AzClasse(azione_nome)
-
-                    # Collega al dispositivo corretto
-                    for disp in stanza.haDispositivo:
-                        if "Luce" in az and isinstance(disp, onto.Luce):
-                            azione_istanza.controllaDispositivo.append(disp)
-                        elif "Riscaldamento" in az and isinstance(disp, onto.Riscaldamento):
-                            azione_istanza.controllaDispositivo.append(disp)
-                        elif "Climatizzatore" in az and isinstance(disp, onto.Climatizzatore):
-                            azione_istanza.controllaDispositivo.append(disp)
-                        elif "Tapparella" in az and isinstance(disp, onto.Tapparella):
-                            azione_istanza.controllaDispositivo.append(disp)
-
-                    stato.suggerisceAzione.append(azione_istanza)
+            temperatura, illuminazione, umidita, durata = genera_valori_stato(rng)
+            occupazione = stanza in occupate
+            nuovo(stato, "StatoAmbientale")
+            obj.append((I(stanza), haStato, stato))
+            data.append((stato, I("haTemperatura"), temperatura, XSD_DECIMAL))
+            data.append((stato, I("haIlluminazione"), illuminazione, XSD_DECIMAL))
+            data.append((stato, I("haUmidita"), umidita, XSD_DECIMAL))
+            data.append((stato, I("haOccupazione"), "true" if occupazione else "false", XSD_BOOLEAN))
+            stati.append((stanza, stato, orario_cls, temperatura, illuminazione, occupazione, umidita, durata))
 
+    storico = None
+    if stati:
+        nomi_stanze, individui_stato, orari, temperature, illuminazioni, occupazioni, umidita, durate = zip(*stati)
+        if campioni:
+            storico = genera_storico(nomi_stanze, orari, temperature, illuminazioni, umidita, occupazioni,
+                                     seed=rng.getrandbits(32), campioni=campioni)
+            durate = storico.durate().astype(float)
+        data.extend((stato, I("haDurata"), durata, XSD_DECIMAL) for stato, durata in zip(individui_stato, durate))
+
+        # Azioni suggerite, valutate in batch sul blocco
+        matrice = azioni_da_regole_batch(illuminazioni, temperature, occupazioni, orari)
+        for (stanza, stato, *_), azioni_python in zip(stati, decodifica_azioni(comandi_per_dispositivo(matrice))):
+            for az in azioni_python:
+                nome, classe, tipo_disp = voce_azione(az)
+                azione = I(f"{nome}_{stanza}")
+                nuovo(azione, classe)
+                if tipo_disp:
+                    obj.append((azione, I("controllaDispositivo"), I(f"{tipo_disp}_{stanza}")))
+                obj.append((stato, I("suggerisceAzione"), azione))
+    return obj, data, storico
+
+def intervalli_shard(num_case, dimensione=DIMENSIONE_SHARD):
+    return [(inizio, min(inizio + dimensione, num_case + 1)) for inizio in range(1, num_case + 1, dimensione)]
+
+def genera_shard(base_iri, inizio, fine, seed, campioni=0):
+    # Seme derivato da (seed, prima casa): ogni shard è riproducibile da solo
+    return genera_triple_case(base_iri, inizio, fine, random.Random(f"{seed}:{inizio}"), campioni)
+
+def _shard_in_parallelo(base_iri, intervalli, seed, processi, campioni=0):
+    # Al più 2 shard in coda per processo: la memoria resta limitata mentre il padre inserisce
+    with ProcessPoolExecutor(processi) as pool:
+        in_corso = deque()
+        for inizio, fine in intervalli:
+            in_corso.append(pool.submit(genera_shard, base_iri, inizio, fine, seed, campioni))
+            if len(in_corso) >= 2 * processi:
+                yield in_corso.popleft().result()
+        while in_corso:
+            yield in_corso.popleft().result()
+
+def genera_bulk(onto, num_case, seed, processi=1, campioni=0):
+    # Tutte le triple in un'unica transazione; gli shard (e i loro storici) sono uniti
+    # nell'ordine delle case
+    insert_objs, insert_datas, _, finish = onto.graph.import_triples_from_queue(None, delete_existing_triples=False)
+    intervalli = intervalli_shard(num_case)
+    if processi > 1 and len(intervalli) > 1:
+        shard = _shard_in_parallelo(onto.base_iri, intervalli, seed, min(processi, len(intervalli)), campioni)
+    else:
+        shard = (genera_shard(onto.base_iri, inizio, fine, seed, campioni) for inizio, fine in intervalli)
+    totale = 0
+    storici = []
+    for obj, data, storico in shard:
+        insert_objs(obj)
+        insert_datas(data)
+        totale += len(obj) + len(data)
+        storici.append(storico)
+    finish()
+    return totale, concatena(storici)
+
+
+def main(argv=None, contesto=None):
+    contesto = contesto or ContestoPipeline()
+    parser = argparse.ArgumentParser(description="Popolamento della KB SmartHome.")
+    parser.add_argument("--num-case", type=int, default=NUM_CASE, help=f"numero di case (default {NUM_CASE})")
+    parser.add_argument("--bulk", action="store_true", help="generazione massiva: triple inserite in blocco nel quadstore")
+    parser.add_argument("--seed", type=int, default=None, help="seme del generatore casuale")
+    parser.add_argument("--processi", type=int, default=0,
+                        help="con --bulk, processi che generano gli shard in parallelo (0 = tutti i core)")
+    parser.add_argument("--serie-temporali", action="store_true",
+                        help=f"storico delle letture per stanza in '{os.path.relpath(STORICO)}': l'ultima lettura è lo "
+                             "stato nella KB e haDurata la durata reale della condizione corrente")
+    parser.add_argument("--campioni", type=int, default=CAMPIONI,
+                        help=f"con --serie-temporali, letture per stanza (default {CAMPIONI})")
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+    num_case = args.num_case
+    campioni = max(args.campioni, 1) if args.serie_temporali else 0
+
+    print("Generazione istanze SmartHome avanzata...")
+
+    ont_path = percorso_kb("smarthome")
+
+    if not os.path.exists(ont_path):
+        print(f"ERRORE: file ontologia non trovato: '{os.path.relpath(ont_path)}'")
+        return
+
+    onto = contesto.apri_kb("smarthome", "smarthome_popolata")
+
+    if args.bulk:
+        seed = random.randrange(2 ** 32) if args.seed is None else args.seed
+        processi = args.processi or os.cpu_count() or 1
+        print(f"Generazione massiva: seme {seed}, {len(intervalli_shard(num_case))} shard, {processi} processi.")
+        with cronometro("istanze.generazione") as generazione:
+            num_triple, storico = genera_bulk(onto, num_case, seed, processi, campioni)
+        durata = generazione.secondi
+        conta("istanze.triple", num_triple)
+        print(f"{num_triple} triple in {durata:.2f} s ({num_triple / max(durata, 1e-9):,.0f} triple/s).")
+    else:
+        if args.seed is not None:
+            random.seed(args.seed)
+        with cronometro("istanze.generazione") as generazione:
+            storico = genera_con_oggetti(onto, num_case, campioni)
+        print(f"Generazione completata in {generazione.secondi:.2f} s.")
+    conta("istanze.case", num_case)
+    if storico is not None:
+        percorso = salva_storico(storico)
+        conta("istanze.letture", storico.temperatura.size)
+        print(f"Storico di {len(storico.stanze)} stanze x {storico.campioni} letture salvato in '{os.path.relpath(percorso)}'.")
+
+    with onto:
         print("\nEsecuzione reasoner per inferenze sulle stanze...")
+        inferenze = None
         try:
-            sync_reasoner_pellet(infer_property_values=True, debug=0)
+            inferenze = contesto.esegui_reasoner(onto)
             print("Reasoner completato: inferenze eseguite su stanze e orari.")
         except Exception as e:
             print(f"ATTENZIONE: Errore nel reasoner: {e}")
 
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    onto.save(file=output_path, format="rdfxml")
+    output_path = salva_kb(onto, "smarthome_popolata")
     print(f"Ontologia popolata salvata in '{os.path.relpath(output_path)}'.")
-    print(f"Totale case generate: {NUM_CASE}, stanze: {NUM_CASE * len(STANZE_PER_CASA)}, persone: {NUM_CASE * PERSONE_PER_CASA}.")
+    if inferenze is not None:
+        # La KB salvata è già ragionata: i passi successivi riusano queste inferenze
+        registra_in_cache(output_path, inferenze)
+    contesto.registra_kb("smarthome_popolata", onto)
+    print(f"Totale case generate: {num_case}, stanze: {num_case * len(STANZE_PER_CASA)}, persone: {num_case * PERSONE_PER_CASA}.")
 
 if __name__ == "__main__":
     main()
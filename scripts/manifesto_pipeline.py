@@ -0,0 +1,63 @@
+import os
+import json
+import hashlib
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+MANIFESTO = os.path.join(BASE_DIR, "data", "pipeline_manifest.json")
+
+_hash_calcolati = {}  # (percorso, mtime, dimensione) -> hash, per non rileggere i file invariati
+
+def _hash_file(percorso):
+    stat = os.stat(percorso)
+    chiave = (percorso, stat.st_mtime_ns, stat.st_size)
+    if chiave not in _hash_calcolati:
+        h = hashlib.sha256()
+        with open(percorso, "rb") as f:
+            for blocco in iter(lambda: f.read(1 << 20), b""):
+                h.update(blocco)
+        _hash_calcolati[chiave] = h.hexdigest()
+    return _hash_calcolati[chiave]
+
+def hash_artefatto(percorso):
+    # Contenuto di un file o di una cartella (formato colonnare); None se non esiste
+    if os.path.isfile(percorso):
+        return _hash_file(percorso)
+    if not os.path.isdir(percorso):
+        return None
+    h = hashlib.sha256()
+    for radice, cartelle, file in os.walk(percorso):
+        cartelle.sort()
+        for nome in sorted(file):
+            completo = os.path.join(radice, nome)
+            h.update(f"{os.path.relpath(completo, percorso)}|{_hash_file(completo)}|".encode())
+    return h.hexdigest()
+
+def chiave_stadio(ingressi, parametri):
+    # Chiave di un'esecuzione: hash dei file in ingresso + parametri (argomenti, sorgenti)
+    h = hashlib.sha256()
+    h.update(json.dumps({"ingressi": ingressi, "parametri": parametri}, sort_keys=True).encode())
+    return h.hexdigest()
+
+def leggi_manifesto(percorso=MANIFESTO):
+    if not os.path.exists(percorso):
+        return {}
+    try:
+        with open(percorso, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"ATTENZIONE: manifesto della pipeline illeggibile, tutti i passi verranno rieseguiti: {e}")
+        return {}
+
+def scrivi_manifesto(manifesto, percorso=MANIFESTO):
+    os.makedirs(os.path.dirname(percorso), exist_ok=True)
+    # Scrittura atomica: un'esecuzione interrotta non lascia file a metà
+    with open(percorso + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifesto, f, indent=2, sort_keys=True)
+    os.replace(percorso + ".tmp", percorso)
+
+def in_cache(voce, chiave, uscite):
+    # Esecuzione già registrata con la stessa chiave e uscite su disco ancora identiche
+    if not voce or voce.get("chiave") != chiave:
+        return False
+    registrate = voce.get("uscite", {})
+    return set(registrate) == set(uscite) and all(hash_artefatto(p) == registrate[n] for n, p in uscite.items())
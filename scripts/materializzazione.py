@@ -0,0 +1,347 @@
+import os
+import random
+import argparse
+import numpy as np
+from owlready2 import Thing, LOADING, rdf_type
+from archivio_kb import percorso_kb, apri_kb_isolata
+from ragionamento import REASONER, reasoner_owl
+
+ONTO_KB = "smarthome_popolata"
+
+# Senza assiomi di unicità dei nomi (AllDifferent) HermiT e Pellet non deducono
+# haPresenza.min(2, Persona): con UNICITA_NOMI = False il motore nativo fa lo stesso.
+UNICITA_NOMI = False
+
+# CLASSI DERIVATE
+# classe: (dominio, dipendenze dirette da proprietà o altre classi derivate, definizione vettoriale)
+# L'ordine rispetta le dipendenze: ogni classe usa solo risultati già calcolati in 'r'.
+DEFINIZIONI = {
+    "StanzaFredda": ("stanza", ("haStato", "haTemperatura"),
+                     lambda c, r: c.esiste_stato(c.temperatura < 20.0)),
+    "StanzaCalda": ("stanza", ("haStato", "haTemperatura"),
+                    lambda c, r: c.esiste_stato(c.temperatura > 28.0)),
+    "StanzaBuia": ("stanza", ("haStato", "haIlluminazione"),
+                   lambda c, r: c.esiste_stato(c.illuminazione < 200.0)),
+    "StanzaLuminosissima": ("stanza", ("haStato", "haIlluminazione"),
+                            lambda c, r: c.esiste_stato(c.illuminazione > 800.0)),
+    "StanzaDispendiosa": ("stanza", ("haDispositivo", "haConsumo"),
+                          lambda c, r: c.esiste_dispositivo(c.consumo > 1.5)),
+    "StanzaEnergiaAlta": ("stanza", ("haDispositivo",),
+                          lambda c, r: c.esiste_dispositivo(c.dispositivo_di_tipo("Luce", "Riscaldamento", "Climatizzatore"))),
+    "StanzaFreddaProlungata": ("stanza", ("StanzaFredda", "haStato", "haDurata"),
+                               lambda c, r: r["StanzaFredda"] & c.esiste_stato(c.durata >= 30.0)),
+    # Le due classi con haPresenza.min(2, Persona) sono sempre vuote finché UNICITA_NOMI = False,
+    # come per HermiT e Pellet (verificato in tests/test_materializzazione.py)
+    "StanzaDaRiscaldareAltaOccupazione": ("stanza", ("StanzaFredda", "haPresenza", "haOrario"),
+                                          lambda c, r: r["StanzaFredda"] & c.almeno_due_presenze() & c.ha_orario("FasciaEnergeticaAlta")),
+    "StanzaDaClimatizzareELuminareOccupata": ("stanza", ("StanzaCalda", "StanzaLuminosissima", "haPresenza"),
+                                              lambda c, r: r["StanzaCalda"] & r["StanzaLuminosissima"] & (c.presenze > 0)),
+    "StanzaDaRiscaldare": ("stanza", ("StanzaFredda", "haPresenza"),
+                           lambda c, r: r["StanzaFredda"] & (c.presenze > 0)),
+    "StanzaDaClimatizzare": ("stanza", ("StanzaCalda", "haPresenza"),
+                             lambda c, r: r["StanzaCalda"] & (c.presenze > 0)),
+    "StanzaBuiaNotteOccupata": ("stanza", ("StanzaFredda", "StanzaBuia", "haPresenza", "haOrario"),
+                                lambda c, r: r["StanzaFredda"] & r["StanzaBuia"] & (c.presenze > 0) & c.ha_orario("Notte")),
+    "StanzaDaClimatizzareELuminare": ("stanza", ("StanzaCalda", "StanzaBuia", "haPresenza", "haOrario"),
+                                      lambda c, r: r["StanzaCalda"] & r["StanzaBuia"] & (c.presenze > 0) & c.ha_orario("FasciaEnergeticaBassa")),
+    # Vuota con UNICITA_NOMI = False, vedi StanzaDaRiscaldareAltaOccupazione
+    "CasaAltaOccupazione": ("casa", ("haStanza", "haPresenza"),
+                            lambda c, r: c.casa_con_stanza(c.almeno_due_presenze())),
+}
+
+
+class ContestoStanze:
+    # Valori della KB letti dal quadstore come array allineati alle stanze selezionate
+    def __init__(self, onto, stanze=None):
+        self.onto = onto
+        self.world = onto.world
+        self._completo = stanze is None
+        if stanze is None:
+            stanze = self._tipizzati("Stanza", ("haStato", "haDispositivo", "haPresenza", "haOrario"))
+        self.stanze = np.array(sorted(set(stanze)), dtype=np.int64)
+        self._pos = {int(s): i for i, s in enumerate(self.stanze)}
+        n = len(self.stanze)
+
+        # Stati ambientali (una riga per coppia stanza-stato)
+        self.stato_stanza, stati = self._coppie("haStato")
+        self.temperatura = self._valori("haTemperatura", stati)
+        self.illuminazione = self._valori("haIlluminazione", stati)
+        self.durata = self._valori("haDurata", stati)
+
+        # Dispositivi (una riga per coppia stanza-dispositivo)
+        self.dispositivo_stanza, self._dispositivi = self._coppie("haDispositivo")
+        self.consumo = self._valori("haConsumo", self._dispositivi)
+
+        # Presenze: persone distinte per stanza
+        presenza_stanza, persone = self._coppie("haPresenza")
+        coppie_distinte = np.unique(np.stack([presenza_stanza, persone]), axis=1) if len(persone) else np.empty((2, 0), dtype=np.int64)
+        self.presenze = np.bincount(coppie_distinte[0], minlength=n)
+
+        self.orario_stanza, self._orari = self._coppie("haOrario")
+
+        # Case che contengono almeno una delle stanze selezionate
+        self.case, self.casa_stanza = self._case()
+
+    def _classi(self, *nomi):
+        return {c.storid for nome in nomi for c in getattr(self.onto, nome).descendants()}
+
+    def _tipizzati(self, nome_classe, proprieta_dominio):
+        # Individui della classe (o sottoclassi) più i soggetti delle proprietà con quel dominio
+        individui = {s for c in self._classi(nome_classe) for s in self.world._get_obj_triples_po_s(rdf_type, c)}
+        for nome in proprieta_dominio:
+            p = getattr(self.onto, nome).storid
+            individui.update(s for s, _, _ in self.world._get_obj_triples_spo_spo(None, p, None))
+        return individui
+
+    def _coppie(self, nome_proprieta):
+        p = getattr(self.onto, nome_proprieta).storid
+        if self._completo:
+            coppie = [(self._pos[s], o) for s, _, o in self.world._get_obj_triples_spo_spo(None, p, None) if s in self._pos]
+        else:
+            coppie = [(i, o) for i, s in enumerate(self.stanze.tolist()) for o in self.world._get_obj_triples_sp_o(s, p)]
+        if not coppie:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        indici, oggetti = zip(*coppie)
+        return np.array(indici, dtype=np.int64), np.array(oggetti, dtype=np.int64)
+
+    def _valori(self, nome_proprieta, soggetti):
+        # Valore numerico della proprietà funzionale per ogni soggetto (NaN se assente)
+        p = getattr(self.onto, nome_proprieta).storid
+        if self._completo:
+            valori = {s: o for s, _, o, _ in self.world._get_data_triples_spod_spod(None, p, None, None)}
+        else:
+            valori = {}
+            for s in soggetti.tolist():
+                for o, _ in self.world._get_data_triples_sp_od(s, p):
+                    valori[s] = o
+        return np.array([valori.get(s, np.nan) for s in soggetti.tolist()], dtype=float)
+
+    def _case(self):
+        p = self.onto.haStanza.storid
+        coppie = [(s, self._pos[o]) for s, _, o in self.world._get_obj_triples_spo_spo(None, p, None) if o in self._pos] \
+            if self._completo else \
+            [(s, i) for i, o in enumerate(self.stanze.tolist()) for s in self.world._get_obj_triples_po_s(p, o)]
+        case = np.array(sorted({s for s, _ in coppie}), dtype=np.int64)
+        pos_case = {int(s): i for i, s in enumerate(case)}
+        casa_stanza = np.array([(pos_case[s], i) for s, i in coppie], dtype=np.int64).reshape(-1, 2)
+        return case, casa_stanza
+
+    def _riduci(self, indici, condizione, n):
+        # OR per stanza (o casa) della condizione valutata su ogni coppia
+        risultato = np.zeros(n, dtype=bool)
+        risultato[indici[condizione]] = True
+        return risultato
+
+    def esiste_stato(self, condizione):
+        return self._riduci(self.stato_stanza, condizione, len(self.stanze))
+
+    def esiste_dispositivo(self, condizione):
+        return self._riduci(self.dispositivo_stanza, condizione, len(self.stanze))
+
+    def dispositivo_di_tipo(self, *nomi_classi):
+        tipi = {s for c in self._classi(*nomi_classi) for s in self.world._get_obj_triples_po_s(rdf_type, c)}
+        return np.isin(self._dispositivi, np.fromiter(tipi, dtype=np.int64, count=len(tipi)))
+
+    def ha_orario(self, nome_classe):
+        tipi = {s for c in self._classi(nome_classe) for s in self.world._get_obj_triples_po_s(rdf_type, c)}
+        condizione = np.isin(self._orari, np.fromiter(tipi, dtype=np.int64, count=len(tipi)))
+        return self._riduci(self.orario_stanza, condizione, len(self.stanze))
+
+    def almeno_due_presenze(self):
+        # Nessuna stanza, anche con due o più individui Persona in haPresenza (vedi UNICITA_NOMI)
+        if not UNICITA_NOMI:
+            return np.zeros(len(self.stanze), dtype=bool)
+        return self.presenze >= 2
+
+    def casa_con_stanza(self, condizione_stanza):
+        return self._riduci(self.casa_stanza[:, 0], condizione_stanza[self.casa_stanza[:, 1]], len(self.case))
+
+
+def calcola_appartenenze(contesto, classi=None):
+    # Valuta le classi derivate richieste (tutte per default) nell'ordine delle dipendenze
+    risultati = {}
+    for nome, (_, dipendenze, definizione) in DEFINIZIONI.items():
+        if classi is not None and nome not in classi:
+            continue
+        for dip in dipendenze:
+            if dip in DEFINIZIONI and dip not in risultati:
+                risultati[dip] = DEFINIZIONI[dip][2](contesto, risultati)
+        risultati[nome] = definizione(contesto, risultati)
+    return risultati
+
+
+def individui_appartenenti(contesto, risultati):
+    # Classe derivata -> storid degli individui che vi appartengono
+    return {
+        nome: (contesto.stanze if DEFINIZIONI[nome][0] == "stanza" else contesto.case)[appartiene].tolist()
+        for nome, appartiene in risultati.items()
+    }
+
+
+def triple_appartenenze(contesto, risultati):
+    # Triple rdf:type (IRI) per le appartenenze vere, nel formato della cache del reasoner
+    world = contesto.world
+    tipo = world._unabbreviate(rdf_type)
+    return [
+        (world._unabbreviate(s), tipo, getattr(contesto.onto, nome).iri)
+        for nome, individui in individui_appartenenti(contesto, risultati).items()
+        for s in individui
+    ]
+
+
+def materializza(onto):
+    contesto = ContestoStanze(onto)
+    risultati = calcola_appartenenze(contesto)
+    return {"reasoner": "nativo", "triple": sorted(triple_appartenenze(contesto, risultati))}
+
+
+# AGGIORNAMENTO INCREMENTALE
+PROPRIETA_STATO = ("haTemperatura", "haIlluminazione", "haDurata")
+
+def classi_da_ricalcolare(proprieta):
+    # Chiusura delle dipendenze: classi che usano le proprietà modificate, direttamente o tramite altre classi
+    modificate = set(proprieta)
+    classi = []
+    for nome, (_, dipendenze, _) in DEFINIZIONI.items():
+        if modificate.intersection(dipendenze):
+            classi.append(nome)
+            modificate.add(nome)
+    return classi
+
+def _allinea_tipi(onto, classe, individui, appartiene):
+    # Aggiunge o rimuove l'asserzione rdf:type solo dove l'appartenenza è cambiata
+    world = onto.world
+    c = classe.storid
+    aggiunte, rimosse = [], []
+    for s, vero in zip(individui.tolist(), appartiene.tolist()):
+        presente = world._has_obj_triple_spo(s, rdf_type, c)
+        if vero and not presente:
+            onto._add_obj_triple_spo(s, rdf_type, c)
+            aggiunte.append(s)
+        elif presente and not vero:
+            world._del_obj_triple_spo(s, rdf_type, c)
+            rimosse.append(s)
+
+    with LOADING:
+        for s in aggiunte + rimosse:
+            entita = world._entities.get(s)
+            if isinstance(entita, Thing):
+                is_a = [x for x in entita.is_a if x is not classe]
+                entita.is_a.reinit(is_a + [classe] if s in aggiunte else is_a)
+    return len(aggiunte), len(rimosse)
+
+def aggiorna_stanze(onto, stanze, proprieta):
+    # Ricalcola solo le classi che dipendono da 'proprieta', solo per le stanze indicate
+    classi = classi_da_ricalcolare(proprieta)
+    if not classi:
+        return {}
+    world = onto.world
+    stanze = {s if isinstance(s, int) else s.storid for s in stanze}
+    if any(DEFINIZIONI[nome][0] == "casa" for nome in classi):
+        # Le classi di Casa guardano tutte le stanze della casa, non solo quelle modificate
+        haStanza = onto.haStanza.storid
+        case = {c for s in stanze for c in world._get_obj_triples_po_s(haStanza, s)}
+        stanze.update(s for c in case for s in world._get_obj_triples_sp_o(c, haStanza))
+
+    contesto = ContestoStanze(onto, stanze)
+    risultati = calcola_appartenenze(contesto, classi)
+    modifiche = {}
+    for nome in classi:
+        individui = contesto.stanze if DEFINIZIONI[nome][0] == "stanza" else contesto.case
+        modifiche[nome] = _allinea_tipi(onto, getattr(onto, nome), individui, risultati[nome])
+    return modifiche
+
+def aggiorna_stati(onto, stati, proprieta=PROPRIETA_STATO):
+    # Punto d'ingresso per nuove letture: individui StatoAmbientale modificati -> stanze coinvolte
+    world = onto.world
+    haStato = onto.haStato.storid
+    stanze = {
+        s
+        for stato in stati
+        for s in world._get_obj_triples_po_s(haStato, stato if isinstance(stato, int) else stato.storid)
+    }
+    return aggiorna_stanze(onto, stanze, proprieta)
+
+
+# VERIFICA CONTRO IL REASONER JAVA
+def _riduci_a_campione(onto, num_case, seed):
+    # Tiene solo le case estratte e gli individui raggiungibili da esse
+    world = onto.world
+    case = sorted(onto.Casa.instances(), key=lambda c: c.name)
+    campione = random.Random(seed).sample(case, min(num_case, len(case)))
+    da_tenere = set()
+    frontiera = [c.storid for c in campione]
+    while frontiera:
+        s = frontiera.pop()
+        if s in da_tenere:
+            continue
+        da_tenere.add(s)
+        frontiera.extend(o for _, p, o in world._get_obj_triples_spo_spo(s, None, None) if o > 0 and p != rdf_type)
+
+    individui = {i.storid for i in onto.individuals()}
+    for s in individui - da_tenere:
+        world._del_obj_triple_spo(s, None, None)
+        world._del_data_triple_spod(s, None, None, None)
+
+    # Rimuove le appartenenze derivate già asserite (la KB salvata è già ragionata)
+    for nome in DEFINIZIONI:
+        c = getattr(onto, nome).storid
+        for s in list(world._get_obj_triples_po_s(rdf_type, c)):
+            world._del_obj_triple_spo(s, rdf_type, c)
+    return campione
+
+def verifica_su_campione(nome_kb=ONTO_KB, num_case=5, reasoner="pellet", seed=42):
+    onto = apri_kb_isolata(nome_kb)
+    world = onto.world
+    campione = _riduci_a_campione(onto, num_case, seed)
+
+    contesto = ContestoStanze(onto)
+    attese = {
+        nome: {world._unabbreviate(s) for s in individui}
+        for nome, individui in individui_appartenenti(contesto, calcola_appartenenze(contesto)).items()
+    }
+
+    with onto:
+        reasoner_owl(reasoner)(world, infer_property_values=True, debug=0)
+
+    differenze = {}
+    for nome in DEFINIZIONI:
+        dedotte = {i.iri for i in getattr(onto, nome).instances()}
+        if dedotte != attese[nome]:
+            differenze[nome] = {"solo_nativo": sorted(attese[nome] - dedotte), "solo_reasoner": sorted(dedotte - attese[nome])}
+    world.close()
+    return campione, differenze
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Materializzazione nativa delle classi derivate SmartHome.")
+    parser.add_argument("--verifica", type=int, metavar="NUM_CASE", default=0,
+                        help="confronta i risultati con il reasoner Java su un campione di case")
+    parser.add_argument("--reasoner", choices=sorted(REASONER), default="pellet")
+    args = parser.parse_args()
+
+    ont_path = percorso_kb(ONTO_KB)
+    if not os.path.exists(ont_path):
+        print(f"ERRORE: file ontologia non trovato: '{os.path.relpath(ont_path)}'")
+        return
+
+    onto = apri_kb_isolata(ONTO_KB)
+    contesto = ContestoStanze(onto)
+    risultati = calcola_appartenenze(contesto)
+    print(f"Materializzazione nativa su {len(contesto.stanze)} stanze e {len(contesto.case)} case:")
+    for nome, appartiene in risultati.items():
+        print(f"- {nome}: {int(appartiene.sum())}")
+    onto.world.close()
+
+    if args.verifica:
+        print(f"\nVerifica con {args.reasoner} su un campione di {args.verifica} case...")
+        campione, differenze = verifica_su_campione(ONTO_KB, args.verifica, args.reasoner)
+        if differenze:
+            print("ATTENZIONE: differenze tra motore nativo e reasoner:")
+            for nome, diff in differenze.items():
+                print(f"- {nome}: {diff}")
+        else:
+            print(f"Risultati coerenti su {len(campione)} case.")
+
+if __name__ == "__main__":
+    main()
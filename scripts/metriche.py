@@ -0,0 +1,223 @@
+import os
+import sys
+import json
+import time
+import atexit
+import functools
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+DATA_DIR = os.path.join(BASE_DIR, "data")
+
+# Attivazione all'avvio, da ambiente:
+#   SMARTHOME_METRICHE=json|prometheus  istantanea a fine esecuzione in data/metriche_<script>.json|.prom
+#   SMARTHOME_METRICHE_FILE=<percorso>  destinazione alternativa
+#   SMARTHOME_PROFILO=1                 cProfile sull'intera esecuzione (.prof accanto all'istantanea)
+#   SMARTHOME_MEMORIA=1                 tracemalloc: picco e principali punti di allocazione
+# Disattivate, cronometri e contatori non registrano nulla e le funzioni decorate con
+# misurato() restano quelle originali.
+VARIABILE = "SMARTHOME_METRICHE"
+VARIABILE_FILE = "SMARTHOME_METRICHE_FILE"
+VARIABILE_PROFILO = "SMARTHOME_PROFILO"
+VARIABILE_MEMORIA = "SMARTHOME_MEMORIA"
+FORMATI_METRICHE = {"json": ".json", "prometheus": ".prom"}
+PREFISSO_PROMETHEUS = "smarthome"
+VOCI_PROFILO = 25  # Funzioni riportate dal profilo, per tempo cumulato
+VOCI_MEMORIA = 10  # Righe di codice riportate da tracemalloc, per memoria allocata
+
+_stato = {"formato": None, "percorso": None, "profilo": None, "memoria": False}
+_tempi = {}  # nome -> [chiamate, secondi, minimo, massimo]
+_contatori = {}
+
+def attive():
+    return _stato["formato"] is not None
+
+def abilita(formato="json", percorso=None, profilo=False, memoria=False):
+    if formato not in FORMATI_METRICHE:
+        raise ValueError(f"formato delle metriche '{formato}' non valido (validi: {', '.join(FORMATI_METRICHE)})")
+    if not attive():
+        atexit.register(_esporta_all_uscita)
+    _stato.update(formato=formato, percorso=percorso)
+    if profilo and _stato["profilo"] is None:
+        import cProfile
+        _stato["profilo"] = cProfile.Profile()
+        _stato["profilo"].enable()
+    if memoria and not _stato["memoria"]:
+        import tracemalloc
+        tracemalloc.start()
+        _stato["memoria"] = True
+
+def picco_rss_mb(figli=False):
+    # Picco di memoria residente del processo (o dei suoi figli terminati e attesi); None dove
+    # il modulo resource non esiste (Windows)
+    if not figli and os.path.exists("/proc/self/status"):
+        # Su Linux ru_maxrss di un processo parte dal picco del padre che lo ha creato;
+        # VmHWM conta solo la memoria del programma in esecuzione
+        with open("/proc/self/status", encoding="ascii") as f:
+            for riga in f:
+                if riga.startswith("VmHWM:"):
+                    return int(riga.split()[1]) / 1024
+    try:
+        import resource
+    except ImportError:
+        return None
+    return rss_in_mb(resource.getrusage(resource.RUSAGE_CHILDREN if figli else resource.RUSAGE_SELF).ru_maxrss)
+
+def rss_in_mb(ru_maxrss):
+    # ru_maxrss è in KiB su Linux, in byte su macOS
+    return ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+def configurazione():
+    # Impostazioni attive: cambiano cosa registra un'esecuzione (es. chiave della cache della pipeline)
+    return {"formato": _stato["formato"], "profilo": _stato["profilo"] is not None, "memoria": _stato["memoria"]}
+
+def azzera():
+    # Registrazioni vuote, es. in un processo figlio che eredita quelle del padre
+    _tempi.clear()
+    _contatori.clear()
+
+def registra_tempo(nome, secondi):
+    if _stato["formato"] is None:
+        return
+    voce = _tempi.get(nome)
+    if voce is None:
+        _tempi[nome] = [1, secondi, secondi, secondi]
+    else:
+        voce[0] += 1
+        voce[1] += secondi
+        voce[2] = min(voce[2], secondi)
+        voce[3] = max(voce[3], secondi)
+
+def conta(nome, n=1):
+    if _stato["formato"] is None:
+        return
+    _contatori[nome] = _contatori.get(nome, 0) + n
+
+class Cronometro:
+    # Misura sempre (il tempo resta in 'secondi'), registra solo con le metriche attive
+    __slots__ = ("nome", "inizio", "secondi")
+
+    def __init__(self, nome):
+        self.nome = nome
+        self.secondi = 0.0
+
+    def __enter__(self):
+        self.inizio = time.perf_counter()
+        return self
+
+    def __exit__(self, *eccezione):
+        self.secondi = time.perf_counter() - self.inizio
+        registra_tempo(self.nome, self.secondi)
+
+def cronometro(nome):
+    return Cronometro(nome)
+
+def misurato(nome):
+    # Per le funzioni chiamate molto spesso: la scelta è fatta all'import del modulo che
+    # le definisce, quindi con le metriche disattivate non c'è alcun costo per chiamata
+    def decora(funzione):
+        if not attive():
+            return funzione
+        @functools.wraps(funzione)
+        def misurata(*args, **kwargs):
+            inizio = time.perf_counter()
+            try:
+                return funzione(*args, **kwargs)
+            finally:
+                registra_tempo(nome, time.perf_counter() - inizio)
+        return misurata
+    return decora
+
+def _profilo():
+    import pstats
+    statistiche = pstats.Stats(_stato["profilo"]).stats
+    voci = sorted(statistiche.items(), key=lambda voce: voce[1][3], reverse=True)[:VOCI_PROFILO]
+    return [
+        {"funzione": f"{os.path.basename(file)}:{riga}({funzione})", "chiamate": nc,
+         "secondi_propri": round(tt, 6), "secondi_cumulati": round(ct, 6)}
+        for (file, riga, funzione), (_, nc, tt, ct, _) in voci
+    ]
+
+def _memoria():
+    import tracemalloc
+    corrente, picco = tracemalloc.get_traced_memory()
+    allocazioni = tracemalloc.take_snapshot().statistics("lineno")[:VOCI_MEMORIA]
+    return {
+        "corrente_mb": round(corrente / 2**20, 3),
+        "picco_mb": round(picco / 2**20, 3),
+        "allocazioni": [{"posizione": str(a.traceback[0]), "kb": round(a.size / 1024, 1), "blocchi": a.count} for a in allocazioni],
+    }
+
+def istantanea():
+    dati = {
+        "script": os.path.basename(sys.argv[0]) if sys.argv and sys.argv[0] else "python",
+        "data": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "tempi": {
+            nome: {"chiamate": n, "secondi": round(totale, 6), "min": round(minimo, 6), "max": round(massimo, 6)}
+            for nome, (n, totale, minimo, massimo) in sorted(_tempi.items())
+        },
+        "contatori": dict(sorted(_contatori.items())),
+    }
+    if _stato["profilo"] is not None:
+        _stato["profilo"].disable()
+        dati["profilo"] = _profilo()
+        _stato["profilo"].enable()
+    if _stato["memoria"]:
+        dati["memoria"] = _memoria()
+    return dati
+
+def unisci(dati):
+    # Aggiunge le registrazioni di un'istantanea (es. di un processo figlio) a quelle correnti
+    for nome, t in dati.get("tempi", {}).items():
+        voce = _tempi.get(nome)
+        if voce is None:
+            _tempi[nome] = [t["chiamate"], t["secondi"], t["min"], t["max"]]
+        else:
+            _tempi[nome] = [voce[0] + t["chiamate"], voce[1] + t["secondi"], min(voce[2], t["min"]), max(voce[3], t["max"])]
+    for nome, n in dati.get("contatori", {}).items():
+        _contatori[nome] = _contatori.get(nome, 0) + n
+
+def in_prometheus(dati):
+    # Formato testuale di Prometheus: il nome della misura è l'etichetta 'nome'
+    righe = [f"# TYPE {PREFISSO_PROMETHEUS}_tempo_secondi summary"]
+    for nome, t in dati["tempi"].items():
+        righe.append(f'{PREFISSO_PROMETHEUS}_tempo_secondi_sum{{nome="{nome}"}} {t["secondi"]}')
+        righe.append(f'{PREFISSO_PROMETHEUS}_tempo_secondi_count{{nome="{nome}"}} {t["chiamate"]}')
+    righe.append(f"# TYPE {PREFISSO_PROMETHEUS}_tempo_massimo_secondi gauge")
+    righe += [f'{PREFISSO_PROMETHEUS}_tempo_massimo_secondi{{nome="{nome}"}} {t["max"]}' for nome, t in dati["tempi"].items()]
+    righe.append(f"# TYPE {PREFISSO_PROMETHEUS}_conteggio_total counter")
+    righe += [f'{PREFISSO_PROMETHEUS}_conteggio_total{{nome="{nome}"}} {n}' for nome, n in dati["contatori"].items()]
+    if "memoria" in dati:
+        righe.append(f"# TYPE {PREFISSO_PROMETHEUS}_memoria_picco_byte gauge")
+        righe.append(f"{PREFISSO_PROMETHEUS}_memoria_picco_byte {int(dati['memoria']['picco_mb'] * 2**20)}")
+    return "\n".join(righe) + "\n"
+
+def percorso_predefinito(formato=None):
+    formato = formato or _stato["formato"] or "json"
+    script = os.path.splitext(os.path.basename(sys.argv[0]))[0] if sys.argv and sys.argv[0] else "python"
+    return os.path.join(DATA_DIR, f"metriche_{script or 'python'}{FORMATI_METRICHE[formato]}")
+
+def esporta(percorso=None, formato=None):
+    formato = formato or _stato["formato"] or "json"
+    percorso = percorso or _stato["percorso"] or percorso_predefinito(formato)
+    dati = istantanea()
+    os.makedirs(os.path.dirname(os.path.abspath(percorso)), exist_ok=True)
+    with open(percorso, "w", encoding="utf-8") as f:
+        if formato == "prometheus":
+            f.write(in_prometheus(dati))
+        else:
+            json.dump(dati, f, indent=2)
+    if _stato["profilo"] is not None:
+        _stato["profilo"].dump_stats(os.path.splitext(percorso)[0] + ".prof")
+    return percorso
+
+def _esporta_all_uscita():
+    if attive():
+        print(f"Metriche salvate in '{os.path.relpath(esporta())}'.")
+
+_formato = os.environ.get(VARIABILE, "").strip().lower()
+_formato = "json" if _formato in ("1", "si") else _formato
+if _formato in FORMATI_METRICHE:
+    abilita(_formato, os.environ.get(VARIABILE_FILE) or None,
+            profilo=os.environ.get(VARIABILE_PROFILO) == "1", memoria=os.environ.get(VARIABILE_MEMORIA) == "1")
+elif _formato not in ("", "0", "no"):
+    print(f"ATTENZIONE: {VARIABILE}='{_formato}' non valido (validi: {', '.join(FORMATI_METRICHE)}), metriche disattivate.")
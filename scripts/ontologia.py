@@ -1,15 +1,13 @@
-from owlready2 import *
 import os
+from archivio_kb import crea_kb, salva_kb
+from contesto_pipeline import ContestoPipeline
 
-def main():
+def main(argv=None, contesto=None):
+    from owlready2 import Thing, ObjectProperty, DataProperty, FunctionalProperty, SymmetricProperty
+    contesto = contesto or ContestoPipeline()
     print("Creazione ontologia SmartHome avanzata...")
 
-    base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-    output_dir = os.path.join(base_dir, "ontology")
-    os.makedirs(output_dir, exist_ok=True)
-    output_path = os.path.join(output_dir, "smarthome.owl")
-
-    onto = get_ontology("http://example.org/ontology/smarthome.owl")
+    onto = crea_kb("smarthome")
 
     with onto:
         # CLASSI BASE
@@ -88,6 +86,9 @@ def main():
         class StanzaFreddaProlungata(Stanza):
             equivalent_to = [StanzaFredda & haStato.some(StatoAmbientale & (haDurata >= 30.0))]
 
+        # haPresenza.min(2, Persona): senza assiomi AllDifferent tra le persone il reasoner non
+        # può contarne due distinte, quindi questa classe e CasaAltaOccupazione restano vuote
+        # (anche nel motore nativo, vedi materializzazione.UNICITA_NOMI)
         class StanzaDaRiscaldareAltaOccupazione(Stanza):
             equivalent_to = [
                 StanzaFredda & haPresenza.min(2, Persona) & haOrario.some(FasciaEnergeticaAlta)
@@ -107,6 +108,7 @@ def main():
         class StanzaDaClimatizzare(Stanza):
             equivalent_to = [StanzaCalda & haPresenza.some(Persona)]
 
+        # Vuota come StanzaDaRiscaldareAltaOccupazione (haPresenza.min(2) senza AllDifferent)
         class CasaAltaOccupazione(Casa):
             equivalent_to = [Casa & haStanza.some(Stanza & haPresenza.min(2, Persona))]
 
@@ -116,12 +118,13 @@ def main():
         class StanzaDaClimatizzareELuminare(Stanza):
             equivalent_to = [StanzaCalda & StanzaBuia & haPresenza.some(Persona) & haOrario.some(FasciaEnergeticaBassa)]
 
-    onto.save(file=output_path, format="rdfxml")
+    output_path = salva_kb(onto, "smarthome")
     print(f"Ontologia salvata in '{os.path.relpath(output_path)}'.")
 
     print("\nAvvio reasoner Pellet per inferenze...")
-    sync_reasoner_pellet(infer_property_values=True, debug=0)
+    contesto.esegui_reasoner(onto)
     print("Reasoning completato.")
+    contesto.registra_kb("smarthome", onto)
 
     derived_classes = [
         StanzaFredda, StanzaCalda, StanzaBuia, StanzaLuminosissima,
@@ -0,0 +1,231 @@
+import os
+import sys
+import json
+import time
+import argparse
+import importlib
+import contextlib
+import multiprocessing
+import metriche
+from archivio_kb import percorso_kb
+from dataset_io import FORMATI, percorso_dataset
+from contesto_pipeline import ContestoPipeline
+from manifesto_pipeline import MANIFESTO, hash_artefatto, chiave_stadio, leggi_manifesto, scrivi_manifesto, in_cache
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.abspath(os.path.join(SCRIPTS_DIR, ".."))
+DATA_DIR = os.path.join(BASE_DIR, "data")
+LOG_DIR = os.path.join(DATA_DIR, "pipeline_log")
+
+MODELLI_SALVATI = [f"{label}_{modello}.joblib" for label in ("Base", "KB")
+                   for modello in ("RandomForest", "LogisticRegression", "SVM")]
+MODELLI_SALVATI += [f"{label}_RandomForest_compatta.npz" for label in ("Base", "KB")]
+
+def _dataset(nome):
+    # File del formato scelto per la pipeline, passato con --formato anche ai passi che lo leggono
+    return lambda formato: percorso_dataset(DATA_DIR, nome, formato)
+
+# Artefatto -> percorso, dato il formato dei dataset
+ARTEFATTI = {
+    "smarthome": lambda formato: percorso_kb("smarthome"),
+    "smarthome_popolata": lambda formato: percorso_kb("smarthome_popolata"),
+    "smarthome_con_azioni": lambda formato: percorso_kb("smarthome_con_azioni"),
+    "dataset_base": _dataset("SmartHome_base"),
+    "dataset_kb": _dataset("SmartHome_KB_enhanced"),
+    "report": lambda formato: os.path.join(DATA_DIR, "report_KBS_reasoning.csv"),
+    "storico": lambda formato: os.path.join(DATA_DIR, "storico_stanze.npz"),  # serie_temporali.STORICO
+}
+ARTEFATTI.update({nome: (lambda formato, nome=nome: os.path.join(DATA_DIR, nome)) for nome in MODELLI_SALVATI})
+
+# Artefatti prodotti e letti solo se l'opzione compare negli argomenti del passo
+ARTEFATTI_OPZIONALI = {"storico": "--serie-temporali"}
+
+# Grafo dei passi di main.py: (descrizione, modulo, artefatti in ingresso, artefatti prodotti,
+# moduli il cui codice entra nella chiave della cache). Costanti come NUM_CASE,
+# RIGHE_PER_STANZA o i parametri dei modelli fanno parte del codice degli script.
+MODULI_COMUNI = ["archivio_kb", "ragionamento", "contesto_pipeline"]
+STADI = {
+    1: ("Crea ontologia ambiente", "ontologia", [], ["smarthome"], []),
+    2: ("Genera istanze smart home", "genera_istanze", ["smarthome"], ["smarthome_popolata", "storico"],
+        ["regole", "stato_dispositivi", "azioni_kb", "serie_temporali"]),
+    3: ("Genera dataset", "genera_dataset", ["smarthome_popolata", "storico"], ["dataset_base", "dataset_kb"],
+        ["dataset_io", "serie_temporali"]),
+    4: ("Applicazione delle regole SmartHome", "applica_regole", ["smarthome_popolata"], ["smarthome_con_azioni"],
+        ["regole", "stato_dispositivi", "azioni_kb"]),
+    5: ("Predizione occupazione", "predizione_occupazione", ["dataset_base", "dataset_kb"], MODELLI_SALVATI,
+        ["dataset_io", "artefatto_modello", "foresta_compatta"]),
+    6: ("Analisi KBS SmartHome", "analisi_KBS", ["smarthome_popolata", "dataset_base"], ["report"],
+        ["regole", "dataset_io"]),
+}
+
+def intervallo_stadi(testo):
+    # "2-6" o "1,3,5" -> [2, 3, 4, 5, 6] / [1, 3, 5]
+    stadi = []
+    for parte in testo.split(","):
+        inizio, _, fine = parte.partition("-")
+        stadi.extend(range(int(inizio), int(fine or inizio) + 1))
+    for s in stadi:
+        if s not in STADI:
+            raise argparse.ArgumentTypeError(f"stadio {s} inesistente (validi: {min(STADI)}-{max(STADI)})")
+    return stadi
+
+def argomenti_stadi(args):
+    # Opzioni della riga di comando passate agli script che le accettano
+    istanze = ["--num-case", str(args.num_case)] if args.num_case else []
+    if args.seed is not None:
+        istanze += ["--seed", str(args.seed)]
+    if args.bulk:
+        istanze.append("--bulk")
+    dataset = ["--formato", args.formato]
+    if args.serie_temporali:
+        istanze.append("--serie-temporali")
+        dataset.append("--serie-temporali")
+    predizione = ["--formato", args.formato]
+    if args.n_jobs is not None:
+        predizione += ["--n-jobs", str(args.n_jobs)]
+    return {2: istanze, 3: dataset, 5: predizione, 6: ["--formato", args.formato]}
+
+def artefatti(nomi, argv):
+    return [a for a in nomi if a not in ARTEFATTI_OPZIONALI or ARTEFATTI_OPZIONALI[a] in argv]
+
+def ondate(stadi):
+    # Passi raggruppati per livello nel grafo: quelli di una stessa ondata non dipendono
+    # l'uno dall'altro (3 e 4, 5 e 6). Gli ingressi dei passi non scelti si leggono da disco.
+    produttore = {a: s for s in stadi for a in STADI[s][3]}
+    livello = {}
+    for s in sorted(stadi):
+        livello[s] = 1 + max((livello[produttore[a]] for a in STADI[s][2] if a in produttore), default=-1)
+    return [[s for s in sorted(stadi) if livello[s] == n] for n in range(max(livello.values(), default=-1) + 1)]
+
+def chiave(stadio, argv, formato="csv"):
+    # Hash degli artefatti in ingresso, argomenti e codice dei moduli coinvolti
+    _, modulo, ingressi, _, codice = STADI[stadio]
+    sorgenti = {m: hash_artefatto(os.path.join(SCRIPTS_DIR, m + ".py")) for m in [modulo] + MODULI_COMUNI + codice}
+    # Con metriche, profilo o tracemalloc attivati il passo va rieseguito per misurarlo
+    return chiave_stadio({a: hash_artefatto(ARTEFATTI[a](formato)) for a in artefatti(ingressi, argv)},
+                         {"argv": argv, "sorgenti": sorgenti, "metriche": metriche.configurazione()})
+
+def _esegui(stadio, argv, contesto):
+    importlib.import_module(STADI[stadio][1]).main(argv, contesto)
+
+def _file_metriche(log):
+    return os.path.splitext(log)[0] + ".metriche.json"
+
+def _esegui_in_figlio(stadio, argv, contesto, log, durata):
+    # Processo creato con fork: eredita i DataFrame del contesto del padre ma non le KB, che
+    # riapre da disco (le connessioni SQLite dei World owlready2 non vanno usate in due
+    # processi). Durata e metriche del figlio tornano al padre, che le unisce
+    figlio = ContestoPipeline(condividi=True)
+    figlio.dataset = contesto.dataset
+    metriche.azzera()
+    avvio = time.perf_counter()
+    try:
+        with open(log, "w", encoding="utf-8") as f, contextlib.redirect_stdout(f), contextlib.redirect_stderr(f):
+            _esegui(stadio, argv, figlio)
+    finally:
+        durata.value = time.perf_counter() - avvio
+    if metriche.attive():
+        metriche.esporta(_file_metriche(log), "json")
+
+def esegui_ondata(ondata, argomenti, contesto, parallelo=True):
+    # Il primo passo nel processo corrente (i suoi risultati restano nel contesto), gli
+    # altri in processi figli; senza fork (Windows, macOS) uno dopo l'altro
+    tempi = {}
+    figli = []
+    if parallelo and len(ondata) > 1 and "fork" in multiprocessing.get_all_start_methods():
+        os.makedirs(LOG_DIR, exist_ok=True)
+        fork = multiprocessing.get_context("fork")
+        for stadio in ondata[1:]:
+            log = os.path.join(LOG_DIR, f"{stadio}_{STADI[stadio][1]}.log")
+            if os.path.exists(_file_metriche(log)):
+                os.remove(_file_metriche(log))
+            durata = fork.Value("d", 0.0)
+            processo = fork.Process(target=_esegui_in_figlio,
+                                    args=(stadio, argomenti.get(stadio, []), contesto, log, durata))
+            processo.start()
+            figli.append((stadio, processo, log, durata))
+        print(f"Passi {', '.join(str(s) for s, _, _, _ in figli)} in parallelo, output in '{os.path.relpath(LOG_DIR)}'.")
+    in_figli = {s for s, _, _, _ in figli}
+    for stadio in [s for s in ondata if s not in in_figli]:
+        print(f"\n▶ {stadio}. {STADI[stadio][0]}...\n")
+        avvio = time.perf_counter()
+        _esegui(stadio, argomenti.get(stadio, []), contesto)
+        tempi[stadio] = time.perf_counter() - avvio
+    for stadio, processo, log, durata in figli:
+        processo.join()
+        tempi[stadio] = durata.value
+        print(f"\n▶ {stadio}. {STADI[stadio][0]} (processo separato)...\n")
+        with open(log, encoding="utf-8", errors="replace") as f:
+            print(f.read(), end="")
+        if metriche.attive() and os.path.exists(_file_metriche(log)):
+            with open(_file_metriche(log), encoding="utf-8") as f:
+                metriche.unisci(json.load(f))
+        if processo.exitcode != 0:
+            print(f"ERRORE: il passo {stadio} è terminato con codice {processo.exitcode}.")
+    return tempi
+
+def esegui_pipeline(stadi, argomenti=None, contesto=None, formato="csv", forza=False, parallelo=True):
+    argomenti = argomenti or {}
+    contesto = contesto or ContestoPipeline(condividi=True)
+    manifesto = leggi_manifesto()
+    tempi = {}  # None per i passi in cache
+    for ondata in ondate(stadi):
+        chiavi = {s: chiave(s, argomenti.get(s, []), formato) for s in ondata}
+        uscite = {s: {a: ARTEFATTI[a](formato) for a in artefatti(STADI[s][3], argomenti.get(s, []))} for s in ondata}
+        da_eseguire = []
+        for s in ondata:
+            if not forza and in_cache(manifesto.get(str(s)), chiavi[s], uscite[s]):
+                print(f"\n▶ {s}. {STADI[s][0]}: ingressi e parametri invariati, risultati in cache.")
+                metriche.conta("pipeline.passi_in_cache")
+                tempi[s] = None
+            else:
+                manifesto.pop(str(s), None)
+                da_eseguire.append(s)
+        if not da_eseguire:
+            continue
+        avvio = time.time()
+        eseguiti = esegui_ondata(da_eseguire, argomenti, contesto, parallelo)
+        for s, secondi in eseguiti.items():
+            metriche.registra_tempo(f"pipeline.{STADI[s][1]}", secondi)
+        tempi.update(eseguiti)
+        # Si registra solo il passo che ha riscritto tutte le sue uscite: gli script
+        # segnalano gli errori a video, senza eccezioni
+        for s in da_eseguire:
+            prodotte = {a: p for a, p in uscite[s].items() if os.path.exists(p) and os.path.getmtime(p) >= avvio - 1}
+            if len(prodotte) == len(uscite[s]):
+                manifesto[str(s)] = {"chiave": chiavi[s], "uscite": {a: hash_artefatto(p) for a, p in prodotte.items()}}
+            else:
+                mancanti = sorted(set(uscite[s]) - set(prodotte))
+                print(f"ATTENZIONE: passo {s} non registrato nel manifesto, uscite non prodotte: {', '.join(mancanti)}")
+        scrivi_manifesto(manifesto)
+    return tempi
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Esecuzione non interattiva dei passi della pipeline in un solo processo; "
+                    "i passi con ingressi e parametri invariati non vengono rieseguiti.")
+    parser.add_argument("--stadi", "--stages", type=intervallo_stadi, default=list(STADI),
+                        help="passi da eseguire, es. 2-6 o 1,3 (default tutti)")
+    parser.add_argument("--num-case", type=int, default=None, help="numero di case (genera_istanze.py)")
+    parser.add_argument("--seed", type=int, default=None, help="seme del generatore (genera_istanze.py)")
+    parser.add_argument("--bulk", action="store_true", help="generazione massiva delle istanze")
+    parser.add_argument("--serie-temporali", action="store_true",
+                        help="storico delle letture per stanza e feature su finestre mobili (genera_istanze.py, genera_dataset.py)")
+    parser.add_argument("--formato", choices=sorted(FORMATI), default="csv", help="formato dei dataset")
+    parser.add_argument("--n-jobs", type=int, default=None, help="processi per l'addestramento (predizione_occupazione.py)")
+    parser.add_argument("--forza", action="store_true", help="riesegue anche i passi in cache")
+    parser.add_argument("--sequenziale", action="store_true", help="passi indipendenti uno dopo l'altro, senza processi figli")
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+
+    inizio = time.perf_counter()
+    tempi = esegui_pipeline(args.stadi, argomenti_stadi(args), formato=args.formato,
+                            forza=args.forza, parallelo=not args.sequenziale)
+    print("\n=== Tempi per passo ===")
+    for stadio in sorted(tempi):
+        secondi = "in cache" if tempi[stadio] is None else f"{tempi[stadio]:.2f} s"
+        print(f"{stadio}. {STADI[stadio][0]:<38} {secondi:>10}")
+    print(f"{'Totale':<41} {time.perf_counter() - inizio:8.2f} s")
+    print(f"Manifesto degli artefatti: '{os.path.relpath(MANIFESTO)}'.")
+
+if __name__ == "__main__":
+    main()
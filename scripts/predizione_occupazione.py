@@ -1,55 +1,224 @@
 import os
+import sys
+import time
+import argparse
 import warnings
 import pandas as pd
 import numpy as np
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.linear_model import LogisticRegression
-from sklearn.svm import SVC
-from sklearn.model_selection import StratifiedKFold, cross_val_score, GridSearchCV
-from sklearn.preprocessing import StandardScaler
-from joblib import dump
-
-MODELLI = {
-    "RandomForest": RandomForestClassifier(n_estimators=150, random_state=42),
-    "LogisticRegression": LogisticRegression(max_iter=5000, solver='lbfgs'),
-}
+from joblib import Parallel, delayed
+from artefatto_modello import salva_artefatto
+from foresta_compatta import esporta_foresta, carica_foresta
+from dataset_io import FORMATI, percorso_dataset, colonne_dataset, leggi_dataset
+from metriche import conta, cronometro, registra_tempo
+
+# sklearn è importato nelle funzioni che lo usano: caricare il modulo (es. per
+# carica_dataset o prepara_dati) non costa l'import degli stimatori
+def crea_modelli():
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.linear_model import LogisticRegression
+    return {
+        "RandomForest": RandomForestClassifier(n_estimators=150, random_state=42),
+        "LogisticRegression": LogisticRegression(max_iter=5000, solver='lbfgs'),
+    }
 
 # Parametri GridSearch per SVM
 SVM_PARAMS = {'C':[0.1, 1, 10], 'gamma':[0.01, 0.1, 1]}
 
-def carica_dataset(percorso):
+# SVM "esatta" (SVC rbf con probabilità) o "approssimata" (Nystroem + LinearSVC, per dataset
+# grandi); con "auto" l'approssimata è usata oltre SOGLIA_SVM_APPROSSIMATA righe
+SVM_MODALITA = "auto"
+SOGLIA_SVM_APPROSSIMATA = 10000
+CAMPIONE_GRIGLIA_SVM = 10000  # Righe usate dalla grid search della SVM approssimata
+COMPONENTI_NYSTROEM = 100
+
+# Processi per l'addestramento parallelo (-1 = tutti i core)
+N_JOBS = -1
+CV_FOLDS = 5
+
+def carica_dataset(percorso, colonne=None, contesto=None):
+    # DataFrame già in memoria (pipeline in un solo processo) o letto da disco
+    df = contesto.dataset_in_memoria(percorso, colonne) if contesto else None
+    if df is not None:
+        print(f"\nDataset '{os.path.basename(percorso)}' in memoria: {len(df)} righe.")
+        return df
     if not os.path.exists(percorso):
         print(f"ERRORE: file dataset '{percorso}' non trovato.")
         return None
-    df = pd.read_csv(percorso)
+    # Solo le colonne richieste e presenti nel dataset
+    if colonne is not None:
+        disponibili = set(colonne_dataset(percorso))
+        colonne = [c for c in colonne if c in disponibili]
+    df = leggi_dataset(percorso, colonne)
     print(f"\nDataset '{os.path.basename(percorso)}' caricato: {len(df)} righe.")
     return df
 
 def prepara_dati(df, features, target):
-    # Se alcune colonne feature non esistono, le ignora
+    # Se alcune colonne feature non esistono, le ignora (segnalandole)
     features_valid = [f for f in features if f in df.columns]
+    mancanti = [f for f in features if f not in df.columns]
+    if mancanti:
+        print(f"ATTENZIONE: feature assenti nel dataset, ignorate: {', '.join(mancanti)}")
     X = df[features_valid]
     y = df[target]
     return X, y
 
-def valuta_modello_cv(model, X, y, cv=5):
-    skf = StratifiedKFold(n_splits=cv, shuffle=True, random_state=42)
+def modalita_svm(modalita, num_righe):
+    if modalita == "auto":
+        return "approssimata" if num_righe > SOGLIA_SVM_APPROSSIMATA else "esatta"
+    return modalita
+
+def crea_svm(modalita):
+    from sklearn.svm import SVC, LinearSVC
+    from sklearn.pipeline import Pipeline
+    from sklearn.kernel_approximation import Nystroem
+    if modalita == "approssimata":
+        return Pipeline([
+            ("kernel", Nystroem(kernel="rbf", n_components=COMPONENTI_NYSTROEM, random_state=42)),
+            ("svm", LinearSVC(dual=False, random_state=42)),
+        ])
+    return SVC(probability=True, kernel='rbf', random_state=42)
+
+def griglia_svm(modalita):
+    from sklearn.model_selection import ParameterGrid
+    griglia = list(ParameterGrid(SVM_PARAMS))
+    if modalita == "approssimata":
+        return [{"kernel__gamma": p["gamma"], "svm__C": p["C"]} for p in griglia]
+    return griglia
+
+def svm_finale(modalita, parametri):
+    # L'approssimata non ha predict_proba: calibrazione sigmoide una sola volta, sul modello finale
+    from sklearn.base import clone
+    from sklearn.calibration import CalibratedClassifierCV
+    svm = clone(crea_svm(modalita)).set_params(**parametri)
+    if modalita == "approssimata":
+        return CalibratedClassifierCV(svm, method="sigmoid", cv=3, ensemble=False)
+    return svm
+
+def campione_griglia(y, modalita):
+    # Indici delle righe per la grid search: tutte (esatta) o un campione stratificato (approssimata)
+    from sklearn.utils import resample
+    indici = np.arange(len(y))
+    if modalita != "approssimata" or len(y) <= CAMPIONE_GRIGLIA_SVM:
+        return indici
+    return np.sort(resample(indici, replace=False, n_samples=CAMPIONE_GRIGLIA_SVM, stratify=y, random_state=42))
+
+def _righe(dati, indici):
+    return dati.iloc[indici] if hasattr(dati, "iloc") else dati[indici]
+
+def _addestra(model, X, y, parametri=None):
+    from sklearn.base import clone
+    model = clone(model).set_params(**(parametri or {}))
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        return model.fit(X, y)
+
+def _punteggio_fold(model, X, y, train, test, parametri=None):
+    from sklearn.metrics import get_scorer
+    model = _addestra(model, _righe(X, train), _righe(y, train), parametri)
     with warnings.catch_warnings():
         warnings.simplefilter("ignore")
-        scores = cross_val_score(model, X, y, cv=skf, scoring='f1')
-    return scores
+        return get_scorer('f1')(model, _righe(X, test), _righe(y, test))
+
+def _cronometrato(funzione, *args):
+    # Eseguita nei processi di joblib: il tempo torna al padre insieme al risultato
+    inizio = time.perf_counter()
+    risultato = funzione(*args)
+    return risultato, time.perf_counter() - inizio
+
+def addestra_in_parallelo(dati, n_jobs=N_JOBS, svm_modalita=SVM_MODALITA, modelli_base=None):
+    # dati: label -> (X, y, X_scaled). Prima fase: tutti i fold di tutti i modelli e dei
+    # candidati SVM, per tutti i dataset, in un unico pool; seconda fase: modelli finali.
+    from sklearn.model_selection import StratifiedKFold
+    modelli_base = crea_modelli() if modelli_base is None else modelli_base
+    modalita = {label: modalita_svm(svm_modalita, len(y)) for label, (_, y, _) in dati.items()}
+    compiti, chiavi = [], []
+    for label, (X, y, X_scaled) in dati.items():
+        svm, griglia = crea_svm(modalita[label]), griglia_svm(modalita[label])
+        campione = campione_griglia(y, modalita[label])
+        X_griglia, y_griglia = _righe(X_scaled, campione), _righe(y, campione)
+        # Stessi fold di cross_val_score (shuffle) e di GridSearchCV(cv=5) (senza shuffle)
+        skf = StratifiedKFold(n_splits=CV_FOLDS, shuffle=True, random_state=42)
+        for nome_modello, modello in modelli_base.items():
+            for train, test in skf.split(X, y):
+                compiti.append(delayed(_cronometrato)(_punteggio_fold, modello, X, y, train, test))
+                chiavi.append((label, nome_modello, None))
+        for i, parametri in enumerate(griglia):
+            for train, test in StratifiedKFold(n_splits=CV_FOLDS).split(X_griglia, y_griglia):
+                compiti.append(delayed(_cronometrato)(_punteggio_fold, svm, X_griglia, y_griglia, train, test, parametri))
+                chiavi.append((label, "SVM", i))
+
+    punteggi = {}
+    with cronometro("cv.totale"):
+        eseguiti = Parallel(n_jobs=n_jobs)(compiti)
+    for (label, nome_modello, candidato), (score, secondi) in zip(chiavi, eseguiti):
+        punteggi.setdefault((label, nome_modello, candidato), []).append(score)
+        registra_tempo(f"cv.fit.{nome_modello}", secondi)
+    conta("cv.fit", len(compiti))
 
-def salva_modello(model, base_dir, nome_modello, dataset_label):
-    os.makedirs(os.path.join(base_dir, "data"), exist_ok=True)
+    # Il miglior candidato SVM esatto riusa i punteggi per fold della griglia (nessuna seconda CV).
+    # L'approssimata salvata è il modello calibrato, non quello della griglia: la sua F1 viene
+    # da una CV propria su tutte le righe, con gli stessi fold degli altri modelli
+    risultati, finali, calibrate = {}, [], []
+    for label, (X, y, X_scaled) in dati.items():
+        griglia = griglia_svm(modalita[label])
+        risultati[label] = {}
+        for nome_modello, modello in modelli_base.items():
+            risultati[label][nome_modello] = np.array(punteggi[(label, nome_modello, None)])
+            finali.append(((label, nome_modello), delayed(_cronometrato)(_addestra, modello, X, y)))
+        medie = [np.nan_to_num(np.mean(punteggi[(label, "SVM", i)]), nan=-np.inf) for i in range(len(griglia))]
+        migliore = int(np.argmax(medie))
+        svm = svm_finale(modalita[label], griglia[migliore])
+        risultati[label]["SVM"] = np.array(punteggi[(label, "SVM", migliore)])
+        finali.append(((label, "SVM"), delayed(_cronometrato)(_addestra, svm, X_scaled, y)))
+        if modalita[label] == "approssimata":
+            skf = StratifiedKFold(n_splits=CV_FOLDS, shuffle=True, random_state=42)
+            for train, test in skf.split(X_scaled, y):
+                calibrate.append((label, delayed(_cronometrato)(_punteggio_fold, svm, X_scaled, y, train, test)))
+
+    modelli = {label: {} for label in dati}
+    with cronometro("addestramento.totale"):
+        eseguiti = Parallel(n_jobs=n_jobs)([compito for _, compito in finali] + [compito for _, compito in calibrate])
+    for ((label, nome_modello), _), (model, secondi) in zip(finali, eseguiti[:len(finali)]):
+        modelli[label][nome_modello] = model
+        registra_tempo(f"addestramento.{nome_modello}", secondi)
+    punteggi_calibrate = {}
+    for (label, _), (score, secondi) in zip(calibrate, eseguiti[len(finali):]):
+        punteggi_calibrate.setdefault(label, []).append(score)
+        registra_tempo("cv.fit.SVM", secondi)
+    conta("cv.fit", len(calibrate))
+    for label, punteggi_svm in punteggi_calibrate.items():
+        risultati[label]["SVM"] = np.array(punteggi_svm)
+    return risultati, modelli, modalita
+
+def salva_modello(model, base_dir, nome_modello, dataset_label, X, scaler=None):
+    # Artefatto completo: feature e dtype di X, scaler (solo per i modelli addestrati su dati scalati)
     percorso_specifico = os.path.join(base_dir, "data", f"{dataset_label}_{nome_modello}.joblib")
-    dump(model, percorso_specifico)
+    salva_artefatto(percorso_specifico, model, X.columns, X.dtypes, scaler)
     print(f"Modello salvato in: {os.path.relpath(percorso_specifico)}")
 
-def main():
+def esporta_foresta_compatta(model, base_dir, dataset_label, X):
+    # RandomForest appiattita in array NumPy (.npz), verificata sulle stesse righe di training
+    percorso = os.path.join(base_dir, "data", f"{dataset_label}_RandomForest_compatta.npz")
+    esporta_foresta(model, X.columns, percorso)
+    if np.array_equal(carica_foresta(percorso).predict_proba(X), model.predict_proba(X)):
+        print(f"Foresta compatta salvata in: {os.path.relpath(percorso)} (probabilità identiche)")
+    else:
+        print(f"ATTENZIONE: la foresta compatta '{os.path.relpath(percorso)}' non riproduce le probabilità del modello.")
+
+def main(argv=None, contesto=None):
+    parser = argparse.ArgumentParser(description="Addestramento e confronto dei modelli di predizione dell'occupazione.")
+    parser.add_argument("--n-jobs", type=int, default=N_JOBS, help=f"processi per l'addestramento (default {N_JOBS} = tutti i core)")
+    parser.add_argument("--svm", choices=["auto", "esatta", "approssimata"], default=SVM_MODALITA,
+                        help=f"SVM esatta (SVC) o approssimata (Nystroem + LinearSVC); auto = approssimata oltre {SOGLIA_SVM_APPROSSIMATA} righe")
+    parser.add_argument("--formato", choices=sorted(FORMATI), default=None,
+                        help="formato dei dataset da leggere (default quello scritto da genera_dataset.py)")
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+    from sklearn.preprocessing import StandardScaler
+
     base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
     dataset_files = {
-        "Base": os.path.join(base_dir, "data", "SmartHome_base.csv"),
-        "KB": os.path.join(base_dir, "data", "SmartHome_KB_enhanced.csv")
+        "Base": percorso_dataset(os.path.join(base_dir, "data"), "SmartHome_base", args.formato),
+        "KB": percorso_dataset(os.path.join(base_dir, "data"), "SmartHome_KB_enhanced", args.formato)
     }
 
     features_base = [
@@ -66,16 +235,25 @@ def main():
         'is_StanzaFredda', 'is_StanzaCalda', 'is_StanzaDispendiosa'
     ]
 
+    # Feature su finestre mobili dello storico delle letture (genera_dataset.py --serie-temporali),
+    # usate da entrambi i modelli solo se presenti nel dataset
+    features_temporali = [
+        'temperatura_media_1h', 'temperatura_media_3h', 'illuminazione_media_1h', 'illuminazione_media_3h',
+        'occupazione_quota_1h', 'occupazione_quota_3h', 'minuti_da_occupazione', 'durata_freddo_min'
+    ]
+
     target = 'occupazione'
-    risultati_comparativi = {}
+    dati = {}
+    scalers = {}
 
     for label, file in dataset_files.items():
-        df = carica_dataset(file)
+        # Feature da usare
+        features = features_base + (features_kb_extra if label=="KB" else [])
+        df = carica_dataset(file, features + features_temporali + [target], contesto)
         if df is None:
             continue
+        features = features + [f for f in features_temporali if f in df.columns]
 
-        # Feature da usare
-        features = features_base + (features_kb_extra if label=="KB" else [])
         X, y = prepara_dati(df, features, target)
         if len(np.unique(y)) < 2:
             print(f"ERRORE: il target 'occupazione' nel dataset '{label}' ha una sola classe.")
@@ -84,38 +262,36 @@ def main():
         # SCALING per SVM
         scaler = StandardScaler()
         X_scaled = scaler.fit_transform(X)
+        dati[label] = (X, y, X_scaled)
+        scalers[label] = scaler
 
-        print(f"Valutazione modelli sul dataset '{label}':")
-        risultati_dataset = {}
+    # Dataset x modelli x fold in parallelo
+    modelli_base = crea_modelli()
+    risultati_cv, modelli, modalita = addestra_in_parallelo(dati, args.n_jobs, args.svm, modelli_base)
 
-        # RandomForest e LogisticRegression
-        for nome_modello, modello in MODELLI.items():
-            scores = valuta_modello_cv(modello, X, y)
+    risultati_comparativi = {}
+    for label in dati:
+        print(f"\nValutazione modelli sul dataset '{label}':")
+        risultati_dataset = {}
+        for nome_modello, scores in risultati_cv[label].items():
             f1_mean = scores.mean()
             f1_std = scores.std()
-            modello.fit(X, y)
-            salva_modello(modello, base_dir, nome_modello, dataset_label=label)
+            X = dati[label][0]
+            scaler = scalers[label] if nome_modello == "SVM" else None
+            salva_modello(modelli[label][nome_modello], base_dir, nome_modello, label, X, scaler)
+            if nome_modello == "RandomForest":
+                esporta_foresta_compatta(modelli[label][nome_modello], base_dir, label, X)
             risultati_dataset[nome_modello] = (f1_mean, f1_std)
-            print(f"▶ {nome_modello}: F1 = {f1_mean:.4f} ± {f1_std:.4f}")
-
-        # SVM con GridSearch
-        svm = SVC(probability=True, kernel='rbf', random_state=42)
-        grid = GridSearchCV(svm, SVM_PARAMS, scoring='f1', cv=5)
-        grid.fit(X_scaled, y)
-        best_svm = grid.best_estimator_
-        scores = cross_val_score(best_svm, X_scaled, y, cv=5, scoring='f1')
-        f1_mean = scores.mean()
-        f1_std = scores.std()
-        salva_modello(best_svm, base_dir, "SVM", dataset_label=label)
-        risultati_dataset["SVM"] = (f1_mean, f1_std)
-        print(f"▶ SVM (GridSearch): F1 = {f1_mean:.4f} ± {f1_std:.4f}")
-
+            nome = nome_modello
+            if nome_modello == "SVM":
+                nome = "SVM (GridSearch)" if modalita[label] == "esatta" else "SVM approssimata (Nystroem, GridSearch su campione, calibrata)"
+            print(f"▶ {nome}: F1 = {f1_mean:.4f} ± {f1_std:.4f}")
         risultati_comparativi[label] = risultati_dataset
 
     # Tabella finale
     print("\n=== Tabella comparativa modelli ===")
     rows = []
-    for modello in list(MODELLI.keys()) + ["SVM"]:
+    for modello in list(modelli_base) + ["SVM"]:
         f1_base_mean, f1_base_std = risultati_comparativi.get("Base", {}).get(modello, (np.nan, np.nan))
         f1_kb_mean, f1_kb_std = risultati_comparativi.get("KB", {}).get(modello, (np.nan, np.nan))
         differenza = f1_kb_mean - f1_base_mean if not np.isnan(f1_base_mean) and not np.isnan(f1_kb_mean) else np.nan
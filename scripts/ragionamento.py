@@ -0,0 +1,133 @@
+import os
+import json
+import hashlib
+from metriche import conta, cronometro
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+CACHE_DIR = os.path.join(BASE_DIR, "ontology", "cache_reasoner")
+
+# Reasoner Java di owlready2, importato solo quando serve (vedi reasoner_owl)
+REASONER = {
+    "hermit": "sync_reasoner",
+    "pellet": "sync_reasoner_pellet",
+}
+
+# Reasoner di tutti i passi della pipeline: chi salva una KB ragionata (genera_istanze) e chi
+# la rilegge (genera_dataset, applica_regole, analisi_KBS) deve usare la stessa voce di cache
+REASONER_PIPELINE = "pellet"
+
+# "owl": HermiT/Pellet via Java; "nativo": materializzazione in Python delle sole classi derivate
+MOTORE = "owl"
+
+def reasoner_owl(nome):
+    import owlready2
+    return getattr(owlready2, REASONER[nome])
+
+def reasoner_effettivo(reasoner):
+    # Con MOTORE = "nativo" ogni richiesta usa la materializzazione in Python
+    return "nativo" if MOTORE == "nativo" else reasoner
+
+def hash_ontologia(percorso, infer_property_values=True, reasoner=REASONER_PIPELINE):
+    # Chiave della cache: contenuto del file + parametri che cambiano le inferenze (HermiT e
+    # Pellet non condividono le voci)
+    h = hashlib.sha256()
+    with open(percorso, "rb") as f:
+        for blocco in iter(lambda: f.read(1 << 20), b""):
+            h.update(blocco)
+    h.update(f"|infer_property_values={int(infer_property_values)}|reasoner={reasoner}".encode())
+    return h.hexdigest()
+
+def _percorso_cache(chiave):
+    return os.path.join(CACHE_DIR, f"{chiave}.json")
+
+def leggi_cache(chiave):
+    percorso = _percorso_cache(chiave)
+    if not os.path.exists(percorso):
+        return None
+    try:
+        with open(percorso, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"ATTENZIONE: cache del reasoner illeggibile, verrà ricalcolata: {e}")
+        return None
+
+def scrivi_cache(chiave, inferenze):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    percorso = _percorso_cache(chiave)
+    # Scrittura atomica: un'esecuzione interrotta non lascia file a metà
+    with open(percorso + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(inferenze, f)
+    os.replace(percorso + ".tmp", percorso)
+
+def registra_in_cache(percorso, inferenze, infer_property_values=True):
+    # Usata da chi salva una KB già ragionata, così i passi successivi trovano la cache pronta
+    scrivi_cache(hash_ontologia(percorso, infer_property_values, inferenze["reasoner"]), inferenze)
+
+def _triple_nominate(world):
+    # Triple oggetto tra risorse con IRI (i blank node hanno storid negativo)
+    return {(s, p, o) for s, p, o in world._get_obj_triples_spo_spo(None, None, None) if s > 0 and o > 0}
+
+def applica_inferenze(onto, inferenze):
+    from owlready2 import Thing, ThingClass, LOADING, rdf_type, rdfs_subclassof
+    world = onto.world
+    nuove = []
+    for s, p, o in inferenze["triple"]:
+        tripla = (world._abbreviate(s), world._abbreviate(p), world._abbreviate(o))
+        if not world._has_obj_triple_spo(*tripla):
+            onto._add_obj_triple_spo(*tripla)
+            nuove.append(tripla)
+
+    # Allinea le entità già caricate in Python, come fa owlready2 dopo il reasoning
+    with LOADING:
+        for s, p, o in nuove:
+            entita = world._entities.get(s)
+            if entita is None:
+                continue
+            if (p == rdf_type and isinstance(entita, Thing)) or (p == rdfs_subclassof and isinstance(entita, ThingClass)):
+                genitore = world._get_by_storid(o)
+                if genitore is not None and genitore not in entita.is_a:
+                    entita.is_a.reinit(list(entita.is_a) + [genitore])
+            else:
+                proprieta = world._get_by_storid(p)
+                nome = getattr(proprieta, "_python_name", None)
+                if nome and nome in entita.__dict__:
+                    delattr(entita, nome)
+    return len(nuove)
+
+def esegui_reasoner(onto, percorso=None, reasoner=REASONER_PIPELINE, infer_property_values=True):
+    # Con 'percorso' (file da cui è stata caricata la KB) le inferenze sono riusate dalla cache
+    reasoner = reasoner_effettivo(reasoner)
+    chiave = hash_ontologia(percorso, infer_property_values, reasoner) if percorso else None
+    if chiave:
+        inferenze = leggi_cache(chiave)
+        if inferenze is not None:
+            with cronometro("reasoner.cache"):
+                applica_inferenze(onto, inferenze)
+            conta("reasoner.cache_riusate")
+            print(f"Inferenze riutilizzate dalla cache del reasoner ({len(inferenze['triple'])} triple).")
+            return inferenze
+
+    if reasoner == "nativo":
+        from materializzazione import materializza
+        with cronometro("reasoner.nativo"):
+            inferenze = materializza(onto)
+            applica_inferenze(onto, inferenze)
+        conta("reasoner.triple_inferite", len(inferenze["triple"]))
+        if chiave:
+            scrivi_cache(chiave, inferenze)
+        return inferenze
+
+    world = onto.world
+    prima = _triple_nominate(world)
+    with onto, cronometro(f"reasoner.{reasoner}"):
+        reasoner_owl(reasoner)(world, infer_property_values=infer_property_values, debug=0)
+    nuove = _triple_nominate(world) - prima
+
+    inferenze = {
+        "reasoner": reasoner,
+        "triple": sorted((world._unabbreviate(s), world._unabbreviate(p), world._unabbreviate(o)) for s, p, o in nuove),
+    }
+    conta("reasoner.triple_inferite", len(inferenze["triple"]))
+    if chiave:
+        scrivi_cache(chiave, inferenze)
+    return inferenze
@@ -1,111 +1,289 @@
-# REGOLA LUCE 
-def regola_luce(illuminazione, occupazione, orario):
-    if not occupazione:
-        if illuminazione >= 300:
-            return "Spegni luce"
-        return "Nessuna azione"
-    
-    # Stanza occupata
-    if illuminazione < 100:
-        return "Accendi luce"
-    elif illuminazione > 800:
-        return "Spegni luce"
+import bisect
+import operator
+import numpy as np
+from metriche import misurato
 
-    # Regola temporale: di notte, luce accesa se sotto 200 lux
-    if orario == "Notte" and illuminazione < 200:
-        return "Accendi luce"
+NESSUNA_AZIONE = "Nessuna azione"
+ORE_NOTTE = (22, 6)  # Dalle 22 alle 6 l'orario delle regole è "Notte"
 
-    return "Nessuna azione"
+# DEFINIZIONE DICHIARATIVA DELLE REGOLE
+# Ogni regola è una lista ordinata di casi (condizioni, azioni): si applica il primo
+# caso con tutte le condizioni vere. Una condizione è una tupla (variabile, operatore, valore).
+REGOLE = {
+    "luce": [
+        ((("occupazione", "==", False), ("illuminazione", ">=", 300)), ("Spegni luce",)),
+        ((("occupazione", "==", False),), ()),
+        # Stanza occupata
+        ((("illuminazione", "<", 100),), ("Accendi luce",)),
+        ((("illuminazione", ">", 800),), ("Spegni luce",)),
+        # Regola temporale: di notte, luce accesa se sotto 200 lux
+        ((("orario", "==", "Notte"), ("illuminazione", "<", 200)), ("Accendi luce",)),
+    ],
+    "riscaldamento": [
+        ((("occupazione", "==", False), ("temperatura", ">=", 25)), ("Spegni riscaldamento",)),
+        ((("occupazione", "==", False),), ()),
+        # Stanza occupata
+        ((("temperatura", "<", 19),), ("Accendi riscaldamento",)),
+        ((("temperatura", ">=", 28),), ("Spegni riscaldamento",)),
+        # Regola temporale: di sera/notte accendi se < 21 °C
+        ((("orario", "==", "Notte"), ("temperatura", "<", 21)), ("Accendi riscaldamento",)),
+    ],
+    "tapparelle": [
+        ((("occupazione", "==", False), ("illuminazione", ">=", 800)), ("Abbassa tapparelle",)),
+        ((("occupazione", "==", False),), ()),
+        # Stanza occupata
+        ((("illuminazione", ">", 800),), ("Abbassa tapparelle",)),
+        ((("illuminazione", "<", 200),), ("Alza tapparelle",)),
+        # Regola temporale: di notte abbassare sempre
+        ((("orario", "==", "Notte"),), ("Abbassa tapparelle",)),
+    ],
+    "climatizzatore": [
+        ((("occupazione", "==", False), ("temperatura", "<=", 21)), ("Spegni climatizzatore",)),
+        ((("occupazione", "==", False),), ()),
+        # Stanza occupata
+        ((("temperatura", ">", 28),), ("Accendi climatizzatore",)),
+        ((("temperatura", ">=", 21), ("temperatura", "<=", 28)), ("Spegni climatizzatore",)),
+        # Regola combinata: se notte e temperatura > 26, spegnere per risparmio
+        ((("orario", "==", "Notte"), ("temperatura", ">", 26)), ("Spegni climatizzatore",)),
+    ],
+    "combinata": [
+        # Caso: stanza occupata, buia e fredda
+        ((("occupazione", "==", True), ("illuminazione", "<", 100), ("temperatura", "<", 18)),
+         ("Accendi luce", "Accendi riscaldamento")),
+        # Caso: stanza molto calda e molto luminosa → raffrescare e abbassare tapparelle
+        ((("occupazione", "==", True), ("temperatura", ">", 29), ("illuminazione", ">", 700)),
+         ("Accendi climatizzatore", "Abbassa tapparelle")),
+        # Caso: notte, stanza occupata ma luminosa → abbassare tapparelle + spegnere luce
+        ((("orario", "==", "Notte"), ("occupazione", "==", True), ("illuminazione", ">", 500)),
+         ("Abbassa tapparelle", "Spegni luce")),
+    ],
+}
 
+# Codici azione: 0 = "Nessuna azione", i = AZIONI[i - 1]
+AZIONI = [
+    "Accendi luce", "Spegni luce",
+    "Accendi riscaldamento", "Spegni riscaldamento",
+    "Accendi climatizzatore", "Spegni climatizzatore",
+    "Alza tapparelle", "Abbassa tapparelle",
+]
+CODICE_AZIONE = {az: i + 1 for i, az in enumerate(AZIONI)}
 
-# REGOLA RISCALDAMENTO
-def regola_riscaldamento(temperatura, occupazione, orario):
-    if not occupazione:
-        if temperatura >= 25:
-            return "Spegni riscaldamento"
-        return "Nessuna azione"
-    
-    # Stanza occupata
-    if temperatura < 19:
-        return "Accendi riscaldamento"
-    elif temperatura >= 28:
-        return "Spegni riscaldamento"
+# REGISTRO DELLE AZIONI
+# Nome normalizzato ("Accendi luce", "AccendiLuce" -> "accendiluce") -> (nome, classe OWL, tipo di
+# dispositivo). L'insieme di classi è fisso: un'azione non registrata è un'istanza di Azione.
+CLASSE_GENERICA = "Azione"
 
-    # Regola temporale: di sera/notte accendi se < 21 °C
-    if orario == "Notte" and temperatura < 21:
-        return "Accendi riscaldamento"
+def normalizza_azione(nome):
+    return "".join(nome.replace("_", " ").split()).lower()
 
-    return "Nessuna azione"
+REGISTRO_AZIONI = {
+    normalizza_azione(az): (az, classe, tipo)
+    for az, classe, tipo in [
+        ("Accendi luce", "AccendiLuce", "Luce"),
+        ("Spegni luce", "SpegniLuce", "Luce"),
+        ("Accendi riscaldamento", "AccendiRiscaldamento", "Riscaldamento"),
+        ("Spegni riscaldamento", "SpegniRiscaldamento", "Riscaldamento"),
+        ("Accendi climatizzatore", "AccendiClimatizzatore", "Climatizzatore"),
+        ("Spegni climatizzatore", "SpegniClimatizzatore", "Climatizzatore"),
+        ("Alza tapparelle", "AlzaTapparelle", "Tapparella"),
+        ("Abbassa tapparelle", "AbbassaTapparelle", "Tapparella"),
+    ]
+}
 
+def voce_azione(nome):
+    # (nome canonico, classe, tipo di dispositivo); per le azioni non registrate (nome, "Azione", None)
+    return REGISTRO_AZIONI.get(normalizza_azione(nome), (nome, CLASSE_GENERICA, None))
 
-# REGOLA TAPPARELLE
-def regola_tapparelle(illuminazione, occupazione, orario):
-    if not occupazione:
-        if illuminazione >= 800:
-            return "Abbassa tapparelle"
-        return "Nessuna azione"
-    
-    # Stanza occupata
-    if illuminazione > 800:
-        return "Abbassa tapparelle"
-    elif illuminazione < 200:
-        return "Alza tapparelle"
+OPERATORI = {
+    "<": operator.lt, "<=": operator.le,
+    ">": operator.gt, ">=": operator.ge,
+    "==": operator.eq,
+}
 
-    # Regola temporale: di notte abbassare sempre
-    if orario == "Notte":
-        return "Abbassa tapparelle"
+VARIABILI_NUMERICHE = ("illuminazione", "temperatura")
 
-    return "Nessuna azione"
 
+# INTERPRETE DELLE REGOLE
+def valuta_regola(nome, illuminazione, temperatura, occupazione, orario, regole=REGOLE):
+    valori = {
+        "illuminazione": illuminazione,
+        "temperatura": temperatura,
+        "occupazione": bool(occupazione),
+        "orario": orario,
+    }
+    for condizioni, azioni in regole[nome]:
+        if all(OPERATORI[op](valori[var], soglia) for var, op, soglia in condizioni):
+            return azioni
+    return ()
 
-# REGOLA CLIMATIZZATORE 
-def regola_climatizzatore(temperatura, occupazione, orario):
-    if not occupazione:
-        if temperatura <= 21:
-            return "Spegni climatizzatore"
-        return "Nessuna azione"
-    
-    # Stanza occupata
-    if temperatura > 28:
-        return "Accendi climatizzatore"
-    elif 21 <= temperatura <= 28:
-        return "Spegni climatizzatore"
 
-    # Regola combinata: se notte e temperatura > 26, spegnere per risparmio
-    if orario == "Notte" and temperatura > 26:
-        return "Spegni climatizzatore"
+def regola_luce(illuminazione, occupazione, orario):
+    azioni = valuta_regola("luce", illuminazione, None, occupazione, orario)
+    return azioni[0] if azioni else NESSUNA_AZIONE
+
 
-    return "Nessuna azione"
+def regola_riscaldamento(temperatura, occupazione, orario):
+    azioni = valuta_regola("riscaldamento", None, temperatura, occupazione, orario)
+    return azioni[0] if azioni else NESSUNA_AZIONE
+
+
+def regola_tapparelle(illuminazione, occupazione, orario):
+    azioni = valuta_regola("tapparelle", illuminazione, None, occupazione, orario)
+    return azioni[0] if azioni else NESSUNA_AZIONE
+
+
+def regola_climatizzatore(temperatura, occupazione, orario):
+    azioni = valuta_regola("climatizzatore", None, temperatura, occupazione, orario)
+    return azioni[0] if azioni else NESSUNA_AZIONE
 
 
-# REGOLE COMBINATE
 def regola_combinata(temperatura, illuminazione, occupazione, orario):
-    # Caso: stanza occupata, buia e fredda
-    if occupazione and illuminazione < 100 and temperatura < 18:
-        return ["Accendi luce", "Accendi riscaldamento"]
+    return list(valuta_regola("combinata", illuminazione, temperatura, occupazione, orario))
+
+
+# COMPILAZIONE IN TABELLA DECISIONALE
+# Ogni variabile numerica è divisa in bucket dalle soglie usate nelle regole:
+# bucket 2i = intervallo aperto sotto la soglia i, bucket 2i+1 = soglia i esatta,
+# bucket 2k = sopra l'ultima soglia, bucket 2k+1 = NaN.
+def _rappresentante(soglie, bucket):
+    k = len(soglie)
+    if bucket == 2 * k + 1:
+        return float("nan")
+    i, punto = divmod(bucket, 2)
+    if punto:
+        return soglie[i]
+    if k == 0:
+        return 0.0
+    if i == 0:
+        return soglie[0] - 1.0
+    if i == k:
+        return soglie[-1] + 1.0
+    return (soglie[i - 1] + soglie[i]) / 2
+
 
-    # Caso: stanza molto calda e molto luminosa → raffrescare e abbassare tapparelle
-    if occupazione and temperatura > 29 and illuminazione > 700:
-        return ["Accendi climatizzatore", "Abbassa tapparelle"]
+def _bucket(soglie, x):
+    if x != x:  # NaN
+        return 2 * len(soglie) + 1
+    i = bisect.bisect_left(soglie, x)
+    return 2 * i + int(i < len(soglie) and soglie[i] == x)
 
-    # Caso: notte, stanza occupata ma luminosa → abbassare tapparelle + spegnere luce
-    if orario == "Notte" and occupazione and illuminazione > 500:
-        return ["Abbassa tapparelle", "Spegni luce"]
 
-    return []
+def _bucket_batch(soglie, x):
+    k = len(soglie)
+    if k == 0:
+        return np.where(np.isnan(x), 1, 0)
+    i = np.searchsorted(soglie, x, side="left")
+    punto = (i < k) & (soglie[np.minimum(i, k - 1)] == x)
+    return np.where(np.isnan(x), 2 * k + 1, 2 * i + punto)
 
 
-# FUNZIONE DI AGGREGAZIONE 
+class TabellaDecisionale:
+    def __init__(self, regole):
+        condizioni = [c for casi in regole.values() for cond, _ in casi for c in cond]
+        self.soglie = {
+            var: sorted({float(v) for nome, _, v in condizioni if nome == var})
+            for var in VARIABILI_NUMERICHE
+        }
+        self._soglie_np = {var: np.array(s) for var, s in self.soglie.items()}
+        # Categorie di orario citate dalle regole; indice 0 = qualsiasi altro valore
+        self.categorie_orario = sorted({v for nome, _, v in condizioni if nome == "orario"})
+
+        # Uno slot per ogni azione che una regola può produrre
+        self.slot = [(nome, max(len(az) for _, az in casi)) for nome, casi in regole.items()]
+        self.num_slot = sum(n for _, n in self.slot)
+
+        forma = (
+            2,
+            len(self.categorie_orario) + 1,
+            2 * len(self.soglie["illuminazione"]) + 2,
+            2 * len(self.soglie["temperatura"]) + 2,
+        )
+        self.indice = np.zeros(forma, dtype=np.int16)
+        combinazioni = {}
+        for occ, ora, b_il, b_temp in np.ndindex(forma):
+            orario = self.categorie_orario[ora - 1] if ora else None
+            il = _rappresentante(self.soglie["illuminazione"], b_il)
+            temp = _rappresentante(self.soglie["temperatura"], b_temp)
+            codici = []
+            for nome, n in self.slot:
+                azioni = valuta_regola(nome, il, temp, occ, orario, regole)
+                for az in azioni:
+                    if az not in CODICE_AZIONE:
+                        raise ValueError(f"Azione sconosciuta nella regola '{nome}': {az}")
+                codici.extend(CODICE_AZIONE[az] for az in azioni)
+                codici.extend([0] * (n - len(azioni)))
+            self.indice[occ, ora, b_il, b_temp] = combinazioni.setdefault(tuple(codici), len(combinazioni))
+        # Copia come liste annidate: nel percorso scalare evita l'overhead dell'indicizzazione NumPy
+        self._indice_liste = self.indice.tolist()
+
+        # Per ogni combinazione: codici per slot, lista di azioni e bitmask precalcolati
+        self.matrice = np.array(list(combinazioni), dtype=np.int8).reshape(len(combinazioni), self.num_slot)
+        self.azioni = [[AZIONI[c - 1] for c in codici if c] for codici in combinazioni]
+        self.maschere = np.array(
+            [sum(1 << (c - 1) for c in set(codici) if c) for codici in combinazioni], dtype=np.uint16
+        )
+
+    def _indice_orario(self, orario):
+        for i, categoria in enumerate(self.categorie_orario):
+            if orario == categoria:
+                return i + 1
+        return 0
+
+    def combinazione(self, illuminazione, temperatura, occupazione, orario):
+        return self._indice_liste[int(bool(occupazione))][self._indice_orario(orario)][
+            _bucket(self.soglie["illuminazione"], illuminazione)
+        ][_bucket(self.soglie["temperatura"], temperatura)]
+
+    def combinazioni_batch(self, illuminazione, temperatura, occupazione, orario):
+        il, temp, occ, ora = np.broadcast_arrays(
+            np.asarray(illuminazione, dtype=float),
+            np.asarray(temperatura, dtype=float),
+            np.asarray(occupazione, dtype=object),
+            np.asarray(orario, dtype=object),
+        )
+        ora = ora.ravel()
+        indice_orario = np.zeros(ora.size, dtype=np.intp)
+        for i, categoria in enumerate(self.categorie_orario):
+            indice_orario[np.asarray(ora == categoria, dtype=bool)] = i + 1
+        return self.indice[
+            occ.ravel().astype(bool).astype(np.intp),
+            indice_orario,
+            _bucket_batch(self._soglie_np["illuminazione"], il.ravel()),
+            _bucket_batch(self._soglie_np["temperatura"], temp.ravel()),
+        ]
+
+
+TABELLA = TabellaDecisionale(REGOLE)
+
+
+# FUNZIONE DI AGGREGAZIONE
+@misurato("regole.azioni_da_regole")
 def azioni_da_regole(illuminazione, temperatura, occupazione, orario="Giorno"):
-    azioni = [
-        regola_luce(illuminazione, occupazione, orario),
-        regola_riscaldamento(temperatura, occupazione, orario),
-        regola_tapparelle(illuminazione, occupazione, orario),
-        regola_climatizzatore(temperatura, occupazione, orario),
-    ]
+    return list(TABELLA.azioni[TABELLA.combinazione(illuminazione, temperatura, occupazione, orario)])
+
+
+# VALUTAZIONE VETTORIALE (BATCH)
+@misurato("regole.azioni_da_regole_batch")
+def azioni_da_regole_batch(illuminazione, temperatura, occupazione, orario="Giorno"):
+    # Matrice (righe x slot) di codici azione, servita dalla stessa tabella compilata
+    return TABELLA.matrice[TABELLA.combinazioni_batch(illuminazione, temperatura, occupazione, orario)]
+
+
+def maschera_azioni(matrice):
+    # Bit (codice - 1) attivo se l'azione compare almeno una volta nella riga
+    bit = np.where(matrice > 0, np.left_shift(1, np.maximum(matrice.astype(np.int16) - 1, 0)), 0)
+    return np.bitwise_or.reduce(bit, axis=1).astype(np.uint16)
+
+
+def decodifica_azioni(matrice):
+    # Ricostruisce le liste di azioni, nello stesso ordine di azioni_da_regole
+    return [[AZIONI[codice - 1] for codice in riga if codice] for riga in matrice.tolist()]
 
-    # Regole combinate
-    azioni.extend(regola_combinata(temperatura, illuminazione, occupazione, orario))
 
-    # Filtra azioni "Nessuna azione"
-    return [a for a in azioni if a != "Nessuna azione"]
+def codifica_azioni(liste_azioni, num_slot=None):
+    # Inverso di decodifica_azioni: liste di azioni -> matrice (righe x slot) di codici
+    num_slot = num_slot or max((len(azioni) for azioni in liste_azioni), default=0)
+    matrice = np.zeros((len(liste_azioni), num_slot), dtype=np.int8)
+    for i, azioni in enumerate(liste_azioni):
+        matrice[i, :len(azioni)] = [CODICE_AZIONE[az] for az in azioni]
+    return matrice
@@ -0,0 +1,187 @@
+import os
+import numpy as np
+from regole import ORE_NOTTE
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+STORICO = os.path.join(BASE_DIR, "data", "storico_stanze.npz")
+
+# Storico delle letture per stanza: array (stanze x campioni) in un solo .npz, non individui
+# OWL. L'ultima lettura di ogni stanza è lo StatoAmbientale registrato nella KB.
+PASSO_MIN = 10              # Minuti tra due letture
+CAMPIONI = 144              # Letture per stanza (24 ore)
+FINESTRE_MIN = (60, 180)    # Finestre delle feature mobili, in minuti
+SOGLIA_FREDDO = 20.0        # Come StanzaFredda (haTemperatura < 20)
+
+# Andamento delle letture precedenti
+TEMPERATURA_BASE = 21.0     # Livelli a cui tendono le serie lontano dallo stato corrente
+UMIDITA_BASE = 45.0
+AMPIEZZA_TEMPERATURA = 2.0  # Escursione giornaliera (°C), massimo alle 15
+PERSISTENZA = 0.9           # Autocorrelazione del rumore tra due letture
+RIENTRO = 0.97              # Attenuazione per lettura dello scarto dallo stato corrente
+RUMORE_TEMPERATURA = 0.4
+RUMORE_UMIDITA = 1.0
+LUCE_NATURALE = 600.0       # Illuminazione massima a mezzogiorno (lux)
+LUCE_ARTIFICIALE = 300.0    # Con la stanza occupata al buio
+RUMORE_LUCE = 20.0
+PROB_ENTRATA = 0.05         # Stanza libera -> occupata, tra due letture
+PROB_ENTRATA_PUNTA = 0.2    # ... la mattina e la sera
+ORE_PUNTA = ((7, 9), (18, 23))
+PROB_PERMANENZA = 0.85      # Stanza occupata -> ancora occupata
+
+class StoricoStanze:
+    # La riga i è la stanza stanze[i]; minuto_fine è il minuto del giorno dell'ultima lettura
+    CAMPI = ("temperatura", "illuminazione", "umidita", "occupazione")
+
+    def __init__(self, stanze, minuto_fine, temperatura, illuminazione, umidita, occupazione, passo_min=PASSO_MIN):
+        self.stanze = np.asarray(stanze, dtype=str)
+        self.minuto_fine = np.asarray(minuto_fine, dtype=np.int16)
+        self.temperatura = np.asarray(temperatura, dtype=np.float32)
+        self.illuminazione = np.asarray(illuminazione, dtype=np.float32)
+        self.umidita = np.asarray(umidita, dtype=np.float32)
+        self.occupazione = np.asarray(occupazione, dtype=bool)
+        self.passo_min = int(passo_min)
+
+    @property
+    def campioni(self):
+        return self.temperatura.shape[1]
+
+    def minuti(self):
+        # Minuto del giorno di ogni lettura
+        indietro = (self.campioni - 1 - np.arange(self.campioni)) * self.passo_min
+        return (self.minuto_fine[:, None].astype(np.int64) - indietro) % 1440
+
+    def ore(self):
+        return self.minuti() // 60
+
+    def indice(self):
+        return {nome: i for i, nome in enumerate(self.stanze.tolist())}
+
+    def durate(self):
+        # haDurata: minuti da cui dura la condizione corrente (fredda o no) della stanza
+        return durata_condizione(self.temperatura < SOGLIA_FREDDO, self.passo_min)[:, -1]
+
+def salva_storico(storico, percorso=STORICO):
+    os.makedirs(os.path.dirname(os.path.abspath(percorso)), exist_ok=True)
+    campi = {campo: getattr(storico, campo) for campo in StoricoStanze.CAMPI}
+    np.savez(percorso, stanze=storico.stanze, minuto_fine=storico.minuto_fine, passo_min=storico.passo_min, **campi)
+    return percorso
+
+def carica_storico(percorso=STORICO):
+    with np.load(percorso) as array:
+        return StoricoStanze(array["stanze"], array["minuto_fine"],
+                             *(array[campo] for campo in StoricoStanze.CAMPI), passo_min=int(array["passo_min"]))
+
+def concatena(storici):
+    # Storici di blocchi di stanze diversi (es. gli shard della generazione massiva)
+    storici = [s for s in storici if s is not None]
+    if not storici:
+        return None
+    return StoricoStanze(
+        np.concatenate([s.stanze for s in storici]), np.concatenate([s.minuto_fine for s in storici]),
+        *(np.concatenate([getattr(s, campo) for s in storici]) for campo in StoricoStanze.CAMPI),
+        passo_min=storici[0].passo_min)
+
+def _ar1(rng, forma, sigma):
+    # Rumore autocorrelato: un passo per lettura, tutte le stanze insieme
+    rumore = rng.normal(0.0, sigma, forma)
+    for t in range(1, forma[1]):
+        rumore[:, t] += PERSISTENZA * rumore[:, t - 1]
+    return rumore
+
+def _ancora(serie, corrente, smorzamento=1.0):
+    # Trasla ogni serie perché l'ultima lettura coincida con il valore della KB; con
+    # smorzamento < 1 la correzione si attenua andando indietro nel tempo
+    peso = smorzamento ** np.arange(serie.shape[1] - 1, -1, -1)
+    return serie + (np.asarray(corrente, dtype=np.float64) - serie[:, -1])[:, None] * peso
+
+def genera_storico(stanze, orari, temperatura, illuminazione, umidita, occupazione, seed=None,
+                   campioni=CAMPIONI, passo_min=PASSO_MIN):
+    # Letture precedenti coerenti con lo stato corrente: ora dell'ultima lettura nella fascia
+    # dell'orario (Notte o giorno), serie che terminano sui valori e sull'occupazione della KB
+    rng = np.random.default_rng(seed)
+    n = len(stanze)
+    forma = (n, campioni)
+    notte = np.array([o == "Notte" for o in orari], dtype=bool)
+    ore_notte = (24 - ORE_NOTTE[0]) + ORE_NOTTE[1]
+    ora_fine = np.where(notte, ORE_NOTTE[0] + rng.integers(0, ore_notte, n),
+                        ORE_NOTTE[1] + rng.integers(0, ORE_NOTTE[0] - ORE_NOTTE[1], n)) % 24
+    minuto_fine = ora_fine * 60 + rng.integers(0, 60 // passo_min, n) * passo_min
+    storico = StoricoStanze(stanze, minuto_fine, np.zeros(forma), np.zeros(forma), np.zeros(forma),
+                            np.zeros(forma), passo_min)
+    ore = storico.minuti() / 60.0
+
+    # Temperatura e umidità: ciclo giornaliero e rumore attorno ai livelli base, che
+    # convergono verso i valori correnti nelle ultime ore
+    temperatura_serie = TEMPERATURA_BASE + AMPIEZZA_TEMPERATURA * np.cos(2 * np.pi * (ore - 15) / 24)
+    storico.temperatura = _ancora(temperatura_serie + _ar1(rng, forma, RUMORE_TEMPERATURA),
+                                  temperatura, RIENTRO).round(1).astype(np.float32)
+    storico.umidita = np.clip(_ancora(UMIDITA_BASE + _ar1(rng, forma, RUMORE_UMIDITA), umidita, RIENTRO),
+                              0, 100).round(1).astype(np.float32)
+
+    # Occupazione: catena di Markov a due stati (reversibile), generata a ritroso a partire
+    # dall'occupazione nella KB, così le ultime letture sono coerenti con lo stato corrente
+    punta = np.zeros(forma, dtype=bool)
+    for inizio, fine in ORE_PUNTA:
+        punta |= (ore >= inizio) & (ore < fine)
+    prob_entrata = np.where(punta, PROB_ENTRATA_PUNTA, PROB_ENTRATA)
+    casuali = rng.random(forma)
+    occupata = np.zeros(forma, dtype=bool)
+    occupata[:, -1] = np.asarray(occupazione, dtype=bool)
+    for t in range(campioni - 2, -1, -1):
+        occupata[:, t] = casuali[:, t] < np.where(occupata[:, t + 1], PROB_PERMANENZA, prob_entrata[:, t])
+    storico.occupazione = occupata
+
+    # Illuminazione: luce naturale di giorno, artificiale se la stanza è occupata al buio
+    naturale = LUCE_NATURALE * np.clip(np.sin(np.pi * (ore - ORE_NOTTE[1]) / (ORE_NOTTE[0] - ORE_NOTTE[1])), 0, None)
+    luce = naturale * rng.uniform(0.3, 1.0, (n, 1)) + np.where(occupata & (naturale < LUCE_ARTIFICIALE), LUCE_ARTIFICIALE, 0.0)
+    storico.illuminazione = np.clip(_ancora(luce + rng.normal(0.0, RUMORE_LUCE, forma), illuminazione, PERSISTENZA), 0, None).round(1).astype(np.float32)
+    return storico
+
+# Feature su finestre mobili: operazioni vettoriali su tutte le stanze e tutte le letture
+
+def media_mobile(valori, finestra):
+    # Media delle ultime 'finestra' letture (meno all'inizio della serie), da somme cumulate
+    somme = np.cumsum(valori, axis=1, dtype=np.float64)
+    finestre = somme.copy()
+    finestre[:, finestra:] -= somme[:, :-finestra]
+    return finestre / np.minimum(np.arange(1, valori.shape[1] + 1), finestra)
+
+def precedente(valori, iniziale=0):
+    # Valore alla lettura precedente: le feature sull'occupazione non vedono quella corrente
+    spostati = np.empty_like(valori)
+    spostati[:, 0] = iniziale
+    spostati[:, 1:] = valori[:, :-1]
+    return spostati
+
+def minuti_da_occupazione(occupazione, passo_min):
+    # Minuti dall'ultima lettura precedente con la stanza occupata (se nessuna, dall'inizio dello storico)
+    t = np.arange(occupazione.shape[1])
+    ultima = precedente(np.maximum.accumulate(np.where(occupazione, t, -1), axis=1), iniziale=-1)
+    return np.where(ultima >= 0, t - ultima, t + 1) * passo_min
+
+def durata_condizione(condizione, passo_min):
+    # Minuti dalla prima lettura del tratto consecutivo in cui la condizione ha il valore corrente
+    t = np.arange(condizione.shape[1])
+    cambio = np.ones(condizione.shape, dtype=bool)
+    cambio[:, 1:] = condizione[:, 1:] != condizione[:, :-1]
+    return (t - np.maximum.accumulate(np.where(cambio, t, 0), axis=1)) * passo_min
+
+def feature_finestre(storico):
+    # Nome -> array (stanze x campioni)
+    passo = storico.passo_min
+    occupazione_prec = precedente(storico.occupazione.astype(np.float64))
+    fredda = storico.temperatura < SOGLIA_FREDDO
+    feature = {}
+    for minuti in FINESTRE_MIN:
+        finestra = max(minuti // passo, 1)
+        etichetta = f"{minuti // 60}h" if minuti % 60 == 0 else f"{minuti}min"
+        feature[f"temperatura_media_{etichetta}"] = media_mobile(storico.temperatura, finestra)
+        feature[f"illuminazione_media_{etichetta}"] = media_mobile(storico.illuminazione, finestra)
+        feature[f"occupazione_quota_{etichetta}"] = media_mobile(occupazione_prec, finestra)
+    feature["minuti_da_occupazione"] = minuti_da_occupazione(storico.occupazione, passo)
+    feature["durata_freddo_min"] = np.where(fredda, durata_condizione(fredda, passo), 0)
+    return feature
+
+def feature_correnti(storico):
+    # Feature all'ultima lettura (lo stato nella KB), arrotondate come i valori del dataset
+    return {nome: np.round(valori[:, -1], 2) for nome, valori in feature_finestre(storico).items()}
@@ -0,0 +1,154 @@
+import os
+import time
+import queue
+import threading
+from collections import deque
+from concurrent.futures import Future
+import numpy as np
+from artefatto_modello import carica_artefatto
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+DATA_DIR = os.path.join(BASE_DIR, "data")
+
+MODELLI_SERVIBILI = ["RandomForest", "LogisticRegression", "SVM"]
+
+FINESTRA_BATCH_MS = 2.0  # Attesa massima per accorpare richieste in un micro-batch
+MAX_RIGHE_BATCH = 4096
+CAMPIONI_LATENZA = 100000  # Latenze conservate per i percentili
+
+# Artefatti già caricati: (label, nome) -> ArtefattoModello
+_CACHE_MODELLI = {}
+_LOCK_CACHE = threading.Lock()
+
+def carica_modello(label="KB", nome_modello="RandomForest"):
+    # Ogni artefatto è letto da disco (in memory-mapping) una sola volta per processo e resta caldo
+    if nome_modello not in MODELLI_SERVIBILI:
+        raise ValueError(f"modello '{nome_modello}' non servibile: usare uno tra {MODELLI_SERVIBILI}")
+    chiave = (label, nome_modello)
+    with _LOCK_CACHE:
+        if chiave not in _CACHE_MODELLI:
+            percorso = os.path.join(DATA_DIR, f"{label}_{nome_modello}.joblib")
+            if not os.path.exists(percorso):
+                raise FileNotFoundError(f"modello non trovato: '{os.path.relpath(percorso)}'")
+            _CACHE_MODELLI[chiave] = carica_artefatto(percorso)
+        return _CACHE_MODELLI[chiave]
+
+class Metriche:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latenze = deque(maxlen=CAMPIONI_LATENZA)
+        self.avvio = time.perf_counter()
+        self.richieste = 0
+        self.righe = 0
+        self.batch = 0
+
+    def registra_batch(self, latenze, righe):
+        with self._lock:
+            self._latenze.extend(latenze)
+            self.richieste += len(latenze)
+            self.righe += righe
+            self.batch += 1
+
+    def riepilogo(self):
+        with self._lock:
+            latenze = np.array(self._latenze)
+            durata = time.perf_counter() - self.avvio
+            richieste, righe, batch = self.richieste, self.righe, self.batch
+        p50, p99 = np.percentile(latenze, [50, 99]) * 1000 if len(latenze) else (np.nan, np.nan)
+        return {
+            "richieste": richieste,
+            "righe": righe,
+            "batch": batch,
+            "righe_per_batch": righe / batch if batch else 0.0,
+            "latenza_p50_ms": float(p50),
+            "latenza_p99_ms": float(p99),
+            "richieste_al_s": richieste / durata if durata else 0.0,
+            "righe_al_s": righe / durata if durata else 0.0,
+        }
+
+class ServizioPredizione:
+    # Le richieste (una lettura o un micro-batch) sono accodate e un thread le accorpa
+    # per FINESTRA_BATCH_MS in un'unica chiamata predict_proba
+    def __init__(self, label="KB", nome_modello="RandomForest", finestra_ms=FINESTRA_BATCH_MS, max_righe=MAX_RIGHE_BATCH):
+        self.artefatto = carica_modello(label, nome_modello)
+        self.features = self.artefatto.features
+        self.finestra = finestra_ms / 1000
+        self.max_righe = max_righe
+        self.metriche = Metriche()
+        self._coda = queue.Queue()
+        self._chiuso = False
+        self._lock = threading.Lock()  # Nessuna richiesta accodata dopo il segnale di chiusura
+        self._thread = threading.Thread(target=self._ciclo, name=f"predizione-{label}-{nome_modello}", daemon=True)
+        self._thread.start()
+
+    def predici_async(self, letture):
+        # Future con la probabilità di occupazione (float per una lettura, array per un batch)
+        futuro = Future()
+        try:
+            matrice = self.artefatto.matrice(letture)
+        except (KeyError, ValueError) as e:
+            futuro.set_exception(e)
+            return futuro
+        with self._lock:
+            if self._chiuso:
+                futuro.set_exception(RuntimeError("servizio di predizione chiuso"))
+                return futuro
+            self._coda.put((matrice, isinstance(letture, dict), futuro, time.perf_counter()))
+        return futuro
+
+    def predici(self, letture, timeout=None):
+        return self.predici_async(letture).result(timeout)
+
+    def _ciclo(self):
+        while True:
+            richiesta = self._coda.get()
+            if richiesta is None:
+                return
+            richieste, righe = [richiesta], len(richiesta[0])
+            # Le richieste già in coda entrano sempre nel batch; poi si attende fino alla
+            # scadenza della finestra, contata dall'arrivo della prima richiesta
+            scadenza = richiesta[3] + self.finestra
+            while righe < self.max_righe:
+                attesa = scadenza - time.perf_counter()
+                try:
+                    richiesta = self._coda.get(timeout=attesa) if attesa > 0 else self._coda.get_nowait()
+                except queue.Empty:
+                    break
+                if richiesta is None:
+                    self._coda.put(None)
+                    break
+                richieste.append(richiesta)
+                righe += len(richiesta[0])
+            self._esegui(richieste, righe)
+
+    def _esegui(self, richieste, righe):
+        matrice = np.concatenate([r[0] for r in richieste]) if len(richieste) > 1 else richieste[0][0]
+        try:
+            probabilita = self.artefatto.probabilita(matrice)
+        except Exception as e:
+            for _, _, futuro, _ in richieste:
+                futuro.set_exception(e)
+            return
+        fine = time.perf_counter()
+        inizio, latenze = 0, []
+        for matrice_richiesta, singola, futuro, arrivo in richieste:
+            parte = probabilita[inizio:inizio + len(matrice_richiesta)]
+            inizio += len(matrice_richiesta)
+            futuro.set_result(float(parte[0]) if singola else parte)
+            latenze.append(fine - arrivo)
+        self.metriche.registra_batch(latenze, righe)
+
+    def chiudi(self):
+        # Le richieste già accodate sono servite; le successive falliscono subito
+        with self._lock:
+            if self._chiuso:
+                return
+            self._chiuso = True
+            self._coda.put(None)
+        self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.chiudi()
@@ -0,0 +1,119 @@
+import time
+import numpy as np
+from regole import AZIONI
+
+# Effetto di ogni azione sul dispositivo della stanza: (dispositivo, stato richiesto)
+DISPOSITIVI = ["luce", "riscaldamento", "climatizzatore", "tapparelle"]
+EFFETTO_AZIONE = {
+    "Accendi luce": ("luce", 1), "Spegni luce": ("luce", 0),
+    "Accendi riscaldamento": ("riscaldamento", 1), "Spegni riscaldamento": ("riscaldamento", 0),
+    "Accendi climatizzatore": ("climatizzatore", 1), "Spegni climatizzatore": ("climatizzatore", 0),
+    "Alza tapparelle": ("tapparelle", 1), "Abbassa tapparelle": ("tapparelle", 0),
+}
+# Isteresi: dopo un cambio di stato, il comando opposto sullo stesso dispositivo
+# è trattenuto per questi secondi (e inviato alla scadenza, se ancora richiesto)
+ISTERESI_S = {"luce": 5.0, "riscaldamento": 300.0, "climatizzatore": 300.0, "tapparelle": 60.0}
+
+IGNOTO = -1
+NESSUNO = 2  # Nessuno stato richiesto; maggiore di ogni stato, vedi risolvi_conflitti
+
+# Tabelle per codice azione (0 = nessuna azione, i = AZIONI[i - 1])
+_DISPOSITIVO = np.array([0] + [DISPOSITIVI.index(EFFETTO_AZIONE[az][0]) for az in AZIONI], dtype=np.intp)
+_STATO = np.array([NESSUNO] + [EFFETTO_AZIONE[az][1] for az in AZIONI], dtype=np.int8)
+_AZIONE = np.zeros((len(DISPOSITIVI), 2), dtype=np.int8)  # (dispositivo, stato) -> codice azione
+for _codice, _az in enumerate(AZIONI, start=1):
+    _AZIONE[DISPOSITIVI.index(EFFETTO_AZIONE[_az][0]), EFFETTO_AZIONE[_az][1]] = _codice
+
+def risolvi_conflitti(matrice):
+    # Matrice (righe x slot) di codici azione -> stato richiesto per (riga, dispositivo).
+    # Le azioni duplicate coincidono; tra azioni opposte prevale lo stato 0 (spento,
+    # tapparelle abbassate), indipendentemente dall'ordine delle regole
+    matrice = np.asarray(matrice)
+    richiesto = np.full((len(matrice), len(DISPOSITIVI)), NESSUNO, dtype=np.int8)
+    righe = np.arange(len(matrice))
+    for codici in matrice.T:
+        dispositivo = _DISPOSITIVO[codici]
+        richiesto[righe, dispositivo] = np.minimum(richiesto[righe, dispositivo], _STATO[codici])
+    return richiesto
+
+def comandi_per_dispositivo(matrice):
+    # Un solo comando per dispositivo (senza stato): matrice (righe x dispositivi) di codici azione
+    richiesto = risolvi_conflitti(matrice)
+    return np.where(richiesto != NESSUNO, _AZIONE[np.arange(len(DISPOSITIVI)), np.minimum(richiesto, 1)], 0).astype(np.int8)
+
+class StatoDispositivi:
+    # Ultimo stato comandato di ogni dispositivo (stanza x tipo): i comandi ridondanti sono
+    # scartati, quelli entro la finestra di isteresi trattenuti
+    def __init__(self, isteresi=ISTERESI_S, capacita=1024):
+        self.isteresi = np.array([isteresi.get(d, 0.0) for d in DISPOSITIVI])
+        self.slot = {}  # nome stanza -> slot
+        self.nomi = []
+        self.stato = np.full((capacita, len(DISPOSITIVI)), IGNOTO, dtype=np.int8)
+        self.cambio = np.full((capacita, len(DISPOSITIVI)), -np.inf)
+        self.in_attesa = np.full((capacita, len(DISPOSITIVI)), NESSUNO, dtype=np.int8)
+        self.conteggi = dict.fromkeys(["richieste", "emesse", "ridondanti", "trattenute"], 0)
+
+    def _slot_stanze(self, stanze):
+        slot = self.slot
+        for nome in [n for n in dict.fromkeys(stanze) if n not in slot]:
+            slot[nome] = len(self.nomi)
+            self.nomi.append(nome)
+        if len(self.nomi) > len(self.stato):
+            aggiunte = 2 * len(self.nomi) - len(self.stato)
+            self.stato = np.vstack([self.stato, np.full((aggiunte, len(DISPOSITIVI)), IGNOTO, dtype=np.int8)])
+            self.cambio = np.vstack([self.cambio, np.full((aggiunte, len(DISPOSITIVI)), -np.inf)])
+            self.in_attesa = np.vstack([self.in_attesa, np.full((aggiunte, len(DISPOSITIVI)), NESSUNO, dtype=np.int8)])
+        return np.fromiter((slot[nome] for nome in stanze), dtype=np.intp, count=len(stanze))
+
+    def imposta(self, stanze, matrice, istante=None):
+        # Stato già noto (es. azioni presenti nella KB): registrato senza emettere comandi
+        istante = time.perf_counter() if istante is None else istante
+        slot = self._slot_stanze(stanze)
+        richiesto = risolvi_conflitti(matrice)
+        r, d = np.nonzero(richiesto != NESSUNO)
+        self.stato[slot[r], d] = richiesto[r, d]
+        self.cambio[slot[r], d] = istante
+
+    def filtra(self, stanze, matrice, istante=None):
+        # Azioni suggerite per stanza -> (stanze, matrice stanze x dispositivi di codici azione)
+        # con i soli comandi che cambiano lo stato di un dispositivo
+        istante = time.perf_counter() if istante is None else istante
+        slot = self._slot_stanze(stanze)
+        richiesto = risolvi_conflitti(matrice)
+        # Stessa stanza più volte: vale l'ultima valutazione
+        if len(np.unique(slot)) < len(slot):
+            _, ultime = np.unique(slot[::-1], return_index=True)
+            ultime = np.sort(len(slot) - 1 - ultime)
+            slot, richiesto = slot[ultime], richiesto[ultime]
+        stato = self.stato[slot]
+        nuovo = (richiesto != NESSUNO) & (richiesto != stato)
+        consentito = (stato == IGNOTO) | (istante - self.cambio[slot] >= self.isteresi)
+        emetti = nuovo & consentito
+        # Trattenuti: restano in attesa finché la stanza non è rivalutata o la finestra scade
+        self.in_attesa[slot] = np.where(nuovo & ~consentito, richiesto, NESSUNO)
+        self.conteggi["richieste"] += int(np.count_nonzero(np.asarray(matrice)))
+        self.conteggi["ridondanti"] += int(np.count_nonzero((richiesto != NESSUNO) & ~nuovo))
+        self.conteggi["trattenute"] += int(np.count_nonzero(nuovo & ~consentito))
+        return self._emetti(slot, richiesto, emetti, istante)
+
+    def scaduti(self, istante=None):
+        # Comandi trattenuti la cui finestra di isteresi è terminata
+        istante = time.perf_counter() if istante is None else istante
+        n = len(self.nomi)
+        attesa = self.in_attesa[:n]
+        emetti = (attesa != NESSUNO) & (istante - self.cambio[:n] >= self.isteresi)
+        slot = np.flatnonzero(emetti.any(axis=1))
+        if not len(slot):
+            return [], np.zeros((0, len(DISPOSITIVI)), dtype=np.int8)
+        richiesto = attesa[slot].copy()
+        self.in_attesa[slot] = np.where(emetti[slot], NESSUNO, attesa[slot])
+        return self._emetti(slot, richiesto, emetti[slot], istante)
+
+    def _emetti(self, slot, richiesto, emetti, istante):
+        r, d = np.nonzero(emetti)
+        self.stato[slot[r], d] = richiesto[r, d]
+        self.cambio[slot[r], d] = istante
+        self.conteggi["emesse"] += len(r)
+        righe = np.flatnonzero(emetti.any(axis=1))
+        comandi = np.where(emetti, _AZIONE[np.arange(len(DISPOSITIVI)), np.minimum(richiesto, 1)], 0)
+        return [self.nomi[i] for i in slot[righe]], comandi[righe].astype(np.int8)
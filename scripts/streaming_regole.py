@@ -0,0 +1,336 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+from collections import deque
+import numpy as np
+from regole import ORE_NOTTE, azioni_da_regole_batch, decodifica_azioni
+from dataset_io import percorso_dataset, leggi_dataset
+from stato_dispositivi import StatoDispositivi
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+DATA_DIR = os.path.join(BASE_DIR, "data")
+
+# Un evento è la lettura di un sensore: (stanza, variabile, valore, istante di emissione).
+# Le sorgenti producono blocchi di eventi in colonne: (stanze, codici variabile, valori, istanti)
+VARIABILI = ["temperatura", "illuminazione", "occupazione", "ora_giorno"]
+CODICE_VARIABILE = {v: i for i, v in enumerate(VARIABILI)}
+OBBLIGATORIE = 3  # temperatura, illuminazione e occupazione: senza, la stanza non è valutata
+
+EVENTI_AL_S = 100000
+EVENTI_PER_BLOCCO = 1000
+CODA_MAX = 64  # Blocchi in attesa di elaborazione: oltre, la sorgente attende (backpressure)
+STANZE_SIMULATE = 1000
+DURATA_S = 5.0
+PORTA = 8765
+CAMPIONI_LATENZA = 100000
+
+def orario_da_ora(ora):
+    # Ora del giorno (array) -> categoria di orario usata dalle regole; ora ignota = "Giorno"
+    ora = np.asarray(ora, dtype=float)
+    notte = (ora >= ORE_NOTTE[0]) | (ora < ORE_NOTTE[1])
+    return np.where(notte, "Notte", "Giorno").astype(object)
+
+def blocco_eventi(stanze, variabili, valori, istante=None):
+    istante = time.perf_counter() if istante is None else istante
+    return (
+        np.asarray(stanze, dtype=object),
+        np.asarray(variabili, dtype=np.int8),
+        np.asarray(valori, dtype=float),
+        np.full(len(stanze), istante),
+    )
+
+def blocco_da_righe(righe):
+    # Righe JSON {"stanza": ..., "variabile": ..., "valore": ...}; quelle non valide sono scartate
+    stanze, variabili, valori = [], [], []
+    for riga in righe:
+        try:
+            evento = json.loads(riga)
+            codice = CODICE_VARIABILE[evento["variabile"]]
+            valore = float(evento["valore"])
+        except (ValueError, KeyError, TypeError):
+            continue
+        stanze.append(evento.get("stanza"))
+        variabili.append(codice)
+        valori.append(valore)
+    return blocco_eventi(stanze, variabili, valori)
+
+async def _a_ritmo(inizio, eventi_emessi, eventi_al_s):
+    # Attende l'istante in cui, al ritmo richiesto, sarebbero stati emessi gli eventi già prodotti
+    if eventi_al_s:
+        attesa = inizio + eventi_emessi / eventi_al_s - time.perf_counter()
+        if attesa > 0:
+            await asyncio.sleep(attesa)
+
+# SORGENTI (generatori asincroni di blocchi)
+async def sorgente_simulatore(num_stanze=STANZE_SIMULATE, eventi_al_s=EVENTI_AL_S, durata=DURATA_S,
+                              seed=None, dimensione_blocco=EVENTI_PER_BLOCCO):
+    # Letture casuali sulle stanze simulate, con valori arrotondati come quelli dei sensori
+    rng = np.random.default_rng(seed)
+    nomi = np.array([f"StanzaSimulata{i}" for i in range(num_stanze)], dtype=object)
+    minimi = np.array([10.0, 0.0, 0.0, 0.0])
+    massimi = np.array([35.0, 1000.0, 2.0, 24.0])
+    decimali = np.array([1, 0, 0, 0])
+    inizio = time.perf_counter()
+    emessi = 0
+    while time.perf_counter() - inizio < durata:
+        variabili = rng.integers(0, len(VARIABILI), dimensione_blocco)
+        valori = rng.uniform(minimi[variabili], massimi[variabili])
+        valori = np.where(decimali[variabili] > 0, np.round(valori, 1), np.floor(valori))
+        await _a_ritmo(inizio, emessi, eventi_al_s)
+        yield blocco_eventi(nomi[rng.integers(0, num_stanze, dimensione_blocco)], variabili, valori)
+        emessi += dimensione_blocco
+
+async def sorgente_csv(percorso, eventi_al_s=0, dimensione_blocco=EVENTI_PER_BLOCCO):
+    # Riproduce un dataset (CSV, Parquet o colonnare): ogni riga diventa una lettura per variabile
+    df = leggi_dataset(percorso, ["stanza"] + VARIABILI)
+    stanze = df["stanza"].astype(str).to_numpy(dtype=object)
+    valori = df[VARIABILI].to_numpy(dtype=float)
+    righe_per_blocco = max(1, dimensione_blocco // len(VARIABILI))
+    inizio = time.perf_counter()
+    for i in range(0, len(df), righe_per_blocco):
+        parte = slice(i, i + righe_per_blocco)
+        await _a_ritmo(inizio, i * len(VARIABILI), eventi_al_s)
+        yield blocco_eventi(
+            np.repeat(stanze[parte], len(VARIABILI)),
+            np.tile(np.arange(len(VARIABILI)), len(stanze[parte])),
+            valori[parte].ravel(),
+        )
+
+async def sorgente_file(percorso, segui=False, intervallo=0.1, dimensione_blocco=EVENTI_PER_BLOCCO):
+    # File di righe JSON; con segui=True resta in ascolto delle righe aggiunte (come tail -f):
+    # una riga senza "\n" finale (scritta a metà) è tenuta da parte e completata alla lettura successiva
+    parziale = ""
+    with open(percorso, encoding="utf-8") as f:
+        while True:
+            righe = []
+            while len(righe) < dimensione_blocco:
+                riga = f.readline()
+                if not riga:
+                    break
+                riga, parziale = parziale + riga, ""
+                if segui and not riga.endswith("\n"):
+                    parziale = riga
+                    break
+                righe.append(riga)
+            if righe:
+                yield blocco_da_righe(righe)
+            elif segui:
+                await asyncio.sleep(intervallo)
+            else:
+                return
+
+async def sorgente_socket(host="127.0.0.1", porta=PORTA, dimensione_blocco=EVENTI_PER_BLOCCO):
+    # Server TCP: ogni client invia righe JSON; le righe di tutti i client confluiscono in blocchi
+    coda = asyncio.Queue()
+
+    async def client(reader, writer):
+        try:
+            while riga := await reader.readline():
+                await coda.put(riga)
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(client, host, porta)
+    print(f"In ascolto su {host}:{porta}")
+    async with server:
+        while True:
+            righe = [await coda.get()]
+            while len(righe) < dimensione_blocco and not coda.empty():
+                righe.append(coda.get_nowait())
+            yield blocco_da_righe(righe)
+
+SORGENTI = {
+    "simulatore": sorgente_simulatore,
+    "csv": sorgente_csv,
+    "file": sorgente_file,
+    "socket": sorgente_socket,
+}
+
+# STATO DELLE STANZE E VALUTAZIONE INCREMENTALE
+class MetricheStreaming:
+    def __init__(self):
+        self._latenze = deque(maxlen=CAMPIONI_LATENZA)
+        self.avvio = time.perf_counter()
+        self.eventi = 0
+        self.valutazioni = 0
+        self.suggerite = 0
+        self.azioni = 0
+
+    def registra(self, eventi=0, latenze=(), suggerite=0, azioni=0):
+        self.eventi += eventi
+        self.valutazioni += len(latenze)
+        self.suggerite += suggerite
+        self.azioni += azioni
+        self._latenze.extend(latenze)
+
+    def riepilogo(self):
+        latenze = np.array(self._latenze)
+        durata = time.perf_counter() - self.avvio
+        p50, p99 = np.percentile(latenze, [50, 99]) * 1000 if len(latenze) else (np.nan, np.nan)
+        return {
+            "eventi": self.eventi,
+            "valutazioni": self.valutazioni,
+            "suggerite": self.suggerite,
+            "azioni": self.azioni,
+            "eventi_al_s": self.eventi / durata if durata else 0.0,
+            "latenza_p50_ms": float(p50),
+            "latenza_p99_ms": float(p99),
+        }
+
+class RuntimeRegole:
+    # Stato corrente di ogni stanza in array (uno slot per stanza); a ogni ciclo sono valutate
+    # solo le stanze con almeno un ingresso cambiato dall'ultima valutazione. Con dispositivi
+    # (StatoDispositivi) sono inviati solo i comandi che cambiano lo stato di un dispositivo
+    def __init__(self, destinazione=None, dispositivi=None, capacita=1024):
+        self.destinazione = destinazione
+        self.dispositivi = dispositivi
+        self.metriche = MetricheStreaming()
+        self.slot = {}  # nome stanza -> slot
+        self.nomi = []
+        self.valori = np.full((capacita, len(VARIABILI)), np.nan)
+        self.cambiata_da = np.full(capacita, np.inf)  # Istante del primo cambiamento non ancora valutato
+
+    def _slot_stanze(self, stanze):
+        slot = self.slot
+        for nome in [n for n in dict.fromkeys(stanze) if n not in slot]:
+            slot[nome] = len(self.nomi)
+            self.nomi.append(nome)
+        if len(self.nomi) > len(self.valori):
+            capacita = 2 * len(self.nomi)
+            self.valori = np.vstack([self.valori, np.full((capacita - len(self.valori), len(VARIABILI)), np.nan)])
+            self.cambiata_da = np.concatenate([self.cambiata_da, np.full(capacita - len(self.cambiata_da), np.inf)])
+        return np.fromiter((slot[nome] for nome in stanze), dtype=np.intp, count=len(stanze))
+
+    def aggiorna(self, blocco):
+        stanze, variabili, valori, istanti = blocco
+        self.metriche.registra(eventi=len(stanze))
+        if not len(stanze):
+            return
+        slot = self._slot_stanze(stanze)
+        # Più letture della stessa variabile nel blocco: vale l'ultima
+        chiavi = slot * len(VARIABILI) + variabili
+        _, ultime = np.unique(chiavi[::-1], return_index=True)
+        ultime = len(chiavi) - 1 - ultime
+        s, v = slot[ultime], variabili[ultime]
+        correnti = self.valori[s, v]
+        cambiate = (correnti != valori[ultime]) & ~(np.isnan(correnti) & np.isnan(valori[ultime]))
+        self.valori[s[cambiate], v[cambiate]] = valori[ultime][cambiate]
+        # La latenza decorre dal primo evento del blocco per ciascuna stanza cambiata
+        cambiate_slot = np.isin(slot, s[cambiate])
+        np.minimum.at(self.cambiata_da, slot[cambiate_slot], istanti[cambiate_slot])
+
+    def valuta(self):
+        # Stanze cambiate e con tutti gli ingressi obbligatori noti
+        pronte = np.flatnonzero(
+            np.isfinite(self.cambiata_da) & ~np.isnan(self.valori[:, :OBBLIGATORIE]).any(axis=1)
+        )
+        if len(pronte):
+            valori = self.valori[pronte]
+            matrice = azioni_da_regole_batch(
+                valori[:, CODICE_VARIABILE["illuminazione"]],
+                valori[:, CODICE_VARIABILE["temperatura"]],
+                valori[:, CODICE_VARIABILE["occupazione"]] > 0,
+                orario_da_ora(valori[:, CODICE_VARIABILE["ora_giorno"]]),
+            )
+            stanze = [self.nomi[i] for i in pronte]
+            suggerite = int(np.count_nonzero(matrice))
+            if self.dispositivi is not None:
+                stanze, matrice = self.dispositivi.filtra(stanze, matrice)
+            self._invia(stanze, matrice)
+            latenze = time.perf_counter() - self.cambiata_da[pronte]
+            self.cambiata_da[pronte] = np.inf
+            self.metriche.registra(latenze=latenze, suggerite=suggerite)
+        if self.dispositivi is not None:
+            self._invia(*self.dispositivi.scaduti())
+
+    def _invia(self, stanze, matrice):
+        if not len(stanze):
+            return
+        if self.destinazione is not None:
+            self.destinazione(stanze, matrice)
+        self.metriche.registra(azioni=int(np.count_nonzero(matrice)))
+
+    async def consuma(self, sorgente, coda_max=CODA_MAX):
+        # La sorgente gira in un task separato; i blocchi accumulati nel frattempo
+        # sono applicati insieme e seguiti da una sola valutazione
+        coda = asyncio.Queue(maxsize=coda_max)
+
+        async def produttore():
+            try:
+                async for blocco in sorgente:
+                    await coda.put(blocco)
+            finally:
+                await coda.put(None)
+
+        task = asyncio.create_task(produttore())
+        finito = False
+        while not finito:
+            blocchi = [await coda.get()]
+            while not coda.empty():
+                blocchi.append(coda.get_nowait())
+            for blocco in blocchi:
+                if blocco is None:
+                    finito = True
+                else:
+                    self.aggiorna(blocco)
+            self.valuta()
+        await task
+        return self.metriche.riepilogo()
+
+def stampa_azioni(stanze, matrice):
+    for stanza, azioni in zip(stanze, decodifica_azioni(matrice)):
+        if azioni:
+            print(f"{stanza}: {', '.join(azioni)}")
+
+def crea_sorgente(args):
+    if args.sorgente == "simulatore":
+        return sorgente_simulatore(args.stanze, args.eventi_al_s, args.durata, args.seed)
+    if args.sorgente == "csv":
+        percorso = args.percorso or percorso_dataset(DATA_DIR, "SmartHome_base")
+        if not os.path.exists(percorso):
+            raise FileNotFoundError(f"dataset non trovato: '{os.path.relpath(percorso)}'")
+        return sorgente_csv(percorso, args.eventi_al_s)
+    if args.sorgente == "file":
+        if not args.percorso or not os.path.exists(args.percorso):
+            raise FileNotFoundError("indicare con --percorso un file di righe JSON esistente")
+        return sorgente_file(args.percorso, args.segui)
+    return sorgente_socket(args.host, args.porta)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Applicazione in tempo reale delle regole a flussi di letture dei sensori.")
+    parser.add_argument("--sorgente", choices=list(SORGENTI), default="simulatore")
+    parser.add_argument("--percorso", help="dataset da riprodurre (csv) o file di righe JSON (file)")
+    parser.add_argument("--segui", action="store_true", help="con --sorgente file, resta in ascolto delle righe aggiunte")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=PORTA)
+    parser.add_argument("--eventi-al-s", type=float, default=EVENTI_AL_S,
+                        help=f"ritmo di simulatore e replay CSV (default {EVENTI_AL_S}; 0 = massima velocità)")
+    parser.add_argument("--durata", type=float, default=DURATA_S, help=f"secondi di simulazione (default {DURATA_S})")
+    parser.add_argument("--stanze", type=int, default=STANZE_SIMULATE, help=f"stanze simulate (default {STANZE_SIMULATE})")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--stampa", action="store_true", help="stampa le azioni emesse")
+    parser.add_argument("--senza-deduplica", action="store_true",
+                        help="invia tutte le azioni suggerite, anche se il dispositivo è già nello stato richiesto")
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+
+    try:
+        sorgente = crea_sorgente(args)
+    except FileNotFoundError as e:
+        print(f"ERRORE: {e}")
+        return
+    dispositivi = None if args.senza_deduplica else StatoDispositivi()
+    runtime = RuntimeRegole(stampa_azioni if args.stampa else None, dispositivi)
+    try:
+        m = asyncio.run(runtime.consuma(sorgente))
+    except KeyboardInterrupt:
+        m = runtime.metriche.riepilogo()
+
+    print(f"\nEventi: {m['eventi']:,} ({m['eventi_al_s']:,.0f}/s) su {len(runtime.nomi):,} stanze")
+    print(f"Valutazioni: {m['valutazioni']:,}, azioni suggerite: {m['suggerite']:,}, comandi emessi: {m['azioni']:,}")
+    print(f"Latenza evento -> azione: p50 {m['latenza_p50_ms']:.2f} ms, p99 {m['latenza_p99_ms']:.2f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+import os
+import shutil
+import subprocess
+import sys
+import textwrap
+import pytest
+
+SCRIPTS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts")
+
+@pytest.fixture
+def esegui_in_copia(tmp_path):
+    # Copia di scripts/ in una cartella temporanea: ontologie, dataset e cache degli script
+    # finiscono lì. Il codice dato è eseguito in un interprete nuovo, da quella copia
+    scripts = tmp_path / "scripts"
+    shutil.copytree(SCRIPTS, scripts, ignore=shutil.ignore_patterns("__pycache__"))
+
+    def esegui(codice, *argv):
+        (scripts / "driver_test.py").write_text(textwrap.dedent(codice), encoding="utf-8")
+        esito = subprocess.run([sys.executable, "driver_test.py", *argv], cwd=scripts,
+                               capture_output=True, text=True, timeout=600)
+        assert esito.returncode == 0, esito.stdout + esito.stderr
+        return esito.stdout
+    return esegui
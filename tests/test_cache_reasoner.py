@@ -0,0 +1,34 @@
+# Il reasoner Java è sostituito da uno che conta le chiamate e non inferisce nulla: basta
+# per verificare chi ragiona e chi riusa la cache, anche senza Java
+DRIVER = """
+    import sys
+    import ragionamento
+    from contesto_pipeline import ContestoPipeline
+
+    chiamate = []
+    ragionamento.MOTORE = "owl"
+    ragionamento.reasoner_owl = lambda nome: lambda world, **kw: chiamate.append(nome)
+
+    import ontologia, genera_istanze, genera_dataset
+    contesto = ContestoPipeline(condividi=sys.argv[1] == "condiviso")
+    for passo, main, argv in ((1, ontologia.main, None), (2, genera_istanze.main, ["--num-case", "3", "--seed", "1"]),
+                              (3, genera_dataset.main, [])):
+        prima = len(chiamate)
+        if argv is None:
+            main(contesto=contesto)
+        else:
+            main(argv, contesto=contesto)
+        print(f"PASSO {passo}: {len(chiamate) - prima}")
+"""
+
+def test_passo_3_riusa_la_cache_del_passo_2(esegui_in_copia):
+    output = esegui_in_copia(DRIVER, "separato")
+    assert "PASSO 2: 1" in output
+    assert "PASSO 3: 0" in output
+    assert "Inferenze riutilizzate dalla cache del reasoner" in output
+
+def test_passo_3_riusa_le_inferenze_in_memoria(esegui_in_copia):
+    output = esegui_in_copia(DRIVER, "condiviso")
+    assert "PASSO 2: 1" in output
+    assert "PASSO 3: 0" in output
+    assert "Inferenze già applicate alla KB in memoria." in output
@@ -0,0 +1,45 @@
+import json
+import shutil
+import pytest
+
+CLASSI_MIN_2 = ["StanzaDaRiscaldareAltaOccupazione", "CasaAltaOccupazione"]
+
+# KB popolata generata con il motore nativo (nessun reasoner Java per crearla)
+GENERA_KB = """
+    import sys
+    import json
+    import ragionamento
+    ragionamento.MOTORE = "nativo"
+    import ontologia, genera_istanze
+    ontologia.main()
+    genera_istanze.main(["--num-case", "20", "--seed", "1"])
+"""
+
+NATIVO = GENERA_KB + """
+    from archivio_kb import apri_kb_isolata
+    from materializzazione import ONTO_KB, ContestoStanze, calcola_appartenenze
+    contesto = ContestoStanze(apri_kb_isolata(ONTO_KB))
+    risultati = calcola_appartenenze(contesto)
+    print(json.dumps({"stanze_con_2_presenze": int((contesto.presenze >= 2).sum()),
+                      "appartenenze": {nome: int(v.sum()) for nome, v in risultati.items()}}))
+"""
+
+CONFRONTO = GENERA_KB + """
+    from materializzazione import ONTO_KB, verifica_su_campione
+    campione, differenze = verifica_su_campione(ONTO_KB, num_case=5, reasoner=sys.argv[1])
+    print(json.dumps(differenze))
+"""
+
+def test_nativo_classi_min_2_vuote(esegui_in_copia):
+    risultato = json.loads(esegui_in_copia(NATIVO).splitlines()[-1])
+    # Ci sono stanze con più persone: le classi sono vuote per UNICITA_NOMI, non per i dati
+    assert risultato["stanze_con_2_presenze"] > 0
+    for nome in CLASSI_MIN_2:
+        assert risultato["appartenenze"][nome] == 0
+
+@pytest.mark.skipif(shutil.which("java") is None, reason="HermiT e Pellet richiedono Java")
+@pytest.mark.parametrize("reasoner", ["hermit", "pellet"])
+def test_nativo_e_reasoner_concordano_su_classi_min_2(esegui_in_copia, reasoner):
+    differenze = json.loads(esegui_in_copia(CONFRONTO, reasoner).splitlines()[-1])
+    for nome in CLASSI_MIN_2:
+        assert nome not in differenze